@@ -152,6 +152,28 @@ class Cli(object):
                 "type": "int",
                 "help": "maximum number of cached files",
             },
+            {
+                "special_type": "parameter",
+                "name": "workers",
+                "short": "-j",
+                "long": "--workers",
+                "action": "store",
+                "dest": "workers",
+                "default": 1,
+                "type": "int",
+                "help": "number of processes that calculate frames in parallel",
+            },
+            {
+                "special_type": "parameter",
+                "name": "split workers",
+                "short": "",
+                "long": "--splitworkers",
+                "action": "store",
+                "dest": "split_workers",
+                "default": 1,
+                "type": "int",
+                "help": "number of processes that split the grid of a frame into domains",
+            },
             {
                 "special_type": None,
                 "name": "no cache files",
@@ -216,6 +238,17 @@ class Cli(object):
                 "type": None,
                 "help": "No text files with results are created",
             },
+            {
+                "special_type": "disable_target",
+                "name": "no triangles",
+                "short": "",
+                "long": "--notriangles",
+                "action": "store_true",
+                "dest": "no_triangles",
+                "default": False,
+                "type": None,
+                "help": "Only surface areas are calculated, no triangle meshes are stored",
+            },
         ]
 
         (self.options, self.left_args) = self.__parse_options(command_line_params)
@@ -234,9 +267,12 @@ class Cli(object):
         default_settings.recalculate = True
         default_settings.exporthdf5 = not self.options.no_hdf5_export
         default_settings.exporttext = not self.options.no_text_export
+        default_settings.triangles = not self.options.no_triangles
         default_settings.exportdir = None
         default_settings.bonds = True
         default_settings.dihedral_angles = True
+        default_settings.workers = self.options.workers
+        default_settings.split_workers = self.options.split_workers
         settings_list = file_list.createCalculationSettings(default_settings)
         if self.options.atom_radii is not None:
             config.Computation.atom_radii = self.options.atom_radii
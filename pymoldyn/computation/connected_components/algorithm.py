@@ -0,0 +1,143 @@
+import itertools
+
+import numpy as np
+
+from ..split_and_merge.algorithm import ObjectType
+from ..split_and_merge.util.graph import MergeGroups
+from .labeling import label_components as label_components_module
+
+NEIGHBOR_OFFSETS = tuple(offset for offset in itertools.product((-1, 0, 1), repeat=3) if any(offset))
+
+
+def get_relevant_cells(data, mask, object_type):
+    """
+    Returns a grid that is 1 for the cells that belong to a domain (empty cells) or a cavity (negative cells) and are
+    inside the volume.
+    """
+    if object_type == ObjectType.DOMAIN:
+        relevant_cells = data == 0
+    else:
+        relevant_cells = data < 0
+    relevant_cells &= mask == 0
+    return relevant_cells.view(np.int8)
+
+
+def label_components(relevant_cells):
+    """
+    Labels the 26-connected components of the relevant cells (without periodic boundary conditions). The components
+    get the labels 1 to n in the order of their first cell, irrelevant cells are labeled with 0.
+
+    **Returns:**
+        A tuple of the label grid (int32) and the number of components.
+    """
+    labels = np.empty(relevant_cells.shape, dtype=np.int32)
+    num_labels = label_components_module.label_components(np.ascontiguousarray(relevant_cells), labels)
+    return labels, num_labels
+
+
+def find_periodic_links(labels, mask, combined_translation_vectors):
+    """
+    Finds the components that touch each other across the periodic border: A labeled cell is linked to the
+    component of its equivalent cell if one of its neighbors is outside of the volume.
+
+    **Returns:**
+        An array with the rows ``(label1, label2, tx, ty, tz)``. Translating the component ``label1`` by ``(tx, ty,
+        tz)`` makes it touch the component ``label2``. The rows are unique and sorted.
+    """
+    translation_vectors = np.array(combined_translation_vectors, dtype=np.int64).reshape((-1, 3))
+    shape = np.array(labels.shape)
+    links = [np.zeros((0, 5), dtype=np.int64)]
+    for offset in NEIGHBOR_OFFSETS:
+        cells = tuple(slice(max(0, -c), n - max(0, c)) for c, n in zip(offset, labels.shape))
+        neighbors = tuple(slice(max(0, c), n - max(0, -c)) for c, n in zip(offset, labels.shape))
+        is_border_cell = (labels[cells] > 0) & (mask[neighbors] < 0)
+        positions = np.argwhere(is_border_cell) + [s.start for s in cells]
+        neighbor_positions = positions + offset
+        translations = translation_vectors[-mask[tuple(neighbor_positions.T)].astype(np.int64) - 1]
+        equivalent_positions = neighbor_positions + translations
+        is_inside = np.all((equivalent_positions >= 0) & (equivalent_positions < shape), axis=1)
+        positions = positions[is_inside]
+        translations = translations[is_inside]
+        labels1 = labels[tuple(positions.T)]
+        labels2 = labels[tuple(equivalent_positions[is_inside].T)]
+        is_link = labels2 > 0
+        links.append(np.column_stack((labels1[is_link], labels2[is_link], translations[is_link])))
+    return np.unique(np.concatenate(links), axis=0)
+
+
+def merge_periodic_links(labels, num_labels, links):
+    """
+    Joins the components that are linked across the periodic border with a disjoint-set union that stores the
+    translation offsets of the components. A component that is linked with itself has infinite extent (cyclic).
+
+    **Returns:**
+        A tuple of an array with the area index of each component (label - 1), an array with the offset of each
+        component that results in a continuous area and a list of the indices of all cyclic areas.
+    """
+    label_sizes = np.bincount(labels.ravel(), minlength=num_labels + 1)[1:]
+    merge_groups = MergeGroups(num_labels, node_sizes=label_sizes)
+    merge_groups.start_merging_periodic_neighbors()
+    for label1, label2, tx, ty, tz in links.tolist():
+        if not merge_groups.is_merged(label1 - 1, label2 - 1, detect_cyclic_merge=True):
+            merge_groups.merge_periodic(label1 - 1, label2 - 1, (tx, ty, tz))
+    return merge_groups.get_groups()
+
+
+def get_label_runs(labels):
+    """
+    Returns the runs of equally labeled cells along the z axis as arrays of the start positions (shape ``(n, 3)``),
+    the lengths and the labels of the runs.
+    """
+    flat_labels = labels.ravel()
+    is_labeled = flat_labels != 0
+    is_row_start = np.zeros(flat_labels.shape, dtype=bool)
+    is_row_start[:: labels.shape[2]] = True
+    is_change = np.ones(flat_labels.shape, dtype=bool)
+    np.not_equal(flat_labels[1:], flat_labels[:-1], out=is_change[1:])
+    starts = np.flatnonzero(is_labeled & (is_change | is_row_start))
+    is_end = np.ones(flat_labels.shape, dtype=bool)
+    is_end[:-1] = is_change[1:] | is_row_start[1:]
+    ends = np.flatnonzero(is_labeled & is_end)
+    positions = np.column_stack(np.unravel_index(starts, labels.shape))
+    return positions, ends - starts + 1, flat_labels[starts]
+
+
+def get_area_boxes(labels, label_areas, label_offsets):
+    """
+    Collects the runs of all components of an area as boxes with the rows (x, y, z, 1, 1, length), like the area boxes
+    of the split and merge algorithm.
+
+    **Returns:**
+        A tuple of the areas with applied translation (each area is contiguous in space) and the areas without
+        translation. Both are lists of int32 arrays of shape (n, 6) and their rows belong to the same runs, which are
+        sorted by their position in the grid.
+    """
+    positions, lengths, run_labels = get_label_runs(labels)
+    num_areas = int(label_areas.max()) + 1 if len(label_areas) > 0 else 0
+    run_labels = run_labels.astype(np.int64) - 1
+    run_areas = label_areas[run_labels]
+    order = np.argsort(run_areas, kind="stable")
+    boxes = np.column_stack((positions, np.ones((len(lengths), 2), dtype=np.int64), lengths))[order]
+    translated_boxes = boxes.copy()
+    translated_boxes[:, :3] += label_offsets[run_labels[order]]
+    area_offsets = np.searchsorted(run_areas[order], np.arange(num_areas + 1))
+    area_boxes, non_translated_area_boxes = (
+        [b[area_offsets[i] : area_offsets[i + 1]].astype(np.int32) for i in range(num_areas)]
+        for b in (translated_boxes, boxes)
+    )
+    return area_boxes, non_translated_area_boxes
+
+
+def get_unwrapped_cells(labels, label_offsets):
+    """
+    Returns the positions of all labeled cells, their positions with the offsets of their components applied (so each
+    area is contiguous in space) and the component index (label - 1) of each cell. All are in C order of the cells.
+    """
+    positions = np.argwhere(labels > 0)
+    cell_labels = labels[tuple(positions.T)].astype(np.int64) - 1
+    return positions, positions + label_offsets[cell_labels], cell_labels
+
+
+def mark_domain_points(data, labels, label_areas):
+    is_labeled = labels > 0
+    data[is_labeled] = -(label_areas[labels[is_labeled] - 1] + 1)
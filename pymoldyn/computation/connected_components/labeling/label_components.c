@@ -0,0 +1,231 @@
+/**
+ * Two-pass connected-component labeling of a three-dimensional grid with
+ * 26-connectivity. The first pass assigns provisional labels in C order and
+ * records the equivalences of touching labels with a disjoint-set union, the
+ * second pass replaces the provisional labels with consecutive final labels.
+ * The components are numbered in the order of their first cell, so the result
+ * does not depend on the implementation of the first pass.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <limits.h>
+#include <stdlib.h>
+
+
+static int find_root(int *parents, int label)
+{
+    while (parents[label] != label) {
+        parents[label] = parents[parents[label]];
+        label = parents[label];
+    }
+    return label;
+}
+
+/* The root of a set always is its smallest label, which is the label that has been created first */
+static int join(int *parents, int label1, int label2)
+{
+    label1 = find_root(parents, label1);
+    label2 = find_root(parents, label2);
+    if (label1 < label2) {
+        parents[label2] = label1;
+        return label1;
+    }
+    parents[label1] = label2;
+    return label2;
+}
+
+static int is_signed_integer_format(const char *format)
+{
+    char type;
+
+    if (format == NULL) {
+        return 0;
+    }
+    type = format[0];
+    if (type == '@' || type == '=' || type == '<' || type == '>' || type == '!') {
+        type = format[1];
+    }
+    return type == 'i' || type == 'l';
+}
+
+/**
+ * Labels the cells of `foreground` that are not zero. Background cells are set
+ * to 0 in `labels`. Returns the number of components or -1 if the memory for
+ * the provisional labels could not be allocated.
+ */
+static int label_grid(const char *foreground, int *labels, const int dimensions[3])
+{
+    /* offsets of the 13 neighbors that precede a cell in C order */
+    static const int neighbor_offsets[13][3] = {
+        {-1, -1, -1}, {-1, -1, 0}, {-1, -1, 1}, {-1, 0, -1}, {-1, 0, 0}, {-1, 0, 1}, {-1, 1, -1},
+        {-1, 1, 0}, {-1, 1, 1}, {0, -1, -1}, {0, -1, 0}, {0, -1, 1}, {0, 0, -1}
+    };
+    int strides[3];
+    int x, y, z, k;
+    int provisional_label;
+    int num_labels = 0;
+    int capacity = 1024;
+    int *parents;
+    int *final_labels;
+    Py_ssize_t index, num_cells;
+
+    strides[2] = 1;
+    strides[1] = dimensions[2];
+    strides[0] = dimensions[1] * dimensions[2];
+    num_cells = (Py_ssize_t) dimensions[0] * strides[0];
+
+    parents = malloc(capacity * sizeof(int));
+    if (parents == NULL) {
+        return -1;
+    }
+    parents[0] = 0;
+    index = 0;
+    for (x = 0; x < dimensions[0]; x++) {
+        for (y = 0; y < dimensions[1]; y++) {
+            for (z = 0; z < dimensions[2]; z++, index++) {
+                int current = 0;
+
+                if (!foreground[index]) {
+                    labels[index] = 0;
+                    continue;
+                }
+                for (k = 0; k < 13; k++) {
+                    int nx = x + neighbor_offsets[k][0];
+                    int ny = y + neighbor_offsets[k][1];
+                    int nz = z + neighbor_offsets[k][2];
+                    int neighbor;
+
+                    if (nx < 0 || ny < 0 || nz < 0 || ny >= dimensions[1] || nz >= dimensions[2]) {
+                        continue;
+                    }
+                    neighbor = labels[nx * strides[0] + ny * strides[1] + nz];
+                    if (neighbor == 0) {
+                        continue;
+                    }
+                    current = current == 0 ? find_root(parents, neighbor) : join(parents, current, neighbor);
+                }
+                if (current == 0) {
+                    if (num_labels + 1 == capacity) {
+                        int *new_parents;
+
+                        if (capacity > INT_MAX / 2) {
+                            free(parents);
+                            return -1;
+                        }
+                        capacity *= 2;
+                        new_parents = realloc(parents, capacity * sizeof(int));
+                        if (new_parents == NULL) {
+                            free(parents);
+                            return -1;
+                        }
+                        parents = new_parents;
+                    }
+                    current = ++num_labels;
+                    parents[current] = current;
+                }
+                labels[index] = current;
+            }
+        }
+    }
+
+    /* roots are numbered in the order of their creation, which is the order of the first cell of each component */
+    final_labels = malloc((num_labels + 1) * sizeof(int));
+    if (final_labels == NULL) {
+        free(parents);
+        return -1;
+    }
+    final_labels[0] = 0;
+    k = 0;
+    for (provisional_label = 1; provisional_label <= num_labels; provisional_label++) {
+        if (find_root(parents, provisional_label) == provisional_label) {
+            final_labels[provisional_label] = ++k;
+        }
+    }
+    for (index = 0; index < num_cells; index++) {
+        if (labels[index] != 0) {
+            labels[index] = final_labels[find_root(parents, labels[index])];
+        }
+    }
+    free(final_labels);
+    free(parents);
+    return k;
+}
+
+
+static PyObject *label_components(PyObject *self, PyObject *args)
+{
+    PyObject *foreground_object, *labels_object;
+    Py_buffer foreground, labels;
+    int dimensions[3];
+    int k, num_labels;
+
+    if (!PyArg_ParseTuple(args, "OO", &foreground_object, &labels_object)) {
+        return NULL;
+    }
+    if (PyObject_GetBuffer(foreground_object, &foreground, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0) {
+        return NULL;
+    }
+    if (PyObject_GetBuffer(labels_object, &labels, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT | PyBUF_WRITABLE) < 0) {
+        PyBuffer_Release(&foreground);
+        return NULL;
+    }
+    if (foreground.ndim != 3 || foreground.itemsize != 1) {
+        PyErr_SetString(PyExc_TypeError, "foreground must be a contiguous three-dimensional grid with 1 byte items");
+        goto error;
+    }
+    if (labels.ndim != 3 || labels.itemsize != sizeof(int) || !is_signed_integer_format(labels.format)) {
+        PyErr_SetString(PyExc_TypeError, "labels must be a contiguous three-dimensional grid of C ints");
+        goto error;
+    }
+    for (k = 0; k < 3; k++) {
+        if (foreground.shape[k] != labels.shape[k] || foreground.shape[k] > INT_MAX) {
+            PyErr_SetString(PyExc_ValueError, "foreground and labels must have the same shape");
+            goto error;
+        }
+        dimensions[k] = (int) foreground.shape[k];
+    }
+    if ((Py_ssize_t) dimensions[1] * dimensions[2] > INT_MAX / (dimensions[0] > 0 ? dimensions[0] : 1)) {
+        PyErr_SetString(PyExc_ValueError, "the grid is too large");
+        goto error;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    num_labels = label_grid((const char *) foreground.buf, (int *) labels.buf, dimensions);
+    Py_END_ALLOW_THREADS
+
+    PyBuffer_Release(&labels);
+    PyBuffer_Release(&foreground);
+    if (num_labels < 0) {
+        return PyErr_NoMemory();
+    }
+    return PyLong_FromLong(num_labels);
+
+error:
+    PyBuffer_Release(&labels);
+    PyBuffer_Release(&foreground);
+    return NULL;
+}
+
+
+static PyMethodDef LabelMethods[] = {
+    {
+        "label_components",
+        label_components,
+        METH_VARARGS,
+        "Labels the 26-connected components of the non-zero cells of a grid and returns the number of components"
+    },
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef labelmodule = {
+    PyModuleDef_HEAD_INIT,
+    "label_components",  /* name of module */
+    NULL,                /* module documentation */
+    -1,                  /* size of per-interpreter state of the module */
+    LabelMethods
+};
+
+PyMODINIT_FUNC
+PyInit_label_components(void) {
+    return PyModule_Create(&labelmodule);
+}
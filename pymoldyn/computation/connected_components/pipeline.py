@@ -0,0 +1,35 @@
+from ..split_and_merge import algorithm as split_and_merge_algorithm
+from ..split_and_merge.algorithm import ObjectType
+from . import algorithm
+
+
+def start_connected_components_pipeline(
+    data, mask, atoms, combined_translation_vectors, get_translation_vector, object_type, progress=0
+):
+    """
+    Finds the domains or cavities with a connected-component labeling of the grid instead of splitting and merging
+    nodes. The results have the same format as the results of ``start_split_and_merge_pipeline``.
+    """
+    relevant_cells = algorithm.get_relevant_cells(data, mask, object_type)
+    labels, num_labels = algorithm.label_components(relevant_cells)
+    links = algorithm.find_periodic_links(labels, mask, combined_translation_vectors)
+    label_areas, label_offsets, cyclic_area_indices = algorithm.merge_periodic_links(labels, num_labels, links)
+    area_boxes, non_translated_area_boxes = algorithm.get_area_boxes(labels, label_areas, label_offsets)
+    if object_type == ObjectType.DOMAIN:
+        algorithm.mark_domain_points(data, labels, label_areas)
+        centers = split_and_merge_algorithm.calculate_domain_centers(
+            atoms, combined_translation_vectors, non_translated_area_boxes, data.shape
+        )
+        surface_cells = split_and_merge_algorithm.get_domain_surface_cells(
+            data, mask, combined_translation_vectors, len(area_boxes)
+        )
+
+        return (
+            centers,
+            area_boxes,
+            non_translated_area_boxes,
+            surface_cells,
+            cyclic_area_indices,
+        )
+    else:
+        return area_boxes, non_translated_area_boxes, cyclic_area_indices
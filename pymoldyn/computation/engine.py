@@ -0,0 +1,168 @@
+"""
+Selection of the algorithm that finds the domains and cavities of a grid. The split and merge algorithm is the
+reference implementation. The connected-component labeling finds the same areas with a two-pass labeling of the
+grid and a disjoint-set union of the components at the periodic border. The cross validation runs both algorithms,
+logs all differences of their results and returns the results of the split and merge algorithm.
+"""
+
+import numpy as np
+
+from ..config.configuration import config
+from ..util.logger import Logger
+from .split_and_merge.algorithm import ObjectType, get_area_cells
+from .split_and_merge.pipeline import start_split_and_merge_pipeline
+
+logger = Logger("computation.engine")
+
+
+class LabelingEngine:
+    SPLIT_AND_MERGE = "split_and_merge"
+    CONNECTED_COMPONENTS = "connected_components"
+    CROSS_VALIDATION = "cross_validation"
+
+
+def get_connected_components_pipeline():
+    try:
+        from .connected_components.pipeline import start_connected_components_pipeline
+    except ImportError as e:
+        logger.warn(e.__repr__())
+        logger.warn("Connected-component labeling is not available, using split and merge instead")
+        return None
+    return start_connected_components_pipeline
+
+
+def start_labeling_pipeline(
+    data,
+    mask,
+    atoms,
+    combined_translation_vectors,
+    get_translation_vector,
+    object_type,
+    progress=0,
+    engine=None,
+    num_workers=1,
+    split_pool=None,
+):
+    """
+    Finds the domains (``ObjectType.DOMAIN``) or cavities (``ObjectType.CAVITY``) of ``data`` with the given engine
+    (``config.Computation.labeling_engine`` by default). The results have the format of
+    ``start_split_and_merge_pipeline``. ``num_workers`` is the number of processes of the split phase of the split and
+    merge algorithm and ``split_pool`` an optional pool for them (see
+    :func:`~.split_and_merge.algorithm.create_split_pool`).
+    """
+    if engine is None:
+        engine = config.Computation.labeling_engine
+    if engine not in (
+        LabelingEngine.SPLIT_AND_MERGE,
+        LabelingEngine.CONNECTED_COMPONENTS,
+        LabelingEngine.CROSS_VALIDATION,
+    ):
+        raise ValueError("Unknown labeling engine: {}".format(engine))
+    args = (mask, atoms, combined_translation_vectors, get_translation_vector, object_type, progress)
+    start_connected_components_pipeline = None
+    if engine != LabelingEngine.SPLIT_AND_MERGE:
+        start_connected_components_pipeline = get_connected_components_pipeline()
+    if start_connected_components_pipeline is None:
+        return start_split_and_merge_pipeline(data, *args, num_workers=num_workers, pool=split_pool)
+    if engine == LabelingEngine.CONNECTED_COMPONENTS:
+        return start_connected_components_pipeline(data, *args)
+    connected_components_result = start_connected_components_pipeline(data.copy(), *args)
+    split_and_merge_result = start_split_and_merge_pipeline(data, *args, num_workers=num_workers, pool=split_pool)
+    compare_results(split_and_merge_result, connected_components_result, object_type)
+    return split_and_merge_result
+
+
+def get_cavity_area_cells(data, mask, combined_translation_vectors, get_translation_vector):
+    """
+    Finds the periodic cavity areas of ``data`` like ``start_labeling_pipeline`` with ``ObjectType.CAVITY``, but
+    returns their cells instead of boxes. The connected-component labeling is used if it is available, because it
+    finds the areas in a single pass over the grid.
+
+    **Returns:**
+        A tuple of the positions of all cavity cells (shape ``(n, 3)``), the positions with the translation of their
+        areas applied (each area is contiguous in space), the area index of each cell, the number of areas and a list
+        of the indices of all cyclic areas.
+    """
+    try:
+        from .connected_components import algorithm as connected_components_algorithm
+    except ImportError as e:
+        logger.warn(e.__repr__())
+        logger.warn("Connected-component labeling is not available, using split and merge instead")
+        area_boxes, non_translated_area_boxes, cyclic_area_indices = start_split_and_merge_pipeline(
+            data, mask, None, combined_translation_vectors, get_translation_vector, ObjectType.CAVITY
+        )
+        cells = [get_area_cells(boxes) for boxes in non_translated_area_boxes]
+        unwrapped_cells = [get_area_cells(boxes) for boxes in area_boxes]
+        cell_areas = np.repeat(np.arange(len(cells)), [len(area_cells) for area_cells in cells])
+        return (
+            np.concatenate([np.zeros((0, 3), dtype=np.int64)] + cells),
+            np.concatenate([np.zeros((0, 3), dtype=np.int64)] + unwrapped_cells),
+            cell_areas,
+            len(cells),
+            cyclic_area_indices,
+        )
+    relevant_cells = connected_components_algorithm.get_relevant_cells(data, mask, ObjectType.CAVITY)
+    labels, num_labels = connected_components_algorithm.label_components(relevant_cells)
+    links = connected_components_algorithm.find_periodic_links(labels, mask, combined_translation_vectors)
+    label_areas, label_offsets, cyclic_area_indices = connected_components_algorithm.merge_periodic_links(
+        labels, num_labels, links
+    )
+    cells, unwrapped_cells, cell_labels = connected_components_algorithm.get_unwrapped_cells(labels, label_offsets)
+    num_areas = int(label_areas.max()) + 1 if len(label_areas) > 0 else 0
+    return cells, unwrapped_cells, label_areas[cell_labels], num_areas, cyclic_area_indices
+
+
+def _normalized_areas(result, object_type):
+    """
+    Returns the areas of a pipeline result independently of their order: a dictionary that maps the cells of each
+    area (without translation) to a tuple of its cyclic flag and its translated cells shifted to the origin.
+    """
+    if object_type == ObjectType.DOMAIN:
+        _, area_boxes, non_translated_area_boxes, _, cyclic_area_indices = result
+    else:
+        area_boxes, non_translated_area_boxes, cyclic_area_indices = result
+    cyclic_area_indices = set(cyclic_area_indices)
+    normalized_areas = {}
+    for i, (boxes, non_translated_boxes) in enumerate(zip(area_boxes, non_translated_area_boxes)):
+        cells = get_area_cells(boxes)
+        shifted_cells = frozenset(map(tuple, (cells - cells.min(axis=0)).tolist()))
+        non_translated_cells = frozenset(map(tuple, get_area_cells(non_translated_boxes).tolist()))
+        normalized_areas[non_translated_cells] = (i in cyclic_area_indices, shifted_cells)
+    return normalized_areas
+
+
+def compare_results(split_and_merge_result, connected_components_result, object_type):
+    """
+    Logs the differences between the results of the split and merge algorithm and the connected-component labeling
+    and returns whether both found the same areas. The translation of cyclic areas is not compared, because it is
+    ambiguous.
+    """
+    split_and_merge_areas = _normalized_areas(split_and_merge_result, object_type)
+    connected_components_areas = _normalized_areas(connected_components_result, object_type)
+    is_equal = True
+    num_missing = len(split_and_merge_areas.keys() - connected_components_areas.keys())
+    num_additional = len(connected_components_areas.keys() - split_and_merge_areas.keys())
+    if num_missing or num_additional:
+        logger.warn(
+            "Cross validation: {} of {} areas are not found by the connected-component labeling, "
+            "{} additional areas are found".format(num_missing, len(split_and_merge_areas), num_additional)
+        )
+        is_equal = False
+    num_cyclic_differences = 0
+    num_translation_differences = 0
+    for cells in split_and_merge_areas.keys() & connected_components_areas.keys():
+        is_cyclic, translated_cells = split_and_merge_areas[cells]
+        other_is_cyclic, other_translated_cells = connected_components_areas[cells]
+        if is_cyclic != other_is_cyclic:
+            num_cyclic_differences += 1
+        elif not is_cyclic and translated_cells != other_translated_cells:
+            num_translation_differences += 1
+    if num_cyclic_differences:
+        logger.warn("Cross validation: {} areas differ in being cyclic".format(num_cyclic_differences))
+        is_equal = False
+    if num_translation_differences:
+        logger.warn("Cross validation: {} areas differ in their translation".format(num_translation_differences))
+        is_equal = False
+    if is_equal:
+        logger.info("Cross validation: both engines found the same {} areas".format(len(split_and_merge_areas)))
+    return is_equal
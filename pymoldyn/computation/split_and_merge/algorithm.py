@@ -1,51 +1,93 @@
 import itertools
+import multiprocessing
+from multiprocessing import shared_memory
 
 import numpy as np
 
-from ...util import message
+from ...util import env_is_true, message
 from ...util.logger import Logger
-from .domain_centers import calculate_domain_centers as calc_dom
-from .util.node_border_iterator import iterate_node_border_with_adjacent_node_cells
-from .util.numpy_extension import find_index_of_first_element_not_equivalent
+from .util.graph import GraphForSplitAndMerge
 from .util.pos_bool_type import PosBoolType
 
 it = itertools.count(0, 1)
 
 logger = Logger("computation.split_and_merge.algorithm")
 
+# without the C extensions, the NumPy versions of their functions are used
+try:
+    from .domain_centers import calculate_domain_centers as calc_dom
+except ImportError as e:
+    if env_is_true("PYMOLDYN_FORCE_EXTENSIONS"):
+        raise
+    logger.warn(e.__repr__())
+    calc_dom = None
+try:
+    from .util.numpy_extension import find_index_of_first_element_not_equivalent
+except ImportError as e:
+    if env_is_true("PYMOLDYN_FORCE_EXTENSIONS"):
+        raise
+    logger.warn(e.__repr__())
+    find_index_of_first_element_not_equivalent = None
+
+# slabs that are split in parallel are at least this wide (along the x axis)
+MIN_SLAB_WIDTH = 16
+# number of cells that are compared at once by the NumPy homogeneity test
+HOMOGENEITY_CHUNK_SIZE = 1 << 15
+
 
 class ObjectType:
     DOMAIN = next(it)
     CAVITY = next(it)
 
 
-def is_homogenous_split(data_part, mask_part):
-    try:
-        return PosBoolType(
-            find_index_of_first_element_not_equivalent.find_index_of_first_element_not_equivalent(data_part, mask_part)
+def log_python_fallback():
+    if "C extension missing" not in logger.logs:
+        logger.log(Logger.WARN, "Falling back to Python functions", tag="C extension missing")
+        message.log(
+            "Some C extensions could not be loaded, falling back to Python functions. Calculations will be slower!"
         )
-    except TypeError:
-        if "C extension missing" not in logger.logs:
-            logger.warn("Falling back to Python functions")
-            message.log(
-                "Some C extensions could not be loaded, falling back to Python functions."
-                " Calculations may be very slow!",
-                tag="C extension missing",
-            )
-        if data_part[0][0][0] == 0:
-            if mask_part[0][0][0] == 0:
-                ret = np.where(np.logical_or(mask_part != 0, data_part != 0), 1, 0).nonzero()
-            else:
-                ret = np.where(np.logical_or(mask_part == 0, data_part != 0), 1, 0).nonzero()
-        else:
-            if mask_part[0][0][0] == 0:
-                ret = np.where(np.logical_or(mask_part != 0, data_part == 0), 1, 0).nonzero()
-            else:
-                ret = np.where(np.logical_or(mask_part == 0, data_part == 0), 1, 0).nonzero()
+
+
+def get_cell_classes(data, mask):
+    """
+    Returns a uint8 grid with the equivalence class of each cell: bit 0 is set for non-zero data and bit 1 for
+    non-zero mask values. Two cells are equivalent in the sense of "is_homogenous_split" if their classes are equal.
+    """
+    classes = (data != 0).view(np.uint8)
+    classes |= (mask != 0).view(np.uint8) << 1
+    return classes
+
+
+def find_first_inhomogeneity(classes_part):
+    """
+    NumPy version of "find_index_of_first_element_not_equivalent" for a part of a grid of cell classes (see
+    "get_cell_classes"). The part is compared in chunks of x layers and "argmax" stops at the first differing cell of a
+    chunk, so inhomogeneous parts are usually not compared completely.
+    """
+    width, height, depth = classes_part.shape
+    first_class = classes_part[0, 0, 0]
+    num_layers = max(1, HOMOGENEITY_CHUNK_SIZE // (height * depth))
+    for x in range(0, width, num_layers):
+        differs = classes_part[x : x + num_layers] != first_class
+        index = differs.argmax()
+        if differs.flat[index]:
+            dx, y, z = np.unravel_index(index, differs.shape)
+            return PosBoolType((x + int(dx), int(y), int(z)))
+    return PosBoolType((-1, -1, -1))
+
+
+def is_homogenous_split(data_part, mask_part):
+    if find_index_of_first_element_not_equivalent is not None:
         try:
-            return PosBoolType((ret[0][0], ret[1][0], ret[2][0]))
-        except:  # noqa: E722
-            return PosBoolType((-1, -1, -1))
+            return PosBoolType(
+                find_index_of_first_element_not_equivalent.find_index_of_first_element_not_equivalent(
+                    data_part, mask_part
+                )
+            )
+        except TypeError:
+            pass
+    log_python_fallback()
+    return find_first_inhomogeneity(get_cell_classes(data_part, mask_part))
 
 
 def is_homogenous_merge(image_data_part, image_merge_data):
@@ -80,147 +122,390 @@ def is_neighboring(node1, node2):
     return x - w_ <= x_ <= x + w and y - h_ <= y_ <= y + h and z - d_ <= z_ <= z + d
 
 
-def split(data, mask, graph, object_type):
-    node = ((0, 0, 0), data.shape)
-    graph.set_initial_node(node)
-    stack = [node]
+def node_slices(node):
+    (x, y, z), (w, h, d) = node
+    return slice(x, x + w), slice(y, y + h), slice(z, z + d)
+
+
+def split_part(data, mask, graph, object_type, initial_node):
+    """
+    Splits the box "initial_node" into homogenous nodes and removes the nodes that are not relevant or outside of the
+    volume.
+    """
+    graph.set_initial_node(initial_node)
+    if find_index_of_first_element_not_equivalent is None:
+        log_python_fallback()
+        # the classes of the cells are calculated once instead of for every node that contains them
+        classes = get_cell_classes(data[node_slices(initial_node)], mask[node_slices(initial_node)])
+        x0, y0, z0 = initial_node[0]
+
+        def find_inhomogeneity(node):
+            (x, y, z), size = node
+            return find_first_inhomogeneity(classes[node_slices(((x - x0, y - y0, z - z0), size))])
+
+    else:
+
+        def find_inhomogeneity(node):
+            slices = node_slices(node)
+            return is_homogenous_split(data[slices], mask[slices])
+
+    stack = [0]
     while len(stack) > 0:
-        pos, dim = stack.pop()
-        is_hom = is_homogenous_split(
-            data[
-                pos[0] : pos[0] + dim[0],
-                pos[1] : pos[1] + dim[1],
-                pos[2] : pos[2] + dim[2],
-            ],
-            mask[
-                pos[0] : pos[0] + dim[0],
-                pos[1] : pos[1] + dim[1],
-                pos[2] : pos[2] + dim[2],
-            ],
-        )
+        node = stack.pop()
+        slices = node_slices(graph.get_node(node))
+        is_hom = find_inhomogeneity(graph.get_node(node))
         if not is_hom:
-            nodes = graph.split_node((pos, dim), is_hom)
-            for node in nodes:
-                stack.append(node)
-        elif is_relevant_part(
-            data[
-                pos[0] : pos[0] + dim[0],
-                pos[1] : pos[1] + dim[1],
-                pos[2] : pos[2] + dim[2],
-            ],
-            object_type,
-        ) or not is_inside_volume(
-            mask[
-                pos[0] : pos[0] + dim[0],
-                pos[1] : pos[1] + dim[1],
-                pos[2] : pos[2] + dim[2],
-            ]
-        ):
-            graph.remove_node((pos, dim))
-    graph.forbid_splitting()
+            stack.extend(graph.split_node(node, is_hom))
+        elif not is_relevant_part(data[slices], object_type) or not is_inside_volume(mask[slices]):
+            graph.remove_node(node)
+
+
+def _split_slab(args):
+    """
+    Splits one slab of a grid in shared memory and returns the boxes of its nodes (runs in a worker process).
+    """
+    data_name, mask_name, shape, data_dtype, mask_dtype, x_start, x_end, object_type = args
+    data_memory = shared_memory.SharedMemory(name=data_name)
+    mask_memory = shared_memory.SharedMemory(name=mask_name)
+    try:
+        data = np.ndarray(shape, dtype=data_dtype, buffer=data_memory.buf)
+        mask = np.ndarray(shape, dtype=mask_dtype, buffer=mask_memory.buf)
+        graph = GraphForSplitAndMerge(data, mask, None, lambda part: is_relevant_part(part, object_type))
+        split_part(data, mask, graph, object_type, ((x_start, 0, 0), (x_end - x_start,) + tuple(shape[1:])))
+        boxes = graph.get_boxes()
+        del data, mask, graph
+    finally:
+        data_memory.close()
+        mask_memory.close()
+    return boxes
+
+
+def create_split_pool(num_workers):
+    """
+    Creates a process pool for "split" with "num_workers" processes. Starting the processes takes longer than
+    splitting a small grid, so callers that split several grids should create the pool once and pass it to all of
+    them.
+    """
+    # forked processes can inherit locked mutexes (e.g. of the GUI threads), so the workers are spawned
+    return multiprocessing.get_context("spawn").Pool(num_workers)
+
+
+def split(data, mask, graph, object_type, num_workers=1, pool=None):
+    """
+    Splits the grid into homogenous nodes. With several workers, the grid is divided into slabs along the x axis,
+    which are split in a process pool that shares "data" and "mask". The nodes never cross a slab border, but they
+    are joined again in the merge phase, which finds the neighbors in the whole grid. The nodes are numbered slab by
+    slab, so with several workers the areas can be numbered differently and another one of several equally distant
+    cells can become a domain center than with a serial split. "pool" is a pool of at least "num_workers" processes
+    from "create_split_pool"; without it, a pool is created for this grid only.
+    """
+    num_slabs = min(num_workers, data.shape[0] // MIN_SLAB_WIDTH)
+    # worker processes of a pool (e.g. the frame workers) cannot start processes themselves
+    if num_slabs <= 1 or multiprocessing.current_process().daemon:
+        split_part(data, mask, graph, object_type, ((0, 0, 0), data.shape))
+        graph.forbid_splitting()
+        return
+    slab_borders = np.linspace(0, data.shape[0], num_slabs + 1).astype(np.int64).tolist()
+    data_memory = shared_memory.SharedMemory(create=True, size=max(1, data.nbytes))
+    mask_memory = shared_memory.SharedMemory(create=True, size=max(1, mask.nbytes))
+    try:
+        np.ndarray(data.shape, dtype=data.dtype, buffer=data_memory.buf)[...] = data
+        np.ndarray(mask.shape, dtype=mask.dtype, buffer=mask_memory.buf)[...] = mask
+        tasks = [
+            (
+                data_memory.name,
+                mask_memory.name,
+                data.shape,
+                data.dtype,
+                mask.dtype,
+                x_start,
+                x_end,
+                object_type,
+            )
+            for x_start, x_end in zip(slab_borders[:-1], slab_borders[1:])
+        ]
+        if pool is None:
+            with create_split_pool(num_slabs) as pool:
+                slab_boxes = pool.map(_split_slab, tasks)
+        else:
+            slab_boxes = pool.map(_split_slab, tasks)
+    finally:
+        data_memory.close()
+        data_memory.unlink()
+        mask_memory.close()
+        mask_memory.unlink()
+    graph.set_nodes(np.concatenate(slab_boxes))
 
 
 def merge(data, graph):
-    for node, neighbors in graph.items():
-        for neighbor in neighbors:
-            if not graph.is_merged(node, neighbor):
-                pos_node, dim_node = node
-                pos_neighbor, dim_neighbor = neighbor
-                data_node = data[
-                    pos_node[0] : pos_node[0] + dim_node[0],
-                    pos_node[1] : pos_node[1] + dim_node[1],
-                    pos_node[2] : pos_node[2] + dim_node[2],
-                ]
-                data_neighbor = data[
-                    pos_neighbor[0] : pos_neighbor[0] + dim_neighbor[0],
-                    pos_neighbor[1] : pos_neighbor[1] + dim_neighbor[1],
-                    pos_neighbor[2] : pos_neighbor[2] + dim_neighbor[2],
-                ]
-                if is_homogenous_merge(data_node, data_neighbor):
-                    graph.merge_nodes(node, neighbor)
+    nodes, neighbors = graph.get_neighbor_pairs()
+    x, y, z = graph.boxes[:, :3].T
+    signs = np.sign(data[x, y, z])
+    is_homogenous = signs[nodes] == signs[neighbors]
+    for node, neighbor in zip(nodes[is_homogenous].tolist(), neighbors[is_homogenous].tolist()):
+        if not graph.is_merged(node, neighbor):
+            graph.merge_nodes(node, neighbor)
+
+
+def get_box_buckets(box_starts, box_ends, bucket_size):
+    """
+    Returns the row indices and the bucket coordinates of all buckets (cubes with the edge length "bucket_size") that
+    are covered by the closed boxes [box_starts, box_ends]. Each row of the results describes one pair of a box and a
+    bucket.
+    """
+    first_buckets = box_starts // bucket_size
+    bucket_counts = box_ends // bucket_size - first_buckets + 1
+    num_buckets = bucket_counts.prod(axis=1)
+    rows = np.repeat(np.arange(len(box_starts)), num_buckets)
+    bucket_indices = np.arange(len(rows)) - np.repeat(np.cumsum(num_buckets) - num_buckets, num_buckets)
+    counts_y, counts_z = bucket_counts[rows, 1], bucket_counts[rows, 2]
+    bucket_offsets = np.column_stack(
+        (
+            bucket_indices // (counts_y * counts_z),
+            bucket_indices // counts_z % counts_y,
+            bucket_indices % counts_z,
+        )
+    )
+    return rows, first_buckets[rows] + bucket_offsets
 
 
 def add_periodic_neighbors(graph, progress):
+    """
+    Adds all pairs of border nodes that touch each other if the second node is moved by one of its translation vectors.
+    Instead of testing all pairs, the translated boxes are sorted into a spatial hash of cubic buckets, so only boxes
+    that share a bucket are compared. For each pair, the first matching translation vector is used (in the iteration
+    order of the translation vector sets), like in a pairwise comparison.
+    """
     border_node_translation_vectors = graph.get_border_node_translation_vectors()
-    border_nodes = list(border_node_translation_vectors.keys())
-    num_nodes = len(border_nodes[:-1])
-    for i, n in enumerate(border_nodes[:-1]):
+    border_nodes = np.array(list(border_node_translation_vectors.keys()), dtype=np.int64)
+    if len(border_nodes) < 2:
+        return
+    translation_vector_lists = [list(border_node_translation_vectors[n]) for n in border_nodes.tolist()]
+    num_translation_vectors = np.array([len(t) for t in translation_vector_lists], dtype=np.int64)
+    translation_vectors = np.array(
+        [t for vectors in translation_vector_lists for t in vectors], dtype=np.int64
+    ).reshape((-1, 3))
+    # every translated box belongs to a border node (given as index into "border_nodes") and a translation vector
+    translated_box_owners = np.repeat(np.arange(len(border_nodes)), num_translation_vectors)
+    translated_box_vector_indices = np.arange(len(translated_box_owners)) - np.repeat(
+        np.cumsum(num_translation_vectors) - num_translation_vectors, num_translation_vectors
+    )
+    boxes = graph.boxes[border_nodes].astype(np.int64)
+    box_starts = boxes[:, :3]
+    box_ends = box_starts + boxes[:, 3:]
+    translated_box_starts = box_starts[translated_box_owners] + translation_vectors
+    translated_box_ends = box_ends[translated_box_owners] + translation_vectors
+    # translated boxes that are not next to the grid cannot touch any node
+    is_near_grid = np.all(
+        (translated_box_ends >= 0) & (translated_box_starts <= np.array(graph.data.shape)),
+        axis=1,
+    )
+    translated_box_owners = translated_box_owners[is_near_grid]
+    translated_box_vector_indices = translated_box_vector_indices[is_near_grid]
+    translated_box_starts = translated_box_starts[is_near_grid]
+    translated_box_ends = translated_box_ends[is_near_grid]
+
+    bucket_size = max(1, int(np.median(boxes[:, 3:])))
+    translated_box_rows, translated_box_buckets = get_box_buckets(
+        translated_box_starts, translated_box_ends, bucket_size
+    )
+    min_bucket = np.minimum(translated_box_buckets.min(axis=0, initial=0), 0)
+    bucket_grid_shape = np.maximum(translated_box_buckets.max(axis=0, initial=0), box_ends.max(axis=0) // bucket_size)
+    bucket_grid_shape = tuple((bucket_grid_shape - min_bucket + 1).tolist())
+
+    def bucket_keys(buckets):
+        return np.ravel_multi_index(tuple((buckets - min_bucket).T), bucket_grid_shape)
+
+    translated_box_keys = bucket_keys(translated_box_buckets)
+    order = np.argsort(translated_box_keys, kind="stable")
+    sorted_translated_box_rows = translated_box_rows[order]
+    sorted_translated_box_keys = translated_box_keys[order]
+
+    num_nodes = len(border_nodes) - 1
+    chunk_size = max(1, num_nodes // 7)
+    for chunk_start in range(0, num_nodes, chunk_size):
         if progress > 0:
-            message.progress(int(progress + (7 / num_nodes) * i))
-        for m in border_nodes[i + 1 :]:
-            m_x, m_y, m_z = m[0]
-            for translation_vector in border_node_translation_vectors[m]:
-                translated_node = (
-                    (
-                        m_x + translation_vector[0],
-                        m_y + translation_vector[1],
-                        m_z + translation_vector[2],
-                    ),
-                    m[1],
-                )
-                if is_neighboring(n, translated_node):
-                    graph.add_neighbors(n, [m], translation_vectors=[translation_vector])
-                    break
+            message.progress(int(progress + (7 / num_nodes) * chunk_start))
+        chunk = slice(chunk_start, min(chunk_start + chunk_size, num_nodes))
+        node_rows, node_buckets = get_box_buckets(box_starts[chunk], box_ends[chunk], bucket_size)
+        node_rows += chunk_start
+        node_keys = bucket_keys(node_buckets)
+        candidate_starts = np.searchsorted(sorted_translated_box_keys, node_keys, side="left")
+        num_candidates = np.searchsorted(sorted_translated_box_keys, node_keys, side="right") - candidate_starts
+        pair_node_buckets = np.repeat(node_buckets, num_candidates, axis=0)
+        pair_nodes = np.repeat(node_rows, num_candidates)
+        pair_translated_boxes = sorted_translated_box_rows[
+            np.repeat(candidate_starts - np.cumsum(num_candidates) + num_candidates, num_candidates)
+            + np.arange(num_candidates.sum())
+        ]
+        # each pair is only kept in the bucket that contains the start of the intersection of both boxes
+        intersection_starts = np.maximum(box_starts[pair_nodes], translated_box_starts[pair_translated_boxes])
+        intersection_ends = np.minimum(box_ends[pair_nodes], translated_box_ends[pair_translated_boxes])
+        is_pair = (
+            (translated_box_owners[pair_translated_boxes] > pair_nodes)
+            & np.all(intersection_starts <= intersection_ends, axis=1)
+            & np.all(intersection_starts // bucket_size == pair_node_buckets, axis=1)
+        )
+        pair_nodes = pair_nodes[is_pair]
+        pair_neighbors = translated_box_owners[pair_translated_boxes[is_pair]]
+        pair_vector_indices = translated_box_vector_indices[pair_translated_boxes[is_pair]]
+        order = np.lexsort((pair_vector_indices, pair_neighbors, pair_nodes))
+        pair_nodes, pair_neighbors, pair_vector_indices = (
+            pair_nodes[order],
+            pair_neighbors[order],
+            pair_vector_indices[order],
+        )
+        # only the first translation vector of each pair is used
+        is_first = np.ones(len(pair_nodes), dtype=bool)
+        is_first[1:] = (pair_nodes[1:] != pair_nodes[:-1]) | (pair_neighbors[1:] != pair_neighbors[:-1])
+        for node, neighbor, vector_index in zip(
+            pair_nodes[is_first].tolist(), pair_neighbors[is_first].tolist(), pair_vector_indices[is_first].tolist()
+        ):
+            graph.add_neighbors(
+                border_nodes[node].item(),
+                [border_nodes[neighbor].item()],
+                translation_vectors=[translation_vector_lists[neighbor][vector_index]],
+            )
 
 
 def merge_periodic_border(data, graph):
     for border_node, border_neighbors in graph.iter_border_items():
         for border_neighbor in border_neighbors:
             if not graph.is_merged(border_node, border_neighbor, detect_cyclic_merge=True):
-                pos_node, dim_node = border_node
-                pos_neighbor, dim_neighbor = border_neighbor
-                data_node = data[
-                    pos_node[0] : pos_node[0] + dim_node[0],
-                    pos_node[1] : pos_node[1] + dim_node[1],
-                    pos_node[2] : pos_node[2] + dim_node[2],
-                ]
-                data_neighbor = data[
-                    pos_neighbor[0] : pos_neighbor[0] + dim_neighbor[0],
-                    pos_neighbor[1] : pos_neighbor[1] + dim_neighbor[1],
-                    pos_neighbor[2] : pos_neighbor[2] + dim_neighbor[2],
-                ]
+                data_node = data[node_slices(graph.get_node(border_node))]
+                data_neighbor = data[node_slices(graph.get_node(border_neighbor))]
                 if is_homogenous_merge(data_node, data_neighbor):
                     graph.merge_nodes(border_node, border_neighbor)
 
 
-def mark_domain_points(data, areas):
-    for i, area in enumerate(areas):
-        for node in area:
-            x, y, z = node[0]
-            w, h, d = node[1]
-            data[x : x + w, y : y + h, z : z + d] = -(i + 1)
-
-
-def calculate_domain_centers(atoms, combined_translation_vectors, areas):
-    combined_translation_vectors_tuples = [tuple(t) for t in combined_translation_vectors]
-    areas = [list(a) for a in areas]
-    return calc_dom.calculate_domain_centers(atoms, combined_translation_vectors_tuples, areas)
-
-
-def get_domain_area_cells(areas):
-    cell_positions = [
-        [
-            (pos[0] + x, pos[1] + y, pos[2] + z)
-            for pos, dim in area
-            for x, y, z in itertools.product(*(range(c) for c in dim))
-        ]
-        for area in areas
+def get_area_boxes(areas):
+    """
+    Converts areas (sets of nodes) to arrays of shape (n, 6) with the rows (x, y, z, width, height, depth). The boxes
+    are sorted, so the order does not depend on the set order.
+    """
+    return [np.array(sorted(pos + dim for pos, dim in area), dtype=np.int32).reshape((-1, 6)) for area in areas]
+
+
+def mark_domain_points(data, area_boxes):
+    for i, boxes in enumerate(area_boxes):
+        for node in boxes.tolist():
+            data[node_slices((node[:3], node[3:]))] = -(i + 1)
+
+
+def calculate_domain_centers(atoms, combined_translation_vectors, area_boxes, dimensions):
+    """
+    Returns the cell of each area with the largest distance to the nearest atom (or one of its equivalents in the
+    adjacent cells). The distances are taken from a periodic distance field, which is exact for all distances up to
+    its padding. If an area contains larger distances, they can be too large, so the field is calculated again with a
+    padding that covers them. If several cells have the largest distance, the first of them in C order is the
+    center, so the centers do not depend on the order of the boxes.
+    """
+    # imported here, because the core package imports this package
+    from ...core.calculation.distancefield import distance_field
+
+    translation_vectors = np.array([(0, 0, 0)] + [tuple(t) for t in combined_translation_vectors], dtype=np.int64)
+    seeds = (np.asarray(atoms, dtype=np.int64).reshape((-1, 1, 3)) - translation_vectors).reshape((-1, 3))
+    boxes = np.ascontiguousarray(np.concatenate([np.zeros((0, 6))] + list(area_boxes)), dtype=np.int32)
+    area_offsets = np.cumsum([0] + [len(b) for b in area_boxes]).astype(np.int32)
+    centers = np.zeros((len(area_boxes), 3), dtype=np.int32)
+    center_distances = np.zeros(len(area_boxes), dtype=np.int32)
+    # every cell of the grid is this close to the atoms inside of the grid
+    max_padding = int(np.ceil(np.sqrt(np.sum(np.square(dimensions)))))
+    padding = min(max(dimensions) // 8 + 1, max_padding)
+    while True:
+        distances = distance_field(seeds, dimensions, padding)
+        if calc_dom is not None:
+            calc_dom.calculate_domain_centers(distances, boxes, area_offsets, centers, center_distances)
+        else:
+            log_python_fallback()
+            find_area_maxima(distances, boxes, area_offsets, centers, center_distances)
+        max_distance = int(center_distances.max(initial=0))
+        if max_distance <= padding * padding or padding == max_padding:
+            break
+        padding = min(int(np.ceil(np.sqrt(max_distance))), max_padding)
+    return [tuple(center) for center in centers.tolist()]
+
+
+def find_area_maxima(distances, boxes, area_offsets, centers, center_distances):
+    """
+    NumPy version of the C function "calculate_domain_centers": writes the first cell (in C order) with the largest
+    distance of each area and this distance into "centers" and "center_distances". The boxes of area i are the rows
+    "area_offsets[i]" to "area_offsets[i + 1]" of "boxes".
+    """
+    box_volumes = np.prod(boxes[:, 3:], axis=1, dtype=np.int64)
+    area_cell_offsets = np.concatenate(([0], np.cumsum(box_volumes)))[area_offsets]
+    num_area_cells = np.diff(area_cell_offsets)
+    is_empty = num_area_cells == 0
+    centers[is_empty] = 0
+    center_distances[is_empty] = -1
+    if np.all(is_empty):
+        return
+    # the cells of each area are consecutive, so the maxima can be reduced at the first cell of each area
+    cell_indices = np.ravel_multi_index(tuple(get_area_cells(boxes).T), distances.shape)
+    cell_distances = distances.ravel()[cell_indices]
+    area_starts = area_cell_offsets[:-1][~is_empty]
+    max_distances = np.maximum.reduceat(cell_distances, area_starts)
+    is_max = cell_distances == np.repeat(max_distances, num_area_cells[~is_empty])
+    first_cells = np.minimum.reduceat(np.where(is_max, cell_indices, np.iinfo(cell_indices.dtype).max), area_starts)
+    centers[~is_empty] = np.column_stack(np.unravel_index(first_cells, distances.shape))
+    center_distances[~is_empty] = max_distances
+
+
+def get_area_cells(boxes):
+    """
+    Returns the positions of all cells of the given boxes (rows of (x, y, z, width, height, depth)) as an array of
+    shape (n, 3).
+    """
+    boxes = np.asarray(boxes, dtype=np.int64).reshape((-1, 6))
+    volumes = boxes[:, 3:].prod(axis=1)
+    rows = np.repeat(np.arange(len(boxes)), volumes)
+    cell_indices = np.arange(len(rows)) - np.repeat(np.cumsum(volumes) - volumes, volumes)
+    heights, depths = boxes[rows, 4], boxes[rows, 5]
+    cell_offsets = np.column_stack(
+        (cell_indices // (heights * depths), cell_indices // depths % heights, cell_indices % depths)
+    )
+    return boxes[rows, :3] + cell_offsets
+
+
+def reduce_neighborhood(ufunc, grid, axis):
+    """
+    Combines each cell of a grid with its two neighbors along the given axis with a binary ufunc (e.g. np.minimum).
+    Cells outside of the grid are 0.
+    """
+    padded_grid = np.pad(grid, [(1, 1) if a == axis else (0, 0) for a in range(grid.ndim)])
+    n = grid.shape[axis]
+    parts = [
+        padded_grid[tuple(slice(i, i + n) if a == axis else slice(None) for a in range(grid.ndim))] for i in range(3)
     ]
-    return cell_positions
-
-
-def get_domain_surface_cells(data, mask, areas):
-    domain = None
-
-    def func(border_x, border_y, border_z, adjacent_node_cells):
-        if bool(data[border_x, border_y, border_z]) or bool(mask[border_x, border_y, border_z]):
-            for n in adjacent_node_cells:
-                domain.add(n)
-
-    domains = []
-    for area in areas:
-        domain = set()
-        for node in area:
-            iterate_node_border_with_adjacent_node_cells(node, func)
-        domains.append(list(domain))
-    return domains
+    return ufunc(ufunc(parts[0], parts[1]), parts[2])
+
+
+def get_domain_surface_cells(data, mask, combined_translation_vectors, num_domains):
+    """
+    Returns the cells of each domain that have at least one of the 26 adjacent cells outside of the domain. The domains
+    must be marked in data (with -(i + 1) for domain i). Adjacent cells outside of the volume are replaced by their
+    equivalent cells inside of the volume, so domains are continued across the periodic border.
+
+    **Returns:**
+        A list with an int32 array of shape (n, 3) for each domain.
+    """
+    domains = np.where((data < 0) & (mask == 0), -data, 0).astype(np.int32)
+    equivalent_domains = domains.copy()
+    outside_cells = np.argwhere(mask < 0)
+    translation_vectors = np.array(combined_translation_vectors, dtype=np.int64).reshape((-1, 3))
+    equivalent_cells = outside_cells + translation_vectors[-mask[tuple(outside_cells.T)].astype(np.int64) - 1]
+    is_in_grid = np.all((equivalent_cells >= 0) & (equivalent_cells < data.shape), axis=1)
+    equivalent_domains[tuple(outside_cells[is_in_grid].T)] = domains[tuple(equivalent_cells[is_in_grid].T)]
+    # a cell is inside of its domain if the minimum and the maximum of its neighborhood are its own domain
+    neighborhood_min = neighborhood_max = equivalent_domains
+    for axis in range(3):
+        neighborhood_min = reduce_neighborhood(np.minimum, neighborhood_min, axis)
+        neighborhood_max = reduce_neighborhood(np.maximum, neighborhood_max, axis)
+    is_surface_cell = (domains > 0) & ((neighborhood_min != domains) | (neighborhood_max != domains))
+
+    surface_cells = np.argwhere(is_surface_cell).astype(np.int32)
+    surface_cell_domains = domains[is_surface_cell] - 1
+    order = np.argsort(surface_cell_domains, kind="stable")
+    surface_cells = surface_cells[order]
+    offsets = np.searchsorted(surface_cell_domains[order], np.arange(num_domains + 1))
+    return [surface_cells[offsets[i] : offsets[i + 1]] for i in range(num_domains)]
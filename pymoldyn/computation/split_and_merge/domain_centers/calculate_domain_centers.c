@@ -1,167 +1,180 @@
+/**
+ * Finds the center of each domain: the cell with the largest distance to the
+ * nearest atom. The distances are given as a grid (e.g. calculated with a
+ * distance transform), so only the argmax over the cells of each domain is
+ * calculated here. The domains are given as boxes. If several cells of a
+ * domain have the largest distance, the first of them in C order (the one with
+ * the smallest x, then y, then z) is the center, so the result does not depend
+ * on the order of the boxes.
+ */
+#define PY_SSIZE_T_CLEAN
 #include <Python.h>
-#include <limits.h>
+#include <stdint.h>
 
-typedef struct {
-    int x, y, z;
-} point_t;
 
-static PyObject *calculate_domain_centers(PyObject *self, PyObject *args) {
-    PyObject *atoms, *atom;
-    point_t *atom_pos;
-    PyObject *combined_translation_vectors, *combined_translation_vector;
-    point_t *combined_trans_vecs;
-    PyObject *domains, *domain_nodes, *node;
-    point_t node_pos, node_dim;
-
-    PyObject *atoms_it;
-    PyObject *combined_translation_vectors_it;
-    PyObject *domains_it, *domain_nodes_it;
+static int is_signed_integer_format(const char *format, Py_ssize_t itemsize)
+{
+    char type;
 
-    int i, j;
-    int x, y, z;
-    int combined_trans_vecs_count, atom_count;
-    int min_distance, max_distance, current_distance;
-    point_t diff;
-
-    point_t current_center;
+    if (format == NULL) {
+        return 0;
+    }
+    type = format[0];
+    if (type == '@' || type == '=' || type == '<' || type == '>' || type == '!') {
+        type = format[1];
+    }
+    return (type == 'i' || type == 'l') && itemsize == sizeof(int32_t);
+}
 
-    PyObject *centers_list;
+static int is_before(int32_t x, int32_t y, int32_t z, const int32_t position[3])
+{
+    if (x != position[0]) {
+        return x < position[0];
+    }
+    if (y != position[1]) {
+        return y < position[1];
+    }
+    return z < position[2];
+}
 
-    // Parse Python arguments (expecting three lists)
-    if (!PyArg_ParseTuple(args, "OOO", &atoms, &combined_translation_vectors, &domains)) {
+static PyObject *calculate_domain_centers(PyObject *self, PyObject *args) {
+    PyObject *distances_object, *boxes_object, *area_offsets_object, *centers_object, *center_distances_object;
+    Py_buffer distances, boxes, area_offsets, centers, center_distances;
+    Py_buffer *buffers[5] = {&distances, &boxes, &area_offsets, &centers, &center_distances};
+    int num_buffers = 0;
+    const int32_t *distance_grid, *box_data, *offsets;
+    int32_t *center_data, *center_distance_data;
+    Py_ssize_t num_boxes, num_areas, area, box;
+    int k;
+    int error = 1;
+
+    if (!PyArg_ParseTuple(
+            args,
+            "OOOOO",
+            &distances_object,
+            &boxes_object,
+            &area_offsets_object,
+            &centers_object,
+            &center_distances_object)) {
         return NULL;
     }
+    if (PyObject_GetBuffer(distances_object, &distances, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0) {
+        goto cleanup;
+    }
+    num_buffers++;
+    if (PyObject_GetBuffer(boxes_object, &boxes, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0) {
+        goto cleanup;
+    }
+    num_buffers++;
+    if (PyObject_GetBuffer(area_offsets_object, &area_offsets, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0) {
+        goto cleanup;
+    }
+    num_buffers++;
+    if (PyObject_GetBuffer(centers_object, &centers, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT | PyBUF_WRITABLE) < 0) {
+        goto cleanup;
+    }
+    num_buffers++;
+    if (PyObject_GetBuffer(
+            center_distances_object, &center_distances, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT | PyBUF_WRITABLE) < 0) {
+        goto cleanup;
+    }
+    num_buffers++;
 
-    // Ensure atoms is a list
-    if (!PyList_Check(atoms)) {
-        PyErr_SetString(PyExc_TypeError, "First argument must be a list");
-        return NULL;
+    for (k = 0; k < 5; k++) {
+        if (!is_signed_integer_format(buffers[k]->format, buffers[k]->itemsize)) {
+            PyErr_SetString(PyExc_TypeError, "all arguments must be contiguous int32 arrays");
+            goto cleanup;
+        }
+    }
+    if (distances.ndim != 3 || boxes.ndim != 2 || boxes.shape[1] != 6 || area_offsets.ndim != 1 ||
+            centers.ndim != 2 || centers.shape[1] != 3 || center_distances.ndim != 1) {
+        PyErr_SetString(
+            PyExc_ValueError,
+            "expected a distance grid, boxes of shape (n, 6), area offsets, centers of shape (m, 3) and m distances"
+        );
+        goto cleanup;
+    }
+    num_boxes = boxes.shape[0];
+    num_areas = area_offsets.shape[0] - 1;
+    if (num_areas < 0 || centers.shape[0] != num_areas || center_distances.shape[0] != num_areas) {
+        PyErr_SetString(PyExc_ValueError, "the number of centers must be the number of area offsets minus one");
+        goto cleanup;
     }
 
-    atom_count = PyList_Size(atoms);
-    atom_pos = malloc(atom_count * sizeof(point_t));
+    distance_grid = (const int32_t *) distances.buf;
+    box_data = (const int32_t *) boxes.buf;
+    offsets = (const int32_t *) area_offsets.buf;
+    center_data = (int32_t *) centers.buf;
+    center_distance_data = (int32_t *) center_distances.buf;
 
-    // Iterate over atoms list and parse (x, y, z) for each atom
-    atoms_it = PyObject_GetIter(atoms);
-    i = 0;
-    while((atom = PyIter_Next(atoms_it))) {
-        if (!PyArg_ParseTuple(atom, "iii", &atom_pos[i].x, &atom_pos[i].y, &atom_pos[i].z)) {
-            Py_DECREF(atom);
-            Py_DECREF(atoms_it);
-            free(atom_pos);
-            PyErr_SetString(PyExc_TypeError, "Invalid atom format, expected (x, y, z)");
-            return NULL;
-        }
-        ++i;
-        Py_DECREF(atom);
-    }
-    Py_DECREF(atoms_it);
-
-    // Handle combined_translation_vectors
-    combined_trans_vecs_count = PySequence_Size(combined_translation_vectors) + 1;
-    combined_trans_vecs = malloc(combined_trans_vecs_count * sizeof(point_t));
-    combined_trans_vecs[0].x = 0;
-    combined_trans_vecs[0].y = 0;
-    combined_trans_vecs[0].z = 0;
-
-    combined_translation_vectors_it = PyObject_GetIter(combined_translation_vectors);
-    i = 1;
-    while((combined_translation_vector = PyIter_Next(combined_translation_vectors_it))) {
-        if (
-            !PyArg_ParseTuple(
-                combined_translation_vector,
-                "iii",
-                &combined_trans_vecs[i].x,
-                &combined_trans_vecs[i].y,
-                &combined_trans_vecs[i].z
-            )
-        ) {
-            Py_DECREF(combined_translation_vector);
-            Py_DECREF(combined_translation_vectors_it);
-            free(atom_pos);
-            free(combined_trans_vecs);
-            PyErr_SetString(PyExc_TypeError, "Invalid translation vector format, expected (x, y, z)");
-            return NULL;
+    for (area = 0; area < num_areas; area++) {
+        if (offsets[area] < 0 || offsets[area] > offsets[area + 1] || offsets[area + 1] > num_boxes) {
+            PyErr_SetString(PyExc_ValueError, "invalid area offsets");
+            goto cleanup;
         }
-        ++i;
-        Py_DECREF(combined_translation_vector);
-    }
-    Py_DECREF(combined_translation_vectors_it);
-
-    // Prepare centers list
-    centers_list = PyList_New(0);
-
-    // Iterate over domains and calculate centers
-    domains_it = PyObject_GetIter(domains);
-    while((domain_nodes = PyIter_Next(domains_it))) {
-        max_distance = -1;
-        domain_nodes_it = PyObject_GetIter(domain_nodes);
-        while((node = PyIter_Next(domain_nodes_it))) {
-            PyObject *pos_tuple, *dim_tuple;
-            pos_tuple = PyTuple_GetItem(node, 0);
-            dim_tuple = PyTuple_GetItem(node, 1);
-            if (!PyArg_ParseTuple(pos_tuple, "iii", &node_pos.x, &node_pos.y, &node_pos.z)) {
-                Py_DECREF(node);
-                Py_DECREF(domain_nodes_it);
-                Py_DECREF(domain_nodes);
-                Py_DECREF(domains_it);
-                free(atom_pos);
-                free(combined_trans_vecs);
-                return NULL;
-            }
-            if (!PyArg_ParseTuple(dim_tuple, "iii", &node_dim.x, &node_dim.y, &node_dim.z)) {
-                Py_DECREF(node);
-                Py_DECREF(domain_nodes_it);
-                Py_DECREF(domain_nodes);
-                Py_DECREF(domains_it);
-                free(atom_pos);
-                free(combined_trans_vecs);
-                return NULL;
+    }
+    for (box = 0; box < num_boxes; box++) {
+        for (k = 0; k < 3; k++) {
+            const int32_t *b = box_data + 6 * box;
+
+            if (b[k] < 0 || b[k + 3] < 0 || (Py_ssize_t) b[k] + b[k + 3] > distances.shape[k]) {
+                PyErr_SetString(PyExc_ValueError, "all boxes must be inside of the distance grid");
+                goto cleanup;
             }
+        }
+    }
 
-            for (x = node_pos.x; x < node_pos.x + node_dim.x; ++x) {
-                for (y = node_pos.y; y < node_pos.y + node_dim.y; ++y) {
-                    for (z = node_pos.z; z < node_pos.z + node_dim.z; ++z) {
-                        min_distance = INT_MAX;
-                        for (i = 0; i < atom_count; ++i) {
-                            for (j = 0; j < combined_trans_vecs_count; ++j) {
-                                diff.x = (x - atom_pos[i].x + combined_trans_vecs[j].x);
-                                diff.y = (y - atom_pos[i].y + combined_trans_vecs[j].y);
-                                diff.z = (z - atom_pos[i].z + combined_trans_vecs[j].z);
-                                current_distance = diff.x * diff.x + diff.y * diff.y + diff.z * diff.z;
-                                if (current_distance < min_distance) {
-                                    min_distance = current_distance;
-                                }
-                            }
-                        }
-                        if (min_distance > max_distance) {
-                            max_distance = min_distance;
-                            current_center.x = x;
-                            current_center.y = y;
-                            current_center.z = z;
+    Py_BEGIN_ALLOW_THREADS
+    for (area = 0; area < num_areas; area++) {
+        int32_t max_distance = -1;
+        int32_t center[3] = {0, 0, 0};
+
+        for (box = offsets[area]; box < offsets[area + 1]; box++) {
+            const int32_t *b = box_data + 6 * box;
+            int32_t x, y, z;
+
+            for (x = b[0]; x < b[0] + b[3]; x++) {
+                for (y = b[1]; y < b[1] + b[4]; y++) {
+                    const int32_t *line = distance_grid + (x * distances.shape[1] + y) * distances.shape[2];
+
+                    for (z = b[2]; z < b[2] + b[5]; z++) {
+                        if (line[z] > max_distance || (line[z] == max_distance && is_before(x, y, z, center))) {
+                            max_distance = line[z];
+                            center[0] = x;
+                            center[1] = y;
+                            center[2] = z;
                         }
                     }
                 }
             }
-            Py_DECREF(node);
         }
-        Py_DECREF(domain_nodes_it);
-        Py_DECREF(domain_nodes);
-
-        // Append the current center to centers_list
-        PyList_Append(centers_list, Py_BuildValue("(iii)", current_center.x, current_center.y, current_center.z));
+        for (k = 0; k < 3; k++) {
+            center_data[3 * area + k] = center[k];
+        }
+        center_distance_data[area] = max_distance;
     }
-    Py_DECREF(domains_it);
+    Py_END_ALLOW_THREADS
 
-    free(atom_pos);
-    free(combined_trans_vecs);
+    error = 0;
 
-    return centers_list;
+cleanup:
+    for (k = 0; k < num_buffers; k++) {
+        PyBuffer_Release(buffers[k]);
+    }
+    if (error) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
 }
 
 // Method definition object
 static PyMethodDef FindMethods[] = {
-    {"calculate_domain_centers", calculate_domain_centers, METH_VARARGS, "calculates domain center points"},
+    {
+        "calculate_domain_centers",
+        calculate_domain_centers,
+        METH_VARARGS,
+        "writes the cell with the largest distance of each domain and its distance into the given arrays"
+    },
     {NULL, NULL, 0, NULL}  /* Sentinel */
 };
 
@@ -1,317 +1,251 @@
 import itertools as it
 
+import numpy as np
+
 from ....util.logger import Logger
 from .node_border_iterator import iterate_node_border
 
 logger = Logger("computation.split_and_merge.util.graph")
 
+# offsets to one half of the 26 neighbor cells; the other half is covered by swapping the compared cells
+NEIGHBOR_CELL_OFFSETS = tuple(offset for offset in it.product((-1, 0, 1), repeat=3) if offset > (0, 0, 0))
 
-class MergeGroup(object):
-    """
-    Class that collects a group of homogenous nodes. Groups that are divided by the periodic border can be
-    organized in subgroups.
-    The object is intended to be used in two phases:
-
-        1.  Collecting nodes: All nodes are collected in one subgroup. Multiple subgroups are not allowed in this phase.
-        2.  Merging with other MergeGroup objects: Two objects can be merged resulting in one object with separate
-            subgroups. When merging has been started, no additional nodes can be added.
 
+class MergeGroups(object):
     """
+    Disjoint-set union of the nodes of a graph. Like the graph itself, the object is used in two phases:
 
-    class SharedAttributes(object):
-        """
-        Instances of this class can be used to store key value pairs (like in dicts). One instance can be shared between
-        multiple MergeGroup instances so an attribute update will automtically be published to all merge groups that
-        hold a reference to the same shared attributes object.
-        """
+        1.  Merging non periodic neighbors: The nodes of both neighbors are joined to one group.
+        2.  Merging periodic neighbors: The groups of the first phase become subgroups which are joined with a
+            translation offset. The offset of each subgroup (relative to its parent) is stored along with the parent
+            pointers, so a continuous volume can be restored for each group. As soon as this phase has been started,
+            no non periodic neighbors can be merged anymore.
 
-        def __init__(self, **kwargs):
-            for key, value in kwargs.items():
-                setattr(self, key, value)
-
-        def __contains__(self, item):
-            return item in self.__dict__
-
-    def __init__(self, initial_node=None):
-        self._shared_attributes = MergeGroup.SharedAttributes(
-            subgroups=[],
-            translation_vectors=[],  # offset that can be applied to the i-th subgroup to merge it with the next
-            # subgroup in the list
-            all_merge_groups=[self],
-            is_cyclic=False,
-        )
-        self._index_of_primary_subgroup = None  # Saves the index of the first subgroup in the subgroups list that has
-        # been assigned to this MergeGroup object
-        if initial_node is not None:
-            self.add(set([initial_node]))
+    The size of a subgroup is the number of its nodes, unless the sizes of the single nodes are given in "node_sizes".
+    """
 
-    def add(self, nodes):
+    def __init__(self, num_nodes, node_sizes=None):
+        self.num_nodes = num_nodes
+        self.node_sizes = node_sizes
+        self._parents = list(range(num_nodes))
+        self.node_subgroups = None  # subgroup index of each node, the subgroups are sorted by their first node
+        self._subgroup_sizes = None
+        self._subgroup_parents = None
+        self._subgroup_offsets = None  # offset that moves a subgroup next to its parent subgroup
+        self._subgroup_lists = None  # subgroups of each root in the order they have been merged
+        self._is_cyclic = None
+
+    def _find(self, node):
+        root = node
+        while self._parents[root] != root:
+            root = self._parents[root]
+        while self._parents[node] != root:
+            self._parents[node], node = root, self._parents[node]
+        return root
+
+    def _find_subgroup(self, subgroup):
         """
-        Adds nodes from another MergeGroup or a single node.
+        Returns the root of a subgroup. Afterwards, the parent of the subgroup is its root, so its offset is relative
+        to the root.
         """
-        if len(self._subgroups) > 1:
-            raise AddingNodesNotAllowedError("In the merge phase adding nodes is not longer possible.")
+        parents = self._subgroup_parents
+        offsets = self._subgroup_offsets
+        path = []
+        while parents[subgroup] != subgroup:
+            path.append(subgroup)
+            subgroup = parents[subgroup]
+        root = subgroup
+        # the subgroups next to the root are processed first, so the offset of each parent is already relative to root
+        for subgroup in reversed(path):
+            parent = parents[subgroup]
+            if parent != root:
+                offsets[subgroup] = tuple(sc + pc for sc, pc in zip(offsets[subgroup], offsets[parent]))
+                parents[subgroup] = root
+        return root
 
-        if isinstance(nodes, type(self)):
-            # only the nodes of the second merge group are collected. That is NOT a merging operation!
-            self.add(list(nodes))
-        else:
-            if not isinstance(nodes, (set, list)):
-                nodes = [nodes]
-            if len(self._subgroups) == 0:
-                self._subgroups.append(set())
-                self._index_of_primary_subgroup = 0
-            self._subgroups[0].update(nodes)
-
-    def merge(self, merge_group, translation_vector):
+    @property
+    def merging_non_periodic_neighbors_allowed(self):
+        return self.node_subgroups is None
+
+    def start_merging_periodic_neighbors(self):
+        if not self.merging_non_periodic_neighbors_allowed:
+            return
+        roots = np.array([self._find(node) for node in range(self.num_nodes)], dtype=np.int64)
+        # the root of a group always is its first node
+        _, self.node_subgroups = np.unique(roots, return_inverse=True)
+        num_subgroups = int(self.node_subgroups.max()) + 1 if self.num_nodes > 0 else 0
+        self._subgroup_sizes = np.bincount(
+            self.node_subgroups, weights=self.node_sizes, minlength=num_subgroups
+        ).tolist()
+        self._subgroup_parents = list(range(num_subgroups))
+        self._subgroup_offsets = [(0, 0, 0)] * num_subgroups
+        self._subgroup_lists = [[subgroup] for subgroup in range(num_subgroups)]
+        self._is_cyclic = [False] * num_subgroups
+
+    def merge(self, node1, node2):
+        if not self.merging_non_periodic_neighbors_allowed:
+            raise MergingNonBorderNodesNotAllowedError("Non periodic neighbors cannot be merged anymore.")
+        root1 = self._find(node1)
+        root2 = self._find(node2)
+        if root1 < root2:
+            self._parents[root2] = root1
+        elif root2 < root1:
+            self._parents[root1] = root2
+
+    def merge_periodic(self, node1, node2, translation_vector):
         """
-        Merges two MergeGroups by adding the _subgroups of the other merge_group respectively. Therefore, both
-        MergeGroups are changed.
-        It is supposed that the given translation_vector can be applied on the primary subgroup of self to merge it with
-        the primary subgroup of merge_group.
+        Joins the groups of two periodic neighbors. It is supposed that the given translation_vector can be applied
+        on node1 to move it next to node2.
         """
+        self.start_merging_periodic_neighbors()
+        subgroup1 = self.node_subgroups[node1]
+        subgroup2 = self.node_subgroups[node2]
+        root1 = self._find_subgroup(subgroup1)
+        root2 = self._find_subgroup(subgroup2)
+        if root1 == root2:
+            return
+        # the offset of a root is always zero
+        offset1 = self._subgroup_offsets[subgroup1]
+        offset2 = self._subgroup_offsets[subgroup2]
+        self._subgroup_parents[root2] = root1
+        self._subgroup_offsets[root2] = tuple(c1 - tc - c2 for c1, tc, c2 in zip(offset1, translation_vector, offset2))
+        self._subgroup_lists[root1].extend(self._subgroup_lists[root2])
+        self._subgroup_lists[root2] = None
+        self._is_cyclic[root1] = self._is_cyclic[root1] or self._is_cyclic[root2]
 
-        def subtract_vector_list(translation_vector, *vector_lists):
-            for vector in it.chain(*vector_lists):
-                translation_vector = tuple(tc - vc for tc, vc in zip(translation_vector, vector))
-            return translation_vector
-
-        subgroup_count_before_merge = len(self._subgroups)
-
-        self._subgroups.extend(merge_group._subgroups)
-        subtraction_vectors = self._translation_vectors[self._index_of_primary_subgroup :]
-        subtraction_vectors.extend(merge_group._translation_vectors[: merge_group._index_of_primary_subgroup])
-        self._translation_vectors.append(subtract_vector_list(translation_vector, subtraction_vectors))
-        self._translation_vectors.extend(merge_group._translation_vectors)
-
-        self._all_merge_groups.extend(merge_group._all_merge_groups)
-        merge_group._update_all_merge_groups(self._shared_attributes, subgroup_count_before_merge)
-
-    def set_cyclic(self):
-        self._shared_attributes.is_cyclic = True
-
-    def _update_all_merge_groups(self, shared_attributes, index_shift):
-        for merge_group in self._all_merge_groups[:]:
-            merge_group._shared_attributes = shared_attributes
-            merge_group._index_of_primary_subgroup += index_shift
-
-    def __getattr__(self, attr):
-        if attr.startswith("_"):
-            if hasattr(self, "_shared_attributes") and attr[1:] in self._shared_attributes:
-                return getattr(self._shared_attributes, attr[1:])
-        return super(MergeGroup, self).__getattribute__(attr)
-
-    def __contains__(self, node):
-        return any(node in subgroup for subgroup in self._subgroups)
-
-    def __len__(self):
-        return sum(len(subgroup) for subgroup in self._subgroups)
-
-    def __delitem__(self, item):
-        for subgroup in self._subgroups:
-            if item in subgroup:
-                del subgroup[item]
-
-    def __iter__(self):
+    def is_merged(self, node1, node2, detect_cyclic_merge=False):
         """
-        Iterator for the nodes of all subgroups 'as is' -> translation is not applied.
+        If "detect_cyclic_merge" is set, the group is marked as cyclic if both nodes have already been merged as non
+        periodic neighbors. Cyclic merges can only be detected between subgroups, so this starts the second phase.
         """
-        return it.chain(*(subgroup for subgroup in self._subgroups))
+        if detect_cyclic_merge:
+            self.start_merging_periodic_neighbors()
+        if self.merging_non_periodic_neighbors_allowed:
+            return self._find(node1) == self._find(node2)
+        subgroup1 = self.node_subgroups[node1]
+        subgroup2 = self.node_subgroups[node2]
+        root = self._find_subgroup(subgroup1)
+        is_merged = root == self._find_subgroup(subgroup2)
+        if is_merged and detect_cyclic_merge and subgroup1 == subgroup2:
+            self._is_cyclic[root] = True
+        return is_merged
 
-    def iter_with_applied_translation(
-        self,
-        iter_with_non_translated_nodes=False,
-        keep_largest_volume_within_cell=False,
-    ):
+    def get_groups(self):
         """
-        Iterator for the nodes of all subgroups with applied translation -> the result is a continuous volume
+        Returns the group index of each node (the groups are sorted by their first node), an array with the offset of
+        each node that results in a continuous volume for each group and a list of indices of the cyclic groups. The
+        largest subgroup of each group keeps its position.
         """
-
-        def create_node_generator(subgroup, translation_vector):
-            # generator expression must be created in a nested function to avoid late variable binding problems with
-            # "combined_translation_vector"; without a nested function all generator expressions would get the last
-            # value that was assigned to "combined_translation_vector" during the loop iterations in the outer function
-            return ((tuple(nc - tc for nc, tc in zip(pos, translation_vector)), dim) for pos, dim in subgroup)
-
-        def get_generators_from_start_index(index, reverse=False):
-            generators = []
-            if not reverse:
-                factor = 1
-                subgroups = self._subgroups[index:]
-                translation_vectors = self._translation_vectors[index:]
-                combined_translation_vector = (0, 0, 0)
-            else:
-                factor = -1
-                subgroups = self._subgroups[index - 1 :: -1] if index > 0 else []
-                translation_vectors = self._translation_vectors[index - 2 :: -1] if index > 1 else []
-                combined_translation_vector = (
-                    tuple(-c for c in self._translation_vectors[index - 1]) if index > 0 else (0, 0, 0)
-                )
-            iterator = it.zip_longest(subgroups, translation_vectors)
-            for subgroup, translation_vector in iterator:
-                generator = create_node_generator(subgroup, combined_translation_vector)
-                if iter_with_non_translated_nodes:
-                    generators.append(zip(subgroup, generator))
-                else:
-                    generators.append(generator)
-                if translation_vector is not None:
-                    combined_translation_vector = tuple(
-                        cc + factor * tc for cc, tc in zip(combined_translation_vector, translation_vector)
-                    )
-            return generators
-
-        if keep_largest_volume_within_cell:
-            index_of_non_translated_subgroup = max(range(len(self._subgroups)), key=lambda i: len(self._subgroups[i]))
-        else:
-            index_of_non_translated_subgroup = self._index_of_primary_subgroup
-        generators = []
-        backwards_generators = get_generators_from_start_index(index_of_non_translated_subgroup, reverse=True)
-        generators.extend(list(reversed(backwards_generators)))
-        forwards_generators = get_generators_from_start_index(index_of_non_translated_subgroup)
-        generators.extend(forwards_generators)
-        return it.chain(*generators)
-
-    @property
-    def is_cyclic(self):
-        return self._is_cyclic
-
-
-class Graph(object):
-    def __init__(self):
-        self.nodes = {}
-
-    def add_node(self, node, neighbors=None):
-        if neighbors is None:
-            neighbors = set()
-        else:
-            neighbors = set(neighbors)
-
-        if node in self.nodes:
-            self.remove_node(node)
-
-        self.nodes[node] = set()
-        self.add_neighbors(node, neighbors)
-
-    def add_neighbors(self, node, neighbors):
-        for neighbor in neighbors:
-            if neighbor in self.nodes:
-                self.nodes[neighbor].add(node)
-            else:
-                self.add_node(neighbor, [node])
-        self.nodes[node] |= set(neighbors)
-
-    def remove_node(self, node):
-        neighbors = self.nodes[node]
-        self.remove_neighbors(node, self.nodes[node])
-        del self.nodes[node]
-        return neighbors
-
-    def remove_neighbors(self, node, neighbors):
-        for neighbor in neighbors:
-            self.nodes[neighbor] -= set([node])
-        self.nodes[node] -= set(neighbors)
-        return self.nodes[node]
-
-    def get_neighbors(self, node):
-        return self.nodes[node]
-
-    def __contains__(self, node):
-        return node in self.nodes
-
-    def __len__(self):
-        return len(self.nodes)
-
-    def __iter__(self):
-        return self.nodes.__iter__()
-
-    def iterkeys(self):
-        return self.nodes.iterkeys()
-
-    def items(self):
-        return self.nodes.items()
-
-    def itervalues(self):
-        return self.nodes.itervalues()
-
-
-class GraphForSplitAndMerge(Graph):
+        self.start_merging_periodic_neighbors()
+        num_subgroups = len(self._subgroup_sizes)
+        subgroup_roots = [self._find_subgroup(subgroup) for subgroup in range(num_subgroups)]
+        root_groups = {}
+        cyclic_groups = []
+        for root in subgroup_roots:
+            if root not in root_groups:
+                root_groups[root] = len(root_groups)
+                if self._is_cyclic[root]:
+                    cyclic_groups.append(root_groups[root])
+        subgroup_offsets = np.array(self._subgroup_offsets, dtype=np.int64).reshape((-1, 3))
+        for root in root_groups:
+            reference_subgroup = max(self._subgroup_lists[root], key=lambda subgroup: self._subgroup_sizes[subgroup])
+            subgroup_offsets[self._subgroup_lists[root]] -= subgroup_offsets[reference_subgroup].copy()
+        subgroup_groups = np.array([root_groups[root] for root in subgroup_roots], dtype=np.int64)
+        return subgroup_groups[self.node_subgroups], subgroup_offsets[self.node_subgroups], cyclic_groups
+
+
+class GraphForSplitAndMerge(object):
     """
-    Nodes must be tuples of the format ((x, y, z), (width, height, depth)).
+    Nodes are boxes of the format ((x, y, z), (width, height, depth)) that are addressed by their index.
     Graph class which starts with just one initial node. That node can be split
     multiple times at a specified split point (resulting in max 8 sub nodes).
-    Neighboring relationships of the sub nodes are determined automatically.
-    After the split phase, boundary nodes can be detected. If periodic boundary
+    When the split phase is finished, the boxes of all remaining nodes are stored
+    in the (n, 6) int32 array "boxes" (the nodes are renumbered in the order they
+    have been created or passed to "set_nodes") and the neighboring relationships
+    are determined at once and stored as compressed sparse rows ("neighbor_offsets", "neighbor_indices").
+    Afterwards, boundary nodes can be detected. If periodic boundary
     conditions should be considered, the neighboring relationships can be updated
     manually with the found boundary nodes.
     Afterwards, single nodes can be merged together. Internally, they stay as
-    single nodes and merges are logged with other data structures (sets).
+    single nodes and merges are logged with a disjoint-set union (MergeGroups).
     The split method can only be used until merge is called for the first time!
     """
 
     def __init__(self, data, mask, get_translation_vector, is_relevant_part, initial_node=None):
-        Graph.__init__(self)
         self.data = data
         self.mask = mask
         self.get_translation_vector = get_translation_vector
         self.is_relevant_part = is_relevant_part
-        self.merged_nodes = {}
+        self.split_nodes = []  # nodes of the split phase, removed nodes are set to None
+        self.boxes = None
+        self.neighbor_offsets = None
+        self.neighbor_indices = None
+        self.merge_groups = None
         self.border_nodes = None
         self.border_node_translation_vectors = None
         self.border_node_pair_translations = None
         self.split_allowed = True
-        self.adding_non_periodic_neighbors_allowed = True
-        self.merging_non_periodic_neighbors_allowed = True
         self.initial_node_set = False
         if initial_node is not None:
             self.set_initial_node(initial_node)
 
     def set_initial_node(self, initial_node):
         if not self.initial_node_set:
-            self.add_node(initial_node, set())
+            self.split_nodes.append(initial_node)
             self.initial_node_set = True
         else:
-            raise InitialNodeAlreadySetError
+            raise InitialNodeAlreadySetError("The initial node has already been set.")
 
-    def add_node(self, node, potential_neighbors=None):
-        neighbors = self.__find_neighbors(node, potential_neighbors)
-        Graph.add_node(self, node, neighbors)
-        # The new node must be merged with itself because later other nodes could share the set of merged nodes:
-        self.merged_nodes[node] = MergeGroup(node)
+    def get_node(self, node):
+        if self.split_allowed:
+            return self.split_nodes[node]
+        x, y, z, w, h, d = self.boxes[node].tolist()
+        return (x, y, z), (w, h, d)
+
+    def get_neighbors(self, node):
+        self.forbid_splitting()
+        return self.neighbor_indices[self.neighbor_offsets[node] : self.neighbor_offsets[node + 1]]
+
+    def get_neighbor_pairs(self):
+        """
+        Returns two arrays with the nodes of all pairs of non periodic neighbors (every pair is contained once).
+        """
+        self.forbid_splitting()
+        nodes = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.neighbor_offsets))
+        is_first = nodes < self.neighbor_indices
+        return nodes[is_first], self.neighbor_indices[is_first]
 
     def add_neighbors(self, node, neighbors, translation_vectors=None):
-        periodic_border_relationship = translation_vectors is not None
-        if not self.adding_non_periodic_neighbors_allowed:
-            if node not in self.nodes:
-                raise AddingNodesNotAllowedError
-            elif not periodic_border_relationship:
-                raise AddingNonPeriodicNeighborsNotAllowedError
-        Graph.add_neighbors(self, node, neighbors)
-        if periodic_border_relationship:
-            self.adding_non_periodic_neighbors_allowed = False
-            if self.border_nodes is None:
-                self.__mark_border_nodes()
-            self.border_nodes[node] |= set(neighbors)
-            for neighbor, translation_vector in zip(neighbors, translation_vectors):
-                self.border_node_pair_translations[(neighbor, node)] = translation_vector
-                self.border_node_pair_translations[(node, neighbor)] = tuple(-c for c in translation_vector)
+        """
+        Adds neighbors across the periodic border. Non periodic neighbors are determined automatically when the split
+        phase is finished.
+        """
+        if translation_vectors is None:
+            raise AddingNonPeriodicNeighborsNotAllowedError("Only periodic neighbors can be added.")
+        self.forbid_splitting()
+        if self.border_nodes is None:
+            self.__mark_border_nodes()
+        for neighbor, translation_vector in zip(neighbors, translation_vectors):
+            if neighbor not in self.border_nodes[node]:
+                self.border_nodes[node].append(neighbor)
+            self.border_node_pair_translations[(neighbor, node)] = translation_vector
+            self.border_node_pair_translations[(node, neighbor)] = tuple(-c for c in translation_vector)
 
     def remove_node(self, node):
-        Graph.remove_node(self, node)
-        del self.merged_nodes[node]
+        if not self.split_allowed:
+            raise SplitNotAllowedError("Nodes can only be removed in the split phase.")
+        self.split_nodes[node] = None
 
     def split_node(self, node, split_point_rel):
         """
         split_point_rel is that point relative to the left top corner of the node that contains the first inhomogeneity.
         It is implicated that the node data is stored in C order. Therefore, it is possible to split the node into 4
         homogeneous and 4 potential inhomogeneous sub nodes which causes a great speedup of the whole
-        algorithm.
+        algorithm. Returns the indices of the new potential inhomogeneous nodes.
         """
         if self.split_allowed:
-            self.border_nodes = None
-            self.border_node_translation_vectors = None
-            self.border_node_pair_translations = None
-            x, y, z = node[0]
-            w, h, d = node[1]
+            x, y, z = self.split_nodes[node][0]
+            w, h, d = self.split_nodes[node][1]
             x_inh, y_inh, z_inh = split_point_rel
 
             potential_new_homogen_nodes = (
@@ -346,14 +280,15 @@ class GraphForSplitAndMerge(Graph):
             new_inhomogen_nodes = get_relevant_nodes(potential_new_inhomogen_nodes)
             all_new_nodes = set(new_homogen_nodes) | set(new_inhomogen_nodes)
 
-            potential_neighbors = self.get_neighbors(node) | all_new_nodes
             self.remove_node(node)
+            new_node_indices = {}
             for n in all_new_nodes:
-                self.add_node(n, potential_neighbors - set([n]))
+                new_node_indices[n] = len(self.split_nodes)
+                self.split_nodes.append(n)
 
-            return new_inhomogen_nodes
+            return [new_node_indices[n] for n in new_inhomogen_nodes]
         else:
-            raise SplitNotAllowedError
+            raise SplitNotAllowedError("The split phase is already finished.")
 
     def get_border_nodes(self):
         if self.border_nodes is None:
@@ -377,63 +312,105 @@ class GraphForSplitAndMerge(Graph):
             except Exception as e:
                 logger.error("Error when creating translation vectors: {}".format(e))
 
+        self.forbid_splitting()
         self.border_nodes = {}
         self.border_node_translation_vectors = {}
         self.border_node_pair_translations = {}
-        for node in self:
-            node_x, node_y, node_z = node[0]
-            node_w, node_h, node_d = node[1]
-            for x, y, z in it.product(
-                (node_x - 1, node_x + node_w),
-                (node_y - 1, node_y + node_h),
-                (node_z - 1, node_z + node_d),
-            ):
-                if bool(self.mask[x, y, z]):
-                    translation_vectors = set()
-                    iterate_node_border(node, func)
-                    self.border_nodes[node] = set()
-                    self.border_node_translation_vectors[node] = translation_vectors
-                    break
+        positions = self.boxes[:, :3].astype(np.int64)
+        ends = positions + self.boxes[:, 3:]
+        is_border_node = np.zeros(len(self), dtype=bool)
+        for corner in it.product((0, 1), repeat=3):
+            corner_x, corner_y, corner_z = np.where(corner, ends, positions - 1).T
+            is_border_node |= self.mask[corner_x, corner_y, corner_z] != 0
+        for node in np.flatnonzero(is_border_node).tolist():
+            translation_vectors = set()
+            iterate_node_border(self.get_node(node), func)
+            self.border_nodes[node] = []
+            self.border_node_translation_vectors[node] = translation_vectors
+
+    def __find_neighbors(self):
+        """
+        Paints the node indices into a grid and collects all pairs of different nodes in adjacent cells. Since the
+        nodes are boxes, that is the same as testing whether the boxes touch each other (including edges and corners).
+        """
+        cell_nodes = np.full(self.data.shape, -1, dtype=np.int32)
+        for node, (x, y, z, w, h, d) in enumerate(self.boxes.tolist()):
+            cell_nodes[x : x + w, y : y + h, z : z + d] = node
+        num_nodes = len(self)
+        pair_keys = []
+        for offset in NEIGHBOR_CELL_OFFSETS:
+            cells = cell_nodes[tuple(slice(max(0, -c), n - max(0, c)) for c, n in zip(offset, cell_nodes.shape))]
+            adjacent_cells = cell_nodes[
+                tuple(slice(max(0, c), n - max(0, -c)) for c, n in zip(offset, cell_nodes.shape))
+            ]
+            is_pair = (cells != adjacent_cells) & (cells >= 0) & (adjacent_cells >= 0)
+            cells = cells[is_pair]
+            adjacent_cells = adjacent_cells[is_pair]
+            keys = np.minimum(cells, adjacent_cells).astype(np.int64) * num_nodes + np.maximum(cells, adjacent_cells)
+            # cells of the same pair of boxes mostly follow each other, so most duplicates can be dropped before sorting
+            is_new_key = np.ones(len(keys), dtype=bool)
+            np.not_equal(keys[1:], keys[:-1], out=is_new_key[1:])
+            pair_keys.append(keys[is_new_key])
+        pair_keys = np.unique(np.concatenate(pair_keys))
+        first_nodes, second_nodes = np.divmod(pair_keys, num_nodes)
+        nodes = np.concatenate((first_nodes, second_nodes))
+        neighbors = np.concatenate((second_nodes, first_nodes))
+        order = np.lexsort((neighbors, nodes))
+        self.neighbor_indices = neighbors[order]
+        self.neighbor_offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(nodes, minlength=num_nodes), out=self.neighbor_offsets[1:])
+
+    def get_boxes(self):
+        """
+        Returns the boxes of all nodes as (n, 6) int32 array with the rows (x, y, z, width, height, depth).
+        """
+        if not self.split_allowed:
+            return self.boxes
+        return np.array(
+            [node[0] + node[1] for node in self.split_nodes if node is not None],
+            dtype=np.int32,
+        ).reshape((-1, 6))
+
+    def set_nodes(self, boxes):
+        """
+        Sets all nodes at once (e.g. the nodes of independently split parts of the grid) and finishes the split phase.
+        """
+        if not self.split_allowed:
+            raise SplitNotAllowedError("The split phase is already finished.")
+        self.split_nodes = [(tuple(box[:3]), tuple(box[3:])) for box in np.asarray(boxes).tolist()]
+        self.initial_node_set = True
+        self.forbid_splitting()
 
     def forbid_splitting(self):
+        if not self.split_allowed:
+            return
+        boxes = self.get_boxes()
         self.split_allowed = False
+        self.boxes = boxes
+        self.split_nodes = None
+        self.__find_neighbors()
+        self.merge_groups = MergeGroups(len(self))
+
+    def is_periodic_neighbor(self, node1, node2):
+        return self.border_node_pair_translations is not None and (node1, node2) in self.border_node_pair_translations
 
     def merge_nodes(self, node1, node2):
         """
         Only nodes can be merged that are neighboring.
         """
-
-        # Neighbors?
-        if node2 not in self.nodes[node1]:
-            raise NotNeighboringError
         self.forbid_splitting()
-        if not self.is_merged(node1, node2, detect_cyclic_merge=True):
-            separated_by_periodic_boundary_condition = (
-                self.border_nodes is not None and node1 in self.border_nodes and node2 in self.border_nodes[node1]
-            )
-            if not separated_by_periodic_boundary_condition:
-                if not self.merging_non_periodic_neighbors_allowed:
-                    raise MergingNonBorderNodesNotAllowedError
-                # Record all merged nodes of node2 as merged nodes of node1 (node2 is already included)
-                self.merged_nodes[node1].add(self.merged_nodes[node2])
-                # Since the merged nodes of node1 have a reference to self.merged_nodes[node1], they have been already
-                # updated. So, it is only necessary to update the merged_nodes of node2 (which contain node2 already).
-                for merged_node in self.merged_nodes[node2]:
-                    self.merged_nodes[merged_node] = self.merged_nodes[node1]
-            else:
-                self.merging_non_periodic_neighbors_allowed = False
-                self.merged_nodes[node1].merge(
-                    self.merged_nodes[node2],
-                    self.border_node_pair_translations[(node1, node2)],
-                )
-        return node2 in self.merged_nodes[node1]
+        if self.is_periodic_neighbor(node1, node2):
+            if not self.merge_groups.is_merged(node1, node2, detect_cyclic_merge=True):
+                self.merge_groups.merge_periodic(node1, node2, self.border_node_pair_translations[(node1, node2)])
+        elif node2 in self.get_neighbors(node1):
+            self.merge_groups.merge(node1, node2)
+        else:
+            raise NotNeighboringError("Only neighboring nodes can be merged.")
+        return True
 
     def is_merged(self, node1, node2, detect_cyclic_merge=False):
-        # If node2 is not merged with node1 than node1 is not merged with node2, neither.
-        is_merged = node2 in self.merged_nodes[node1]
-        if is_merged and detect_cyclic_merge and self.merged_nodes[node1] is self.merged_nodes[node2]:
-            self.merged_nodes[node1].set_cyclic()
-        return is_merged
+        self.forbid_splitting()
+        return self.merge_groups.is_merged(node1, node2, detect_cyclic_merge)
 
     def get_all_areas(
         self,
@@ -451,62 +428,39 @@ class GraphForSplitAndMerge(Graph):
         """
         if self.split_allowed:
             return []
-        areas = []
-        # Saves non translated areas if "apply_translation" and "with_non_translated_nodes" are set to true
-        alt_areas = [] if with_non_translated_nodes else None
-        cyclic_areas = [] if mark_cyclic_areas else None
-        visited_nodes = set()
-        for node in self:
-            if node not in visited_nodes:
-                area = set()
-                if apply_translation:
-                    node_iterator = self.merged_nodes[node].iter_with_applied_translation(
-                        iter_with_non_translated_nodes=True,
-                        keep_largest_volume_within_cell=True,
-                    )
-                    if with_non_translated_nodes:
-                        alt_area = set()
-                        for merged_node, translated_node in node_iterator:
-                            area.add(translated_node)
-                            alt_area.add(merged_node)
-                            visited_nodes.add(merged_node)
-                        alt_areas.append(alt_area)
-                    else:
-                        for merged_node, translated_node in node_iterator:
-                            area.add(translated_node)
-                            visited_nodes.add(merged_node)
-                else:
-                    node_iterator = self.merged_nodes[node]
-                    for merged_node in node_iterator:
-                        area.add(merged_node)
-                        visited_nodes.add(merged_node)
-                areas.append(area)
-                if mark_cyclic_areas and self.merged_nodes[node].is_cyclic:
-                    cyclic_areas.append(len(areas) - 1)
+        node_areas, node_offsets, cyclic_areas = self.merge_groups.get_groups()
+        num_areas = node_areas.max() + 1 if len(node_areas) > 0 else 0
+        nodes = [((x, y, z), (w, h, d)) for x, y, z, w, h, d in self.boxes.tolist()]
+        areas = [set() for _ in range(num_areas)]
+        if apply_translation:
+            translated_positions = (self.boxes[:, :3] + node_offsets).tolist()
+            for area, node, translated_position in zip(node_areas.tolist(), nodes, translated_positions):
+                areas[area].add((tuple(translated_position), node[1]))
+        else:
+            for area, node in zip(node_areas.tolist(), nodes):
+                areas[area].add(node)
         if apply_translation and with_non_translated_nodes and mark_cyclic_areas:
+            alt_areas = [set() for _ in range(num_areas)]
+            for area, node in zip(node_areas.tolist(), nodes):
+                alt_areas[area].add(node)
             return areas, alt_areas, cyclic_areas
         elif mark_cyclic_areas:
             return areas, cyclic_areas
         else:
             return areas
 
-    def __find_neighbors(self, node, potential_neighbors):
-        x_, y_, z_ = node[0]
-        w_, h_, d_ = node[1]
-        neighbors = set()
-        if potential_neighbors is None:
-            potential_neighbors = self.nodes.keys()
-        for n in potential_neighbors:
-            x, y, z = n[0]
-            w, h, d = n[1]
-            if x - w_ <= x_ <= x + w and y - h_ <= y_ <= y + h and z - d_ <= z_ <= z + d:
-                neighbors.add(n)
-        return neighbors
-
     def iter_border_items(self):
         self.get_border_nodes()  # ensure that self.border_nodes is set correctly
         return self.border_nodes.items()
 
+    def __len__(self):
+        if self.split_allowed:
+            return sum(node is not None for node in self.split_nodes)
+        return len(self.boxes)
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
 
 class NotNeighboringError(Exception):
     def __init__(self, msg):
@@ -532,14 +486,6 @@ class SplitNotAllowedError(Exception):
         return repr(self.msg)
 
 
-class AddingNodesNotAllowedError(Exception):
-    def __init__(self, msg):
-        self.msg = msg
-
-    def __str__(self):
-        return repr(self.msg)
-
-
 class AddingNonPeriodicNeighborsNotAllowedError(Exception):
     def __init__(self, msg):
         self.msg = msg
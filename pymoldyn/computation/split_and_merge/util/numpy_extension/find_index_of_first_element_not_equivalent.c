@@ -10,6 +10,21 @@ typedef struct {
 } point_t;
 
 
+/* Only the equivalence to zero is relevant, so wider values are reduced to 0 or 1 */
+static int read_elem(const char *elem, int itemsize) {
+    switch (itemsize) {
+        case 1:
+            return *(const npy_int8 *) elem != 0;
+        case 2:
+            return *(const npy_int16 *) elem != 0;
+        case 4:
+            return *(const npy_int32 *) elem != 0;
+        default:
+            return *(const npy_int64 *) elem != 0;
+    }
+}
+
+
 static PyObject *find_index_of_first_element_not_equivalent(PyObject *self, PyObject *args) {
     int x, y, z;
     int done = 0;
@@ -19,30 +34,40 @@ static PyObject *find_index_of_first_element_not_equivalent(PyObject *self, PyOb
     PyArrayObject *mask_array;
     int elem, current_elem;
     char mask_elem, current_mask_elem;
-    int *data;
+    char *data;
     char *mask;
+    PyObject *itemsize_object;
+    int data_itemsize;
     npy_intp *shape;
     npy_intp *data_stride, *mask_stride;
 
     if (!PyArg_ParseTuple(args, "OO", &array, &mask_array))
     return NULL;
 
-    data   = (int *)  PyArray_BYTES(array);
+    data   = (char *) PyArray_BYTES(array);
     mask   = (char *) PyArray_BYTES(mask_array);
     shape  = PyArray_DIMS(array);
     data_stride = PyArray_STRIDES(array);
     mask_stride = PyArray_STRIDES(mask_array);
+    /* The numpy C-API is not imported, so the item size is taken from the Python attribute */
+    itemsize_object = PyObject_GetAttrString((PyObject *) array, "itemsize");
+    if (itemsize_object == NULL)
+        return NULL;
+    data_itemsize = (int) PyLong_AsLong(itemsize_object);
+    Py_DECREF(itemsize_object);
+    if (data_itemsize != 1 && data_itemsize != 2 && data_itemsize != 4 && data_itemsize != 8) {
+        PyErr_SetString(PyExc_TypeError, "unsupported item size of the data array");
+        return NULL;
+    }
 
-    elem = *data;
+    elem = read_elem(data, data_itemsize);
     mask_elem = *mask;
     for(x = 0; x < shape[0]; ++x) {
         for(y = 0; y < shape[1]; ++y) {
             for(z = 0; z < shape[2]; ++z) {
-                current_elem = data[
-                    x*data_stride[0]/sizeof(int) +
-                    y*data_stride[1]/sizeof(int) +
-                    z*data_stride[2]/sizeof(int)
-                ];
+                current_elem = read_elem(
+                    data + x*data_stride[0] + y*data_stride[1] + z*data_stride[2], data_itemsize
+                );
                 current_mask_elem = mask[x*mask_stride[0] + y*mask_stride[1] + z*mask_stride[2]];
                 if(!IS_EQUIVALENT(current_elem, elem) || !IS_EQUIVALENT(current_mask_elem, mask_elem)) {
                     pos.x = x;
@@ -58,6 +58,8 @@ class Configuration(ConfigNode):
             self.std_cutoff_radius = 2.8
             self.std_resolution = 64
             self.max_cachefiles = 0
+            # "split_and_merge", "connected_components" or "cross_validation"
+            self.labeling_engine = "split_and_merge"
 
     class Path(ConfigNode):
 
@@ -52,6 +52,11 @@ additional parameter to the CavityCalculation:
         use_surface_points=False,
     )
 
+Both calculations create triangle meshes of all domains or cavities by default.
+If only volumes, surface areas and other statistics are needed (e.g. for batch
+calculations), ``triangles=False`` only calculates the surface areas. The
+meshes can still be created later by calling the ``triangles`` method.
+
 The FakeDomainCalculation class provides a drop-in replacement for the
 domain_calculation object in case the results of a previous calculation need to
 be used (this is possible as only those attributes which are stored are
@@ -71,13 +76,24 @@ from math import pi as PI
 
 import numpy as np
 
+from ...computation.engine import get_cavity_area_cells, start_labeling_pipeline
 from ...computation.split_and_merge.algorithm import ObjectType
-from ...computation.split_and_merge.pipeline import start_split_and_merge_pipeline
 from ...util import message
 from ...util.logger import Logger
 from ...util.message import print_message
-from ..calculation.gyrationtensor import calculate_gyration_tensor_parameters
-from .extension import atomstogrid, cavity_intersections, cavity_triangles, mark_cavities
+from ..calculation.gyrationtensor import (
+    calculate_box_gyration_tensor_parameters,
+    calculate_cell_gyration_tensor_parameters,
+)
+from .extension import (
+    AtomSubgrid,
+    atomstogrid,
+    cavity_intersection_pairs,
+    cavity_surface_areas_multi,
+    cavity_triangles_multi,
+    mark_cavities,
+)
+from .labelstatistics import LabelStatistics, group_touching_labels, label_dtype, label_runs
 
 dimension = 3
 dimensions = range(dimension)
@@ -86,12 +102,33 @@ logger = Logger("core.calculation.algorithm")
 logger.setstream("default", sys.stdout, Logger.WARNING)
 
 
+def label_triangles(grid, label_groups, isolevel, discretization):
+    """
+    Creates the triangle meshes of groups of labels of a domain or cavity
+    grid. All groups are triangulated with a single call, the C extension
+    processes them in parallel.
+
+    **Returns:**
+        A tuple of a list with the ``(vertices, normals, indices)`` mesh of
+        each group and a list with the surface area of each group.
+    """
+    step = (discretization.s_step,) * 3
+    offset = discretization.discrete_to_continuous((0, 0, 0))
+    results = cavity_triangles_multi(grid, label_groups, isolevel, step, offset, discretization.grid)
+    triangles = [(vertices, normals, indices) for vertices, normals, indices, _ in results]
+    surface_areas = [surface_area for _, _, _, surface_area in results]
+    return triangles, surface_areas
+
+
 class DomainCalculation:
     """
     Cavity domain calulation is performed by the following steps:
 
     1.  A grid is created with the resolution defined in the volume
-        discretization and filled with zeros.
+        discretization and filled with zeros. The grid uses the smallest
+        integer type that can hold all atom labels; it is widened after step 2
+        if the remaining empty points might form more domains than fit into
+        this type.
 
     2.  For each atom, all points in the grid closer to this atom than the
         discrete cavity cutoff radius are set to a point indicating the atom
@@ -104,34 +141,65 @@ class DomainCalculation:
         (points with a neighbor outside of the cavity domain) stored in lists.
         Points inside of a domain are marked with a negative value indicating
         which domain they are part of.
+
+    If an `atom_grid` is given (a boolean grid which is ``True`` for all points
+    inside of the volume and inside of the cutoff radius of any atom, e.g. from
+    :class:`~.distancefield.AtomDistanceFields`), steps 1 and 2 only convert
+    it. Atom points are marked with 1 instead of the atom index in this case;
+    the following steps only distinguish atom points from empty ones.
+    Without `triangles`, only the surface areas are calculated and the
+    domain cells are kept as runs (see :func:`~.labelstatistics.label_runs`)
+    in `cell_runs`, so the meshes can be created later without repeating the
+    calculation.
+    With `split_workers` processes, the grid is split in slabs in step 3
+    (see :func:`computation.split_and_merge.algorithm.split`). They are taken
+    from `split_pool` if it is given, so several calculations can share the
+    pool instead of starting their own processes.
     """
 
-    def __init__(self, discretization, atom_discretization):
-        # step 1
+    # isolevel of the domain meshes in the counts grid of `cavity_triangles_multi`
+    isolevel = 1
+
+    def __init__(
+        self, discretization, atom_discretization, triangles=True, atom_grid=None, split_workers=1, split_pool=None
+    ):
         self.discretization = discretization
         self.atom_discretization = atom_discretization
-        self.grid = np.zeros(self.discretization.d, dtype=np.int64)
-
-        message.progress(13)
-
-        # step 2
-        atomstogrid(
-            self.grid,
-            self.atom_discretization.discrete_positions,
-            self.atom_discretization.atoms.radii_as_indices,
-            self.atom_discretization.sorted_discrete_radii,
-            [(0, 0, 0)] + self.discretization.combined_translation_vectors,
-            self.discretization.grid,
-        )
+        if atom_grid is None:
+            # step 1
+            num_atoms = self.atom_discretization.atoms.number
+            self.grid = np.zeros(self.discretization.d, dtype=label_dtype(num_atoms))
+
+            message.progress(13)
+
+            # step 2
+            atomstogrid(
+                self.grid,
+                self.atom_discretization.halo,
+                self.atom_discretization.atoms.radii_as_indices,
+                self.atom_discretization.sorted_discrete_radii,
+                self.discretization.grid,
+            )
+        else:
+            # steps 1 and 2
+            num_atoms = 1
+            self.grid = atom_grid.astype(label_dtype(num_atoms))
+        # every domain contains at least one empty point inside of the volume
+        max_num_domains = np.count_nonzero((self.grid == 0) & (self.discretization.grid == 0))
+        grid_dtype = label_dtype(max(num_atoms, max_num_domains))
+        if grid_dtype != self.grid.dtype:
+            self.grid = self.grid.astype(grid_dtype)
         message.progress(16)
         # step 3
-        result = start_split_and_merge_pipeline(
+        result = start_labeling_pipeline(
             self.grid,
             self.discretization.grid,
             self.atom_discretization.discrete_positions,
             self.discretization.combined_translation_vectors,
             self.discretization.get_translation_vector,
             ObjectType.DOMAIN,
+            num_workers=split_workers,
+            split_pool=split_pool,
         )
         (
             self.centers,
@@ -143,19 +211,17 @@ class DomainCalculation:
         print_message("Number of domains:", len(self.centers))
         message.progress(20)
 
-        self.domain_volumes = []
-        self.critical_domains = []  # count of very small domains -> domains that can disappear on cutoff radius changes
-        for domain_index in range(len(self.centers)):
-            current_cell_sum = (self.grid == -(domain_index + 1)).sum()
-            if current_cell_sum == 1:
-                self.critical_domains.append(domain_index)
-            domain_volume = current_cell_sum * (self.discretization.s_step**3)
-            self.domain_volumes.append(domain_volume)
+        self.label_statistics = LabelStatistics(self.grid, len(self.centers))
+        self.domain_volumes = self.label_statistics.volumes(self.discretization.s_step**3)
+        # very small domains -> domains that can disappear on cutoff radius changes
+        self.critical_domains = self.label_statistics.critical_labels
 
         self.characteristic_radii = [(0.75 * volume / PI) ** (1.0 / 3.0) for volume in self.domain_volumes]
 
         if translated_areas:
-            gyration_tensor_parameters = tuple(calculate_gyration_tensor_parameters(area) for area in translated_areas)
+            gyration_tensor_parameters = tuple(
+                calculate_box_gyration_tensor_parameters(area) for area in translated_areas
+            )
             (
                 self.mass_centers,
                 self.squared_gyration_radii,
@@ -180,30 +246,65 @@ class DomainCalculation:
                 self.anisotropies,
             ) = 5 * ([],)
 
-        self.triangles()
+        if triangles:
+            self.triangles()
+        else:
+            self.surface_areas()
+            self.cell_runs = label_runs(self.grid)
 
     def triangles(self):
         if hasattr(self, "domain_triangles"):
             return self.domain_triangles
         number_of_domains = len(self.centers)
         print_message("Number of domains:", number_of_domains)
-        triangles = []
-        surface_areas = []
-        step = (self.discretization.s_step,) * 3
-        offset = self.discretization.discrete_to_continuous((0, 0, 0))
-        for domain_index in range(number_of_domains):
-            print_message("Calculating triangles for domain", domain_index)
-            message.progress(int(20 + (20 / number_of_domains) * domain_index))
-            vertices, normals, surface_area = cavity_triangles(
-                self.grid, [domain_index], 1, step, offset, self.discretization.grid
-            )
-            triangles.append((vertices, normals))
-            surface_areas.append(surface_area)
+        print_message("Calculating triangles for all domains")
+        message.progress(20)
+        triangles, surface_areas = label_triangles(
+            self.grid,
+            [[domain_index] for domain_index in range(number_of_domains)],
+            self.isolevel,
+            self.discretization,
+        )
+        message.progress(40)
 
         self.domain_triangles = triangles
         self.domain_surface_areas = surface_areas
         return triangles
 
+    def surface_areas(self):
+        """
+        Calculates the surface areas of all domains without keeping the
+        triangles, which are only needed for visualization.
+        """
+        if hasattr(self, "domain_surface_areas"):
+            return self.domain_surface_areas
+        step = (self.discretization.s_step,) * 3
+        offset = self.discretization.discrete_to_continuous((0, 0, 0))
+        print_message("Calculating surface areas for all domains")
+        message.progress(20)
+        self.domain_surface_areas = cavity_surface_areas_multi(
+            self.grid,
+            [[domain_index] for domain_index in range(len(self.centers))],
+            self.isolevel,
+            step,
+            offset,
+            self.discretization.grid,
+        )
+        message.progress(40)
+        return self.domain_surface_areas
+
+
+def create_atom_subgrid(discretization, atom_discretization):
+    """
+    Create the subgrid of the cavity calculation steps 1 and 2 (see
+    :class:`CavityCalculation`). It must be freed with its ``free`` method.
+    """
+    return AtomSubgrid(
+        atom_discretization.sorted_discrete_radii[0],
+        discretization.d,
+        atom_discretization.halo.images,
+    )
+
 
 class CavityCalculation:
     """
@@ -221,6 +322,11 @@ class CavityCalculation:
         domain index. (These might also be moved with the translation vectors
         and might thereby also be outside of the volume.)
 
+    Only the images of the atoms and surface points that are at most two
+    subgrid cells away from the grid are used in steps 2 and 3 (see
+    :meth:`~.discretization.Discretization.halo`), the cells that contain
+    other images are never read in step 5.
+
     4.  A new grid is created (grid3) and each point in this grid is set to
         zero if it is outside of the volume or part inside of the cavity cutoff
         radius of an atom, or a negative value if it is part of a cavity domain
@@ -234,8 +340,9 @@ class CavityCalculation:
         value.
 
     6.  At this point, two cavities constructed from two cavity domains might
-        actually be one multicavity. In this step, these are found and a list
-        of multicavities is created.
+        actually be one multicavity. In this step, all pairs of touching
+        cavities are collected and joined with a disjoint-set union to create
+        the list of multicavities.
 
     About the subgrid cells:
     If a point inside a subgrid cell was marked as 'near an atom' during the
@@ -248,13 +355,25 @@ class CavityCalculation:
     To calculate center-based cavities, use a grid filled with zeros instead of
     resuing some values from the domain calculation grid and then iterate over
     the domain centers instead of the domain surface points.
+
+    Steps 1 and 2 only depend on the atoms, so the subgrid can be created once
+    with :func:`create_atom_subgrid` and passed as `subgrid` to the surface-
+    and center-based cavity calculations of a frame. Its owner must free it.
+
+    Like in :class:`DomainCalculation`, the cavity cells are kept in
+    `cell_runs` if no `triangles` are calculated.
     """
 
+    # isolevel of the multicavity meshes in the counts grid of `cavity_triangles_multi`
+    isolevel = 4
+
     def __init__(
         self,
         domain_calculation,
         use_surface_points=True,
         gyration_tensor_parameters=False,
+        triangles=True,
+        subgrid=None,
     ):
         self.domain_calculation = domain_calculation
         if use_surface_points:
@@ -270,10 +389,15 @@ class CavityCalculation:
         if use_surface_points:
             domain_seed_point_lists = self.domain_calculation.surface_point_list
         else:
-            domain_seed_point_lists = [[center] for center in self.domain_calculation.centers]
+            domain_seed_point_lists = [np.array([center], dtype=np.int32) for center in self.domain_calculation.centers]
 
         discretization = self.domain_calculation.discretization
         atom_discretization = self.domain_calculation.atom_discretization
+        domain_seed_points = np.concatenate([np.zeros((0, 3), dtype=np.int32)] + list(domain_seed_point_lists))
+        domain_seed_indices = np.repeat(
+            np.arange(len(domain_seed_point_lists)), [len(seed_points) for seed_points in domain_seed_point_lists]
+        )
+        domain_halo = discretization.halo(domain_seed_points, 2 * self.sg_cube_size)
 
         # steps 1 to 5
         self.grid3 = mark_cavities(
@@ -281,79 +405,60 @@ class CavityCalculation:
             discretization.grid,
             discretization.d,
             self.sg_cube_size,
-            atom_discretization.discrete_positions,
-            [(0, 0, 0)] + discretization.combined_translation_vectors,
-            domain_seed_point_lists,
+            atom_discretization.halo.images,
+            domain_halo.images,
+            np.repeat(domain_seed_indices, np.diff(domain_halo.offsets)),
             use_surface_points,
+            dtype=label_dtype(len(self.domain_calculation.centers)),
+            subgrid=subgrid,
         )
         message.progress(43 + progress_bar_offset)
 
-        if gyration_tensor_parameters:
-            message.print_message("Calculating gyration tensor parameters")
-            result = start_split_and_merge_pipeline(
-                self.grid3,
-                discretization.grid,
-                atom_discretization.discrete_positions,
-                discretization.combined_translation_vectors,
-                discretization.get_translation_vector,
-                ObjectType.CAVITY,
-                progress=43 + progress_bar_offset,
-            )
-            translated_areas, non_translated_areas, cyclic_area_indices = result
         message.progress(50 + progress_bar_offset)
 
         num_domains = len(self.domain_calculation.centers)
-        self.cavity_volumes = []
-        print(num_domains)
-        for domain_index in range(num_domains):
-            self.cavity_volumes.append(1.0 * (self.grid3 == -(domain_index + 1)).sum() * (discretization.s_step**3))
-            message.progress(int(50 + progress_bar_offset + (7 / num_domains) * domain_index))
+        self.label_statistics = LabelStatistics(self.grid3, num_domains)
+        self.cavity_volumes = self.label_statistics.volumes(discretization.s_step**3)
+        message.progress(57 + progress_bar_offset)
         self.characteristic_radii = [(0.75 * volume / PI) ** (1.0 / 3.0) for volume in self.cavity_volumes]
 
         # step 6
-        intersection_table = cavity_intersections(self.grid3, num_domains)
-        multicavities = []
-        cavity_to_neighbors = num_domains * [None]
-        for domain in range(num_domains):
-            message.progress(int(55 + progress_bar_offset + (13 / num_domains) * domain))
-            current_neighbors = set([domain])
-            for neighbor in range(num_domains):
-                if intersection_table[domain][neighbor] == 1:
-                    current_neighbors.add(neighbor)
-            for multicavity in multicavities[:]:
-                if any([neighbor in multicavity for neighbor in current_neighbors]):
-                    current_neighbors = current_neighbors | multicavity
-                    multicavities.remove(multicavity)
-            multicavities.append(current_neighbors)
-            for neighbor in current_neighbors:
-                cavity_to_neighbors[neighbor] = current_neighbors
-        self.multicavities = multicavities
-        self.multicavity_volumes = []
-        for multicavity in multicavities:
-            self.multicavity_volumes.append(sum(self.cavity_volumes[cavity_index] for cavity_index in multicavity))
+        self.multicavities, self.cavity_to_multicavity = group_touching_labels(
+            num_domains, cavity_intersection_pairs(self.grid3)
+        )
+        message.progress(68 + progress_bar_offset)
+        self.multicavity_volumes = (
+            np.bincount(
+                self.cavity_to_multicavity,
+                weights=self.label_statistics.counts,
+                minlength=len(self.multicavities),
+            )
+            * discretization.s_step**3
+        ).tolist()
         print_message("Multicavity volumes:", self.multicavity_volumes)
 
         if gyration_tensor_parameters:
-            if len(self.multicavities) == len(
-                translated_areas
-            ):  # TODO check weather split and merge and multicavity intersection give the same result for multicavities
-                # `self.multicavities` entries are sorted by the largest contained neighbor index. Thus sort the indices
-                # to access `non_translated_areas` and `translated_areas` to match the order of `self.multicavities`.
-                def key_func(cavity_index):
-                    cavity_area = non_translated_areas[cavity_index]
-                    a_single_cavity_index = -self.grid3[cavity_area[0]] - 1
-                    max_neighbor_index = max(cavity_to_neighbors[a_single_cavity_index])
-                    return max_neighbor_index
-
-                sorted_area_indices = sorted(range(len(self.multicavities)), key=key_func)
-                sorted_translated_areas = [translated_areas[i] for i in sorted_area_indices]
-                sorted_cyclic_area_indices = [
-                    i for i, index in enumerate(sorted_area_indices) if index in cyclic_area_indices
-                ]
-                self.cyclic_area_indices = sorted_cyclic_area_indices
-
-                gyration_tensor_parameters = tuple(
-                    calculate_gyration_tensor_parameters(area) for area in sorted_translated_areas
+            message.print_message("Calculating gyration tensor parameters")
+            # the periodic areas of the cavity cells are only needed to unwrap the multicavities
+            cells, unwrapped_cells, cell_areas, num_areas, cyclic_area_indices = get_cavity_area_cells(
+                self.grid3,
+                discretization.grid,
+                discretization.combined_translation_vectors,
+                discretization.get_translation_vector,
+            )
+            cell_multicavities = self.cavity_to_multicavity[-self.grid3[tuple(cells.T)].astype(np.int64) - 1]
+            area_multicavities = np.full(num_areas, -1, dtype=np.int64)
+            area_multicavities[cell_areas] = cell_multicavities
+            # every area must be exactly one multicavity
+            if (
+                num_areas == len(self.multicavities)
+                and np.array_equal(area_multicavities[cell_areas], cell_multicavities)
+                and np.array_equal(np.sort(area_multicavities), np.arange(num_areas))
+            ):
+                self.cyclic_area_indices = sorted(area_multicavities[cyclic_area_indices].tolist())
+
+                gyration_tensor_parameters = calculate_cell_gyration_tensor_parameters(
+                    unwrapped_cells, cell_multicavities, len(self.multicavities)
                 )
                 (
                     self.mass_centers,
@@ -381,7 +486,11 @@ class CavityCalculation:
                     self.anisotropies,
                 ) = 5 * ([],)
 
-        self.triangles()
+        if triangles:
+            self.triangles()
+        else:
+            self.surface_areas()
+            self.cell_runs = label_runs(self.grid3)
 
     def squared_distance(self, a, b):
         """
@@ -399,26 +508,34 @@ class CavityCalculation:
     def triangles(self):
         if hasattr(self, "cavity_triangles"):
             return self.cavity_triangles
-        step = (self.domain_calculation.discretization.s_step,) * 3
-        offset = self.domain_calculation.discretization.discrete_to_continuous((0, 0, 0))
-        triangles = []
-        surface_areas = []
-        for i, multicavity in enumerate(self.multicavities):
-            print_message("Generating triangles for multicavity:", i + 1)
-            vertices, normals, surface_area = cavity_triangles(
-                self.grid3,
-                multicavity,
-                4,
-                step,
-                offset,
-                self.domain_calculation.discretization.grid,
-            )
-            triangles.append((vertices, normals))
-            surface_areas.append(surface_area)
+        print_message("Generating triangles for {} multicavities".format(len(self.multicavities)))
+        triangles, surface_areas = label_triangles(
+            self.grid3, self.multicavities, self.isolevel, self.domain_calculation.discretization
+        )
 
         self.cavity_triangles = triangles
         self.cavity_surface_areas = surface_areas
-        return cavity_triangles
+        return triangles
+
+    def surface_areas(self):
+        """
+        Calculates the surface areas of all multicavities without keeping the
+        triangles, which are only needed for visualization.
+        """
+        if hasattr(self, "cavity_surface_areas"):
+            return self.cavity_surface_areas
+        step = (self.domain_calculation.discretization.s_step,) * 3
+        offset = self.domain_calculation.discretization.discrete_to_continuous((0, 0, 0))
+        print_message("Calculating surface areas for {} multicavities".format(len(self.multicavities)))
+        self.cavity_surface_areas = cavity_surface_areas_multi(
+            self.grid3,
+            self.multicavities,
+            self.isolevel,
+            step,
+            offset,
+            self.domain_calculation.discretization.grid,
+        )
+        return self.cavity_surface_areas
 
     def __getattr__(self, attr):
         optional_attributes = (
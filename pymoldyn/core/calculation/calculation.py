@@ -4,17 +4,32 @@ can be started with a simple method call.
 Additionally, results are stored in a cache and can be reused later.
 """
 
+import collections
+import copy
+import functools
+import multiprocessing
 import os
+import queue
 import sys
 from hashlib import sha256
 
+from ...computation.split_and_merge.algorithm import create_split_pool
 from ...config.configuration import config
 from ...util import message
 from ...util.logger import Logger
 from .. import data, file
 from ..file import File, FileError
-from .algorithm import CavityCalculation, DomainCalculation, FakeDomainCalculation
+from .algorithm import (
+    CavityCalculation,
+    DomainCalculation,
+    FakeDomainCalculation,
+    create_atom_subgrid,
+    label_triangles,
+)
 from .discretization import AtomDiscretization, DiscretizationCache
+from .distancefield import AtomDistanceFields
+from .extension import set_num_threads
+from .labelstatistics import grid_from_label_runs
 
 __all__ = [
     "Calculation",
@@ -45,6 +60,10 @@ class CalculationSettings(object):
             calculate center-based cavities
         `recalculate` :
             results will be calculated even if cached results exists
+        `triangles` :
+            calculate the triangle meshes of domains and cavities. If
+            ``False``, only their surface areas are calculated and the meshes
+            are created when they are needed (e.g. for the visualization).
         `exporthdf` :
             ``True`` if the results should be written into a hdf5 file.
             If ``False``, they are stored in the cache.
@@ -58,6 +77,14 @@ class CalculationSettings(object):
             calculate bonds
         `dihedral_angles` :
             calculate dihedral angles
+        `workers` :
+            number of processes that calculate frames in parallel; the
+            results are still written (and exported) in frame order by a
+            single process
+        `split_workers` :
+            number of processes that split the grid of a frame in the split
+            and merge algorithm; with more than one process, the domains can
+            be numbered differently than with a serial split
     """
 
     def __init__(
@@ -70,10 +97,13 @@ class CalculationSettings(object):
         center_cavities=False,
         gyration_tensor=False,
         recalculate=False,
+        triangles=True,
         exporthdf5=False,
         exporttext=False,
         exportsingletext=False,
         exportdir=None,
+        workers=1,
+        split_workers=1,
     ):
         """ """
         self.datasets = datasets
@@ -84,12 +114,15 @@ class CalculationSettings(object):
         self.center_cavities = center_cavities
         self.gyration_tensor = gyration_tensor
         self.recalculate = recalculate
+        self.triangles = triangles
         self.exporthdf5 = exporthdf5
         self.exporttext = exporttext
         self.exportsingletext = exportsingletext
         self.exportdir = exportdir
         self.bonds = False
         self.dihedral_angles = False
+        self.workers = workers
+        self.split_workers = split_workers
 
     def copy(self):
         """
@@ -106,12 +139,15 @@ class CalculationSettings(object):
         dup.center_cavities = self.center_cavities
         dup.gyration_tensor = self.gyration_tensor
         dup.recalculate = self.recalculate
+        dup.triangles = self.triangles
         dup.exporthdf5 = self.exporthdf5
         dup.exporttext = self.exporttext
         dup.exportsingletext = self.exportsingletext
         dup.exportdir = self.exportdir
         dup.bonds = self.bonds
         dup.dihedral_angles = self.dihedral_angles
+        dup.workers = self.workers
+        dup.split_workers = self.split_workers
         return dup
 
 
@@ -246,6 +282,7 @@ class Calculation(object):
             if resolution is None:
                 resolution = 64
             results = data.Results(filepath, frame, resolution, inputfile.getatoms(frame), None, None, None)
+        self._settriangulation(results)
         return results
 
     def calculateframe(
@@ -260,7 +297,10 @@ class Calculation(object):
         atoms=None,
         gyration_tensor_parameters=False,
         recalculate=False,
+        triangles=True,
+        split_workers=1,
         last_frame=True,
+        split_pool=None,
     ):
         """
         Get results for the given parameters. They are either loaded from the
@@ -286,13 +326,70 @@ class Calculation(object):
                 cavity domains)
             `recalculate` :
                 results will be calculated even if cached results exists
+            `triangles` :
+                calculate the triangle meshes; if ``False``, they are created
+                when they are accessed for the first time
+            `split_workers` :
+                number of processes that split the grid in the split and merge
+                algorithm
+            `split_pool` :
+                process pool for the split (see
+                :func:`computation.split_and_merge.algorithm.create_split_pool`);
+                if it is ``None``, a pool is created for this frame only
 
         **Returns:**
             A :class:`core.data.Results` object.
         """
-        # always recalculate if gyration tensor parameters shall be computed for center or surface based cavities
-        recalculate = recalculate or (gyration_tensor_parameters and (center or surface))
         message.progress(0)
+        resultfile, atoms, results = self._loadframe(filepath, frame, resolution, cutoff_radii, atoms, recalculate)
+        overwrite = recalculate
+        if gyration_tensor_parameters:
+            overwrite = _dropcavitieswithoutgyration(results, surface, center) or overwrite
+
+        if not _needscalculation(results, domains, surface, center):
+            message.print_message("Reusing results")
+        else:
+            ownpool = split_pool is None and _usessplitpool(triangles, split_workers)
+            if ownpool:
+                split_pool = create_split_pool(split_workers)
+            try:
+                results = _calculatemissing(
+                    self.cachedir,
+                    filepath,
+                    frame,
+                    atoms,
+                    results,
+                    domains,
+                    surface,
+                    center,
+                    gyration_tensor_parameters,
+                    triangles,
+                    split_workers,
+                    split_pool=split_pool,
+                )
+            finally:
+                if ownpool:
+                    split_pool.terminate()
+                    split_pool.join()
+            resultfile.addresults(results, overwrite=overwrite)
+        self._settriangulation(results)
+
+        message.progress(100)
+        message.print_message("Calculation finished")
+        if last_frame:
+            message.finish()
+        return results
+
+    def _loadframe(self, filepath, frame, resolution, cutoff_radii, atoms, recalculate):
+        """
+        Open the result file for the given input file and load the cached
+        results of a frame.
+
+        **Returns:**
+            A tuple ``(resultfile, atoms, results)``. The results of `results`
+            are ``None`` if they have not been calculated yet or if
+            `recalculate` is set.
+        """
         inputfile = File.open(filepath)
         if isinstance(inputfile, file.ResultFile):
             resultfile = inputfile
@@ -307,7 +404,6 @@ class Calculation(object):
         if atoms is None:
             atoms = inputfile.getatoms(frame)
         atoms.radii = cutoff_radii
-        volume = atoms.volume
         if results is None:
             results = data.Results(filepath, frame, resolution, atoms, None, None, None)
 
@@ -315,78 +411,242 @@ class Calculation(object):
             results.domains = None
             results.surface_cavities = None
             results.center_cavities = None
+        return resultfile, atoms, results
 
-        if not (
-            (domains and results.domains is None)
-            or (surface and results.surface_cavities is None)
-            or (center and results.center_cavities is None)
-        ):
-            message.print_message("Reusing results")
-        else:
-            cachepath = os.path.join(self.cachedir, "discretization_cache.hdf5")
-            discretization_cache = DiscretizationCache(cachepath)
-            with DiscretizationCache(cachepath) as discretization_cache:
-                discretization = discretization_cache.get_discretization(volume, resolution)
-            atom_discretization = AtomDiscretization(atoms, discretization)
-            message.progress(10)
-            if (domains and results.domains is None) or (surface and results.surface_cavities is None):
-                # CavityCalculation depends on DomainCalculation
-                message.print_message("Calculating domains")
-                domain_calculation = DomainCalculation(discretization, atom_discretization)
-                if domain_calculation.critical_domains:
-                    logger.warn(
-                        "Found {:d} critical domains in file {}, frame {:d}. Domain indices: {}".format(
-                            len(domain_calculation.critical_domains),
-                            os.path.basename(filepath),
-                            frame,
-                            domain_calculation.critical_domains,
-                        )
-                    )
-                    message.log(
-                        "Found {:d} critical domains in file {}, frame {:d}".format(
-                            len(domain_calculation.critical_domains),
-                            os.path.basename(filepath),
-                            frame + 1,
-                        )
-                    )
-            if results.domains is None:
-                results.domains = data.Domains(domain_calculation)
-            message.progress(40)
+    def _iterframetasks(self, filepath, frames, calcsettings):
+        """
+        Load the cached results of the given frames one after another.
 
-            if surface and results.surface_cavities is None:
-                message.print_message("Calculating surface-based cavities")
-                cavity_calculation = CavityCalculation(
-                    domain_calculation,
-                    use_surface_points=True,
-                    gyration_tensor_parameters=gyration_tensor_parameters,
+        **Returns:**
+            A generator that yields a tuple ``(resultfile, results, overwrite,
+            task)`` for each frame in `frames`. `task` contains the arguments
+            of :func:`_calculatemissing` or is ``None`` if all results are
+            cached.
+        """
+        surface = calcsettings.surface_cavities
+        center = calcsettings.center_cavities
+        for frame in frames:
+            resultfile, atoms, results = self._loadframe(
+                filepath, frame, calcsettings.resolution, calcsettings.cutoff_radii, None, calcsettings.recalculate
+            )
+            overwrite = calcsettings.recalculate
+            if calcsettings.gyration_tensor:
+                overwrite = _dropcavitieswithoutgyration(results, surface, center) or overwrite
+            task = None
+            if _needscalculation(results, calcsettings.domains, surface, center):
+                task = (
+                    self.cachedir,
+                    filepath,
+                    frame,
+                    atoms,
+                    results,
+                    calcsettings.domains,
+                    surface,
+                    center,
+                    calcsettings.gyration_tensor,
+                    calcsettings.triangles,
+                    calcsettings.split_workers,
                 )
-                results.surface_cavities = data.Cavities(cavity_calculation)
-            message.progress(70)
+            yield resultfile, results, overwrite, task
 
-            if center and results.center_cavities is None:
-                message.print_message("Calculating center-based cavities")
-                domain_calculation = FakeDomainCalculation(discretization, atom_discretization, results)  # equal, k, k
-                cavity_calculation = CavityCalculation(
-                    domain_calculation,
-                    use_surface_points=False,
-                    gyration_tensor_parameters=gyration_tensor_parameters,
-                )
-                results.center_cavities = data.Cavities(cavity_calculation)
-            resultfile.addresults(results, overwrite=recalculate)
+    def calculateframes(self, filepath, frames, calcsettings, workers=1):
+        """
+        Get results for several frames of a file. With more than one worker,
+        the missing results are calculated by a pool of worker processes.
+        Only this process reads the frames and writes to the result file, so
+        all results are stored in frame order. The frames are loaded shortly
+        before a worker is free, so only a few of them are kept in memory at
+        once.
+
+        **Parameters:**
+            `filepath` :
+                absolute path of the input file
+            `frames` :
+                list of frame numbers
+            `calcsettings` :
+                :class:`CalculationSettings` object
+            `workers` :
+                number of worker processes
+
+        **Returns:**
+            A generator that yields a :class:`core.data.Results` object for
+            each frame in `frames`.
+        """
+        if workers <= 1 or len(frames) <= 1:
+            # the processes of the split are started once for all frames
+            split_pool = None
+            if _usessplitpool(calcsettings.triangles, calcsettings.split_workers):
+                split_pool = create_split_pool(calcsettings.split_workers)
+            try:
+                last_frame = False
+                for frame in frames:
+                    if frame is frames[-1]:
+                        last_frame = True
+                    yield self.calculateframe(
+                        filepath,
+                        frame,
+                        calcsettings.resolution,
+                        calcsettings.cutoff_radii,
+                        domains=calcsettings.domains,
+                        surface=calcsettings.surface_cavities,
+                        center=calcsettings.center_cavities,
+                        gyration_tensor_parameters=calcsettings.gyration_tensor,
+                        recalculate=calcsettings.recalculate,
+                        triangles=calcsettings.triangles,
+                        split_workers=calcsettings.split_workers,
+                        last_frame=last_frame,
+                        split_pool=split_pool,
+                    )
+            finally:
+                if split_pool is not None:
+                    split_pool.terminate()
+                    split_pool.join()
+            return
+
+        numworkers = min(workers, len(frames))
+        # only a few frames are loaded ahead, so the memory use does not grow with the number of frames
+        maxpendingframes = 2 * numworkers
+        frametasks = self._iterframetasks(filepath, frames, calcsettings)
+        pendingframes = collections.deque()
+        # the tasks are passed to the pool through a queue, so the frames are only loaded by this thread
+        taskqueue = queue.Queue()
+        pool = None
+        message.progress(0)
+        try:
+            for index in range(len(frames)):
+                while len(pendingframes) < maxpendingframes:
+                    frametask = next(frametasks, None)
+                    if frametask is None:
+                        break
+                    resultfile, results, overwrite, task = frametask
+                    if task is not None:
+                        if pool is None:
+                            message.print_message("Calculating frames with {:d} worker processes".format(numworkers))
+                            pool = _createworkerpool(numworkers)
+                            calculatedresults = pool.imap(_calculateframeworker, iter(taskqueue.get, None))
+                        taskqueue.put(task)
+                    pendingframes.append((resultfile, results, task is not None, overwrite))
+                resultfile, results, needscalculation, overwrite = pendingframes.popleft()
+                if needscalculation:
+                    results, logmessages = next(calculatedresults)
+                    for args in logmessages:
+                        message.log(*args)
+                    resultfile.addresults(results, overwrite=overwrite)
+                else:
+                    message.print_message("Reusing results")
+                self._settriangulation(results)
+                message.progress(int(100 * (index + 1) / len(frames)))
+                yield results
+        finally:
+            # ends the task generator of the pool
+            taskqueue.put(None)
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        message.print_message("Calculation finished")
+        message.finish()
+
+    def sweep_cutoffs(
+        self,
+        filepath,
+        frame,
+        resolution,
+        radii_list,
+        surface=False,
+        center=False,
+        gyration_tensor_parameters=False,
+        triangles=False,
+    ):
+        """
+        Calculate the results of a frame for several sets of cutoff radii.
+        The distances to the nearest atoms are calculated only once (see
+        :class:`core.calculation.distancefield.AtomDistanceFields`), so the
+        atom spheres for each set of cutoff radii are found by a threshold
+        instead of `atomstogrid`. The results are not stored in the cache,
+        because it only contains one result for each frame and resolution.
+
+        **Parameters:**
+            `filepath` :
+                absolute path of the input file
+            `frame` :
+                the frame number
+            `resolution` :
+                resolution of the used discretization
+            `radii_list` :
+                list of cutoff radii; each entry is a dict that maps element
+                symbols to cutoff radii or a single radius for all atoms
+            `surface` :
+                calculate surface-based cavities
+            `center` :
+                calculate center-based cavities
+            `gyration_tensor_parameters` :
+                gyration tensor parameters will be calculated for cavities
+            `triangles` :
+                calculate the triangle meshes; if ``False``, they are created
+                when they are accessed for the first time
+
+        **Returns:**
+            A list with a :class:`core.data.Results` object for each entry of
+            `radii_list`.
+        """
+        message.progress(0)
+        atoms = File.open(filepath).getatoms(frame)
+        cutoff_atoms_list = []
+        for cutoff_radii in radii_list:
+            cutoff_atoms = copy.copy(atoms)
+            cutoff_atoms.radii = cutoff_radii
+            cutoff_atoms_list.append(cutoff_atoms)
+        max_radius = max(max(cutoff_atoms.radii) for cutoff_atoms in cutoff_atoms_list)
+        discretization, _ = _discretize(self.cachedir, cutoff_atoms_list[0], resolution)
+        message.print_message("Calculating atom distance fields")
+        distance_fields = AtomDistanceFields(atoms, discretization, max_radius)
+
+        allresults = []
+        for index, cutoff_atoms in enumerate(cutoff_atoms_list):
+            message.print_message("Calculating cutoff radii set {:d} of {:d}".format(index + 1, len(radii_list)))
+            results = data.Results(filepath, frame, resolution, cutoff_atoms, None, None, None)
+            results = _calculatemissing(
+                self.cachedir,
+                filepath,
+                frame,
+                cutoff_atoms,
+                results,
+                True,
+                surface,
+                center,
+                gyration_tensor_parameters,
+                triangles,
+                discretization=discretization,
+                atom_grid=distance_fields.atom_grid(cutoff_atoms),
+            )
+            self._settriangulation(results)
+            allresults.append(results)
 
         message.progress(100)
         message.print_message("Calculation finished")
-        if last_frame:
-            message.finish()
-        return results
+        message.finish()
+        return allresults
 
-    def calculate(self, calcsettings):
+    def _settriangulation(self, results):
+        """
+        Let all objects in `results` that have been calculated without
+        triangle meshes create them from their cells when they are accessed.
+        """
+        for name in ("domains", "surface_cavities", "center_cavities"):
+            cavities = getattr(results, name)
+            if cavities is not None and not cavities.has_triangles and cavities.cell_runs is not None:
+                cavities.triangulate = functools.partial(_triangulatemissing, self.cachedir, results, name)
+
+    def calculate(self, calcsettings, workers=None):
         """
         Calculate (or load from the cache) all results for the given settings.
 
         **Parameters:**
             `calcsettings` :
                 :class:`CalculationSettings` object
+            `workers` :
+                number of processes that calculate frames in parallel; if
+                ``None``, `calcsettings.workers` is used
 
         **Returns:**
             A list of list of :class:`core.data.Results` objects. The outer list contains
@@ -394,6 +654,8 @@ class Calculation(object):
             list has a `Results` entry for each frame specified in
             `calcsettings.frames`.
         """
+        if workers is None:
+            workers = calcsettings.workers
         allresults = []
         for filename, frames in calcsettings.datasets.items():
             filepath = file.get_abspath(filename)
@@ -423,23 +685,8 @@ class Calculation(object):
             if frames[0] == -1:
                 inputfile = File.open(filepath)
                 frames = range(inputfile.info.num_frames)
-            last_frame = False
-            for frame in frames:
-                # calculate single frame
-                if frame is frames[-1]:
-                    last_frame = True
-                frameresult = self.calculateframe(
-                    filepath,
-                    frame,
-                    calcsettings.resolution,
-                    calcsettings.cutoff_radii,
-                    domains=calcsettings.domains,
-                    surface=calcsettings.surface_cavities,
-                    center=calcsettings.center_cavities,
-                    gyration_tensor_parameters=calcsettings.gyration_tensor,
-                    recalculate=calcsettings.recalculate,
-                    last_frame=last_frame,
-                )
+            frameresults = self.calculateframes(filepath, frames, calcsettings, workers)
+            for frame, frameresult in zip(frames, frameresults):
                 # export to text file
                 if calcsettings.exporttext:
                     fmt = os.path.join(exportdir, fileprefix) + "-{property}-{frame:06d}.txt"
@@ -509,6 +756,187 @@ class Calculation(object):
         return allresults
 
 
+def _needscalculation(results, domains, surface, center):
+    return (
+        (domains and results.domains is None)
+        or (surface and results.surface_cavities is None)
+        or (center and results.center_cavities is None)
+    )
+
+
+def _dropcavitieswithoutgyration(results, surface, center):
+    """
+    Remove the requested cavities from `results` if they have been
+    calculated without gyration tensor parameters, so only they are
+    calculated again and the domains are reused. Returns whether cavities
+    have been removed (and the cached ones have to be overwritten).
+    """
+    dropped = False
+    for requested, name in ((surface, "surface_cavities"), (center, "center_cavities")):
+        cavities = getattr(results, name)
+        if requested and cavities is not None and not cavities.has_gyration_tensor_parameters:
+            setattr(results, name, None)
+            dropped = True
+    return dropped
+
+
+def _calculatemissing(
+    cachedir,
+    filepath,
+    frame,
+    atoms,
+    results,
+    domains,
+    surface,
+    center,
+    gyration_tensor_parameters,
+    triangles=True,
+    split_workers=1,
+    discretization=None,
+    atom_grid=None,
+    split_pool=None,
+):
+    """
+    Calculate all requested results of a frame that are not contained in
+    `results` yet. The result file is not touched, so this can also be done
+    in a worker process. A `discretization` and an `atom_grid` for the domain
+    calculation can be passed if they are already known, and a `split_pool`
+    for the `split_workers`.
+    """
+    if discretization is None:
+        discretization, atom_discretization = _discretize(cachedir, atoms, results.resolution)
+    else:
+        atom_discretization = AtomDiscretization(atoms, discretization)
+    message.progress(10)
+    if (domains and results.domains is None) or (surface and results.surface_cavities is None):
+        # CavityCalculation depends on DomainCalculation
+        message.print_message("Calculating domains")
+        # the triangles are calculated later with a serial split, which must number the domains the same way
+        domain_calculation = DomainCalculation(
+            discretization,
+            atom_discretization,
+            triangles=triangles,
+            atom_grid=atom_grid,
+            split_workers=split_workers if triangles else 1,
+            split_pool=split_pool if triangles else None,
+        )
+        if domain_calculation.critical_domains:
+            logger.warn(
+                "Found {:d} critical domains in file {}, frame {:d}. Domain indices: {}".format(
+                    len(domain_calculation.critical_domains),
+                    os.path.basename(filepath),
+                    frame,
+                    domain_calculation.critical_domains,
+                )
+            )
+            message.log(
+                "Found {:d} critical domains in file {}, frame {:d}".format(
+                    len(domain_calculation.critical_domains),
+                    os.path.basename(filepath),
+                    frame + 1,
+                )
+            )
+    if results.domains is None:
+        results.domains = data.Domains(domain_calculation)
+    message.progress(40)
+
+    if (surface and results.surface_cavities is None) or (center and results.center_cavities is None):
+        # the atom subgrid is shared by the surface- and center-based cavity calculations
+        with create_atom_subgrid(discretization, atom_discretization) as subgrid:
+            if surface and results.surface_cavities is None:
+                message.print_message("Calculating surface-based cavities")
+                cavity_calculation = CavityCalculation(
+                    domain_calculation,
+                    use_surface_points=True,
+                    gyration_tensor_parameters=gyration_tensor_parameters,
+                    triangles=triangles,
+                    subgrid=subgrid,
+                )
+                results.surface_cavities = data.Cavities(cavity_calculation)
+                message.progress(70)
+
+            if center and results.center_cavities is None:
+                message.print_message("Calculating center-based cavities")
+                domain_calculation = FakeDomainCalculation(discretization, atom_discretization, results)  # equal, k, k
+                cavity_calculation = CavityCalculation(
+                    domain_calculation,
+                    use_surface_points=False,
+                    gyration_tensor_parameters=gyration_tensor_parameters,
+                    triangles=triangles,
+                    subgrid=subgrid,
+                )
+                results.center_cavities = data.Cavities(cavity_calculation)
+    message.progress(70)
+    return results
+
+
+def _usessplitpool(triangles, split_workers):
+    # without triangles, the domains are split serially (see `_calculatemissing`)
+    return triangles and split_workers > 1
+
+
+def _getdiscretization(cachedir, volume, resolution):
+    cachepath = os.path.join(cachedir, "discretization_cache.hdf5")
+    with DiscretizationCache(cachepath) as discretization_cache:
+        return discretization_cache.get_discretization(volume, resolution)
+
+
+def _discretize(cachedir, atoms, resolution):
+    discretization = _getdiscretization(cachedir, atoms.volume, resolution)
+    atom_discretization = AtomDiscretization(atoms, discretization)
+    return discretization, atom_discretization
+
+
+def _triangulatemissing(cachedir, results, name):
+    """
+    Create the triangle meshes of `results.<name>` from the cells of its
+    objects, which are stored with the results if they have been calculated
+    without meshes. Only the discretization is needed for this, which is
+    usually cached.
+    """
+    cavities = getattr(results, name)
+    message.print_message("Calculating triangles")
+    # like the atoms in `Calculation._loadframe`, the volume is read from the input file
+    discretization = _getdiscretization(cachedir, File.open(results.filepath).info.volume, results.resolution)
+    grid = grid_from_label_runs(cavities.cell_runs, discretization.d)
+    if name == "domains":
+        label_groups = [[domain_index] for domain_index in range(cavities.number)]
+        isolevel = DomainCalculation.isolevel
+    else:
+        label_groups = cavities.multicavities
+        isolevel = CavityCalculation.isolevel
+    triangles, _ = label_triangles(grid, label_groups, isolevel, discretization)
+    return triangles
+
+
+# log messages of the current frame in a worker process
+_workerlog = []
+
+
+def _createworkerpool(numworkers):
+    # share the processors between the workers instead of starting all threads in each worker
+    threads_per_worker = max(1, multiprocessing.cpu_count() // numworkers)
+    # forked processes can inherit locked mutexes (e.g. of the GUI threads), so the workers are spawned
+    return multiprocessing.get_context("spawn").Pool(
+        numworkers,
+        initializer=_initworker,
+        initargs=(threads_per_worker,),
+    )
+
+
+def _initworker(num_threads):
+    # progress and print callbacks of the parent process (e.g. the GUI) must not be used in worker processes, only log
+    # messages are collected and passed back with the results
+    message.set_output_callbacks(None, None, None, None, lambda *args: _workerlog.append(args))
+    set_num_threads(num_threads)
+
+
+def _calculateframeworker(task):
+    del _workerlog[:]
+    results = _calculatemissing(*task)
+    return results, list(_workerlog)
+
+
 class CalculationCache(object):
     """
     Stores calculation results. Associates the input file with a
@@ -23,6 +23,9 @@ __all__ = ["DiscretizationCache", "AtomDiscretization"]
 dimension = algorithm.dimension
 dimensions = algorithm.dimensions
 
+# images[offsets[i]:offsets[i + 1]] are the images of the i-th point (see `Discretization.halo`)
+Halo = collections.namedtuple("Halo", ["offsets", "images"])
+
 
 class DiscretizationCache(object):
     """
@@ -253,6 +256,44 @@ class Discretization(object):
         combined_translation_vector = self.combined_translation_vectors[combined_translation_vector_index]
         return combined_translation_vector
 
+    def halo(self, points, margin):
+        """
+        Returns the images of discrete points (the points themselves and their
+        equivalents created by addition of a combined translation vector)
+        which are at most `margin` cells away from the grid along each axis.
+        All other images are farther away than `margin` from every grid point,
+        so they can be skipped by calculations that only look at distances up
+        to `margin`. This way, points inside of the volume usually have a
+        single image instead of 27.
+
+        **Parameters:**
+            `points` :
+                array of discrete points with shape ``(n, 3)``
+            `margin` :
+                the largest distance of an image from the grid
+
+        **Returns:**
+            A :class:`Halo` with the image `offsets` (shape ``(n + 1,)``) and
+            the `images` (shape ``(m, 3)``). The images of each point are
+            stored in the order of the translation vectors, beginning with the
+            point itself.
+        """
+        points = np.asarray(points, dtype=np.int64).reshape((-1, 3))
+        lower = -margin
+        upper = np.array(self.d) + margin
+        point_indices = []
+        images = []
+        for translation_vector in [(0, 0, 0)] + self.combined_translation_vectors:
+            translated_points = points + translation_vector
+            near = np.flatnonzero(np.all((translated_points >= lower) & (translated_points < upper), axis=1))
+            point_indices.append(near)
+            images.append(translated_points[near])
+        point_indices = np.concatenate(point_indices)
+        # sort by point, the stable sort keeps the translation vector order
+        order = np.argsort(point_indices, kind="stable")
+        offsets = np.searchsorted(point_indices[order], np.arange(len(points) + 1))
+        return Halo(offsets, np.concatenate(images)[order])
+
     def continuous_to_discrete(self, arg, result_inside_volume=False, unit_exponent=1):
         """
         Transforms a single value or a point from continuous to discrete coordinates.
@@ -352,3 +393,7 @@ class AtomDiscretization:
             discrete_radius = int(floor(radius / self.discretization.s_step + 0.5))
             self.sorted_discrete_radii.append(discrete_radius)
         print_message("Maximum radius:", self.sorted_discrete_radii[0])
+        # `atomstogrid` needs all atom images up to the maximum radius from the grid, the cavity subgrid (with the
+        # maximum radius as cube size) uses all images up to two subgrid cells from the grid
+        self.halo_margin = 2 * self.sorted_discrete_radii[0]
+        self.halo = self.discretization.halo(self.discrete_positions, self.halo_margin)
@@ -0,0 +1,116 @@
+"""
+The atom spheres of a domain calculation only depend on the cutoff radii by a
+threshold on the distance to the nearest atom. :class:`AtomDistanceFields`
+calculates this distance once for each element with a periodic euclidean
+distance transform, so the atom grid for any set of cutoff radii (up to a
+maximum radius) is a simple comparison. This makes scans over many cutoff
+radii much cheaper than a full calculation for each of them.
+"""
+
+import numpy as np
+
+from .extension import distance_transform
+
+__all__ = ["AtomDistanceFields", "distance_field", "periodic_distance_field"]
+
+
+# value of cells without any atom within the maximum radius (like in the C extension)
+DISTANCE_INFINITY = np.iinfo(np.int32).max
+
+
+def distance_field(seeds, dimensions, padding):
+    """
+    Calculates the squared distances (in grid cells) of all cells of a grid
+    to the nearest of the given seed cells.
+
+    **Parameters:**
+        `seeds` :
+            array of discrete seed points with shape ``(n, 3)``; they may be
+            outside of the grid
+        `dimensions` :
+            the shape of the grid
+        `padding` :
+            distances up to this value are exact; the grid is padded by it,
+            so all seeds that are this close to the grid are used
+
+    **Returns:**
+        An int32 array with the given shape. Cells without any seed within
+        `padding` may be ``DISTANCE_INFINITY``.
+    """
+    padded_dimensions = [d + 2 * padding for d in dimensions]
+    seeds = np.asarray(seeds, dtype=np.int64).reshape((-1, 3)) + padding
+    seeds = seeds[np.all((seeds >= 0) & (seeds < padded_dimensions), axis=1)]
+    field = np.full(padded_dimensions, DISTANCE_INFINITY, dtype=np.int32)
+    field[tuple(seeds.T)] = 0
+    distance_transform(field)
+    inner = tuple(slice(padding, padding + d) for d in dimensions)
+    return np.ascontiguousarray(field[inner])
+
+
+def periodic_distance_field(seeds, discretization, padding):
+    """
+    Like :func:`distance_field` for a discretization grid, but the
+    equivalents of the seeds in the adjacent cells (given by the translation
+    vectors of the discretization) are used as well.
+    """
+    translation_vectors = np.array([(0, 0, 0)] + discretization.combined_translation_vectors)
+    seeds = np.asarray(seeds, dtype=np.int64).reshape((-1, 3))
+    seeds = (seeds[:, np.newaxis, :] + translation_vectors[np.newaxis, :, :]).reshape((-1, 3))
+    return distance_field(seeds, discretization.d, padding)
+
+
+class AtomDistanceFields(object):
+    """
+    Squared distances (in grid cells) of all cells of a discretization grid to
+    the nearest atom of each element. Like in ``atomstogrid``, the atoms and
+    their equivalents in the adjacent cells (given by the translation vectors
+    of the discretization) are used. Distances larger than `max_radius` are
+    not calculated exactly and are stored as ``DISTANCE_INFINITY``.
+    """
+
+    def __init__(self, atoms, discretization, max_radius):
+        """
+        **Parameters:**
+            `atoms` :
+                :class:`core.data.Atoms` object
+            `discretization` :
+                :class:`core.calculation.discretization.Discretization` object
+            `max_radius` :
+                the largest cutoff radius that will be queried
+        """
+        self.discretization = discretization
+        self.max_discrete_radius = discretization.continuous_to_discrete(max_radius)
+        discrete_positions = np.array([discretization.continuous_to_discrete(p) for p in atoms.positions])
+
+        self.fields = {}
+        for element in np.unique(atoms.elements):
+            self.fields[element] = periodic_distance_field(
+                discrete_positions[atoms.elements == element], discretization, self.max_discrete_radius
+            )
+
+    def atom_grid(self, atoms):
+        """
+        Returns a boolean grid which is ``True`` for all cells inside of the
+        volume and inside of the discrete cutoff radius of any atom. All atoms
+        of an element must have the same cutoff radius.
+
+        **Parameters:**
+            `atoms` :
+                :class:`core.data.Atoms` object with the atoms of the
+                distance fields and the cutoff radii to use
+        """
+        grid = np.zeros(self.discretization.d, dtype=bool)
+        for element, field in self.fields.items():
+            radii = atoms.radii[atoms.elements == element]
+            if np.any(radii != radii[0]):
+                raise ValueError("The atoms of element {} have different cutoff radii".format(element.decode("utf-8")))
+            radius = radii[0]
+            # the same rounding as in `AtomDiscretization`
+            discrete_radius = self.discretization.continuous_to_discrete(radius)
+            if discrete_radius > self.max_discrete_radius:
+                raise ValueError(
+                    "The cutoff radius {} is larger than the maximum radius of the distance fields".format(radius)
+                )
+            grid |= field <= discrete_radius * discrete_radius
+        grid &= self.discretization.grid == 0
+        return grid
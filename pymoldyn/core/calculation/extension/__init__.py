@@ -4,11 +4,18 @@ from pymoldyn.util import env_is_true, message
 from pymoldyn.util.logger import Logger
 
 __all__ = [
+    "AtomSubgrid",
     "atomstogrid",
     "mark_cavities",
     "cavity_triangles",
-    "cavity_intersections",
+    "cavity_triangles_multi",
+    "cavity_surface_areas_multi",
+    "cavity_intersection_pairs",
+    "label_statistics",
+    "distance_transform",
     "mark_translation_vectors",
+    "get_num_threads",
+    "set_num_threads",
 ]
 
 logger = Logger("core.calculation")
@@ -20,13 +27,7 @@ class CExtensionError(Exception):
 
 
 try:
-    from .extension_ctypes import (
-        atomstogrid,
-        cavity_intersections,
-        cavity_triangles,
-        mark_cavities,
-        mark_translation_vectors,
-    )
+    from . import extension_ctypes as backend
 except OSError as e:
     if env_is_true("PYMOLDYN_FORCE_EXTENSIONS"):
         logger.error(e.__repr__())
@@ -36,13 +37,28 @@ except OSError as e:
     else:
         logger.warn(e.__repr__())
         logger.warn("Falling back to Python functions")
-        message.log(
-            "C extensions could not be loaded, falling back to Python functions. Calculations may be very slow!"
-        )
-        from .extension_python import (
-            atomstogrid,
-            cavity_intersections,
-            cavity_triangles,
-            mark_cavities,
-            mark_translation_vectors,
-        )
+        message.log("C extensions could not be loaded, falling back to Python functions. Calculations will be slower!")
+        from . import extension_python as backend
+    native_backend = backend
+else:
+    # the native module has faster versions of the most frequently called kernels, which release the GIL
+    try:
+        from . import extension_native as native_backend
+    except ImportError as e:
+        logger.info(e.__repr__())
+        logger.info("Using the ctypes extension only")
+        native_backend = backend
+
+# mark_cavities only accepts subgrids of its own backend
+AtomSubgrid = native_backend.AtomSubgrid
+atomstogrid = native_backend.atomstogrid
+mark_cavities = native_backend.mark_cavities
+cavity_intersection_pairs = native_backend.cavity_intersection_pairs
+mark_translation_vectors = native_backend.mark_translation_vectors
+cavity_triangles_multi = native_backend.cavity_triangles_multi
+cavity_surface_areas_multi = native_backend.cavity_surface_areas_multi
+cavity_triangles = backend.cavity_triangles
+label_statistics = backend.label_statistics
+distance_transform = backend.distance_transform
+get_num_threads = backend.get_num_threads
+set_num_threads = backend.set_num_threads
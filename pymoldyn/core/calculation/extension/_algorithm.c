@@ -0,0 +1,654 @@
+/**
+ * Native Python module for the most frequently called kernels of
+ * algorithm.c. The module is linked against the algorithm library (the one
+ * that is loaded by ctypes as well), the arrays are accessed through the
+ * buffer protocol without copies and the GIL is released while a kernel
+ * runs, so calculations in several Python threads can run in parallel. The
+ * wrappers in extension_native.py convert the arguments to the expected
+ * types.
+ * The subgrids for mark_cavities are owned by Python objects of this module,
+ * so they are freed with the objects.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include "algorithm.h"
+
+
+/* A three-dimensional grid and its shape and strides (in items) */
+typedef struct {
+    Py_buffer view;
+    int dimensions[3];
+    int strides[3];
+} grid_buffer_t;
+
+
+static int is_signed_integer_format(const char *format)
+{
+    char type;
+
+    if (format == NULL) {
+        return 0;
+    }
+    type = format[0];
+    if (type == '@' || type == '=' || type == '<' || type == '>' || type == '!') {
+        type = format[1];
+    }
+    return type == 'b' || type == 'h' || type == 'i' || type == 'l' || type == 'q';
+}
+
+/**
+ * Get a grid of signed integers with one of the given item sizes (or any
+ * label item size if itemsize is 0).
+ */
+static int get_grid(PyObject *object, grid_buffer_t *grid, int writable, int itemsize, const char *name)
+{
+    int k;
+
+    if (PyObject_GetBuffer(object, &grid->view, writable ? PyBUF_RECORDS : PyBUF_RECORDS_RO) < 0) {
+        return -1;
+    }
+    if (grid->view.ndim != 3 || !is_signed_integer_format(grid->view.format)
+            || (itemsize == 0 && grid->view.itemsize != 2 && grid->view.itemsize != 4 && grid->view.itemsize != 8)
+            || (itemsize != 0 && grid->view.itemsize != itemsize)) {
+        PyErr_Format(PyExc_TypeError, "%s must be a three-dimensional grid of a supported integer type", name);
+        PyBuffer_Release(&grid->view);
+        return -1;
+    }
+    for (k = 0; k < 3; k++) {
+        if (grid->view.shape[k] > INT_MAX || grid->view.strides[k] % grid->view.itemsize != 0
+                || grid->view.strides[k] / grid->view.itemsize > INT_MAX
+                || grid->view.strides[k] / grid->view.itemsize < INT_MIN) {
+            PyErr_Format(PyExc_ValueError, "%s has an unsupported shape or strides", name);
+            PyBuffer_Release(&grid->view);
+            return -1;
+        }
+        grid->dimensions[k] = (int) grid->view.shape[k];
+        grid->strides[k] = (int) (grid->view.strides[k] / grid->view.itemsize);
+    }
+    return 0;
+}
+
+/**
+ * Get a contiguous array of C ints with a multiple of `columns` items and
+ * store the number of rows in `*rows`.
+ */
+static int get_int_array(PyObject *object, Py_buffer *view, int columns, int *rows, const char *name)
+{
+    if (PyObject_GetBuffer(object, view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0) {
+        return -1;
+    }
+    if (view->itemsize != sizeof(int) || !is_signed_integer_format(view->format)
+            || (view->len / view->itemsize) % columns != 0 || view->len / view->itemsize / columns > INT_MAX) {
+        PyErr_Format(PyExc_TypeError, "%s must be a contiguous array of C ints", name);
+        PyBuffer_Release(view);
+        return -1;
+    }
+    *rows = (int) (view->len / view->itemsize / columns);
+    return 0;
+}
+
+
+/* A subgrid (see subgrid_create) which is freed with its Python object */
+typedef struct {
+    PyObject_HEAD
+    subgrid_t *sg;
+} subgrid_object_t;
+
+static PyTypeObject subgrid_type;
+
+
+static subgrid_t *get_subgrid(subgrid_object_t *self)
+{
+    if (self->sg == NULL) {
+        PyErr_SetString(PyExc_ValueError, "the subgrid has been freed");
+    }
+    return self->sg;
+}
+
+static int subgrid_init(subgrid_object_t *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *images_object;
+    Py_buffer images;
+    int cubesize;
+    int grid_dimensions[3];
+    int nimages;
+    subgrid_t *sg;
+
+    (void) kwds;
+    if (!PyArg_ParseTuple(args, "i(iii)O", &cubesize, &grid_dimensions[0], &grid_dimensions[1],
+            &grid_dimensions[2], &images_object)) {
+        return -1;
+    }
+    if (cubesize < 1 || grid_dimensions[0] < 1 || grid_dimensions[1] < 1 || grid_dimensions[2] < 1) {
+        PyErr_SetString(PyExc_ValueError, "the cube size and the grid dimensions must be positive");
+        return -1;
+    }
+    if (get_int_array(images_object, &images, 3, &nimages, "atom_images") < 0) {
+        return -1;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    sg = subgrid_create(cubesize, grid_dimensions);
+    subgrid_add_atoms(sg, nimages, images.buf);
+    Py_END_ALLOW_THREADS
+
+    PyBuffer_Release(&images);
+    if (self->sg != NULL) {
+        subgrid_destroy(self->sg);
+    }
+    self->sg = sg;
+    return 0;
+}
+
+static void subgrid_dealloc(subgrid_object_t *self)
+{
+    if (self->sg != NULL) {
+        subgrid_destroy(self->sg);
+    }
+    Py_TYPE(self)->tp_free((PyObject *) self);
+}
+
+static PyObject *subgrid_set_domains(subgrid_object_t *self, PyObject *args)
+{
+    PyObject *indices_object, *images_object;
+    Py_buffer indices, images;
+    int nindices, nimages;
+    subgrid_t *sg;
+    PyObject *result = NULL;
+
+    if (!PyArg_ParseTuple(args, "OO", &indices_object, &images_object)) {
+        return NULL;
+    }
+    if ((sg = get_subgrid(self)) == NULL) {
+        return NULL;
+    }
+    if (get_int_array(indices_object, &indices, 1, &nindices, "domain_indices") < 0) {
+        return NULL;
+    }
+    if (get_int_array(images_object, &images, 3, &nimages, "domain_images") < 0) {
+        goto release_indices;
+    }
+    if (nindices != nimages) {
+        PyErr_SetString(PyExc_ValueError, "each domain image needs a domain index");
+        goto release_images;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    subgrid_clear_domains(sg);
+    subgrid_add_domains(sg, nimages, indices.buf, images.buf);
+    Py_END_ALLOW_THREADS
+
+    result = Py_None;
+    Py_INCREF(result);
+release_images:
+    PyBuffer_Release(&images);
+release_indices:
+    PyBuffer_Release(&indices);
+    return result;
+}
+
+static PyObject *subgrid_clear(subgrid_object_t *self, PyObject *args)
+{
+    subgrid_t *sg;
+
+    (void) args;
+    if ((sg = get_subgrid(self)) == NULL) {
+        return NULL;
+    }
+    subgrid_clear_domains(sg);
+    Py_RETURN_NONE;
+}
+
+static PyObject *subgrid_free(subgrid_object_t *self, PyObject *args)
+{
+    (void) args;
+    if (self->sg != NULL) {
+        subgrid_destroy(self->sg);
+        self->sg = NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyMethodDef subgrid_methods[] = {
+    {"set_domains", (PyCFunction) subgrid_set_domains, METH_VARARGS,
+        "set_domains(domain_indices, domain_images)"},
+    {"clear_domains", (PyCFunction) subgrid_clear, METH_NOARGS, "clear_domains()"},
+    {"free", (PyCFunction) subgrid_free, METH_NOARGS, "free()"},
+    {NULL, NULL, 0, NULL}
+};
+
+static PyTypeObject subgrid_type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "_algorithm.Subgrid",
+    .tp_doc = "Subgrid(cubesize, grid_dimensions, atom_images)",
+    .tp_basicsize = sizeof(subgrid_object_t),
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_new = PyType_GenericNew,
+    .tp_init = (initproc) subgrid_init,
+    .tp_dealloc = (destructor) subgrid_dealloc,
+    .tp_methods = subgrid_methods,
+};
+
+
+static PyObject *py_atomstogrid(PyObject *self, PyObject *args)
+{
+    PyObject *grid_object, *offsets_object, *images_object, *radii_indices_object, *radii_object;
+    PyObject *discretization_grid_object;
+    grid_buffer_t grid, discretization_grid;
+    Py_buffer offsets, images, radii_indices, radii;
+    int noffsets, nimages, nradii_indices, nradii;
+    int *offsets_buf;
+    int nthreads;
+    int k;
+    PyObject *result = NULL;
+
+    (void) self;
+    if (!PyArg_ParseTuple(args, "OOOOOOi", &grid_object, &offsets_object, &images_object, &radii_indices_object,
+            &radii_object, &discretization_grid_object, &nthreads)) {
+        return NULL;
+    }
+    if (get_grid(grid_object, &grid, 1, 0, "grid") < 0) {
+        return NULL;
+    }
+    if (get_grid(discretization_grid_object, &discretization_grid, 0, 1, "discretization_grid") < 0) {
+        goto release_grid;
+    }
+    if (get_int_array(offsets_object, &offsets, 1, &noffsets, "image_offsets") < 0) {
+        goto release_discretization_grid;
+    }
+    if (get_int_array(images_object, &images, 3, &nimages, "images") < 0) {
+        goto release_offsets;
+    }
+    if (get_int_array(radii_indices_object, &radii_indices, 1, &nradii_indices, "radii_indices") < 0) {
+        goto release_images;
+    }
+    if (get_int_array(radii_object, &radii, 1, &nradii, "discrete_radii") < 0) {
+        goto release_radii_indices;
+    }
+    for (k = 0; k < 3; k++) {
+        if (discretization_grid.dimensions[k] != grid.dimensions[k]) {
+            PyErr_SetString(PyExc_ValueError, "the discretization grid must have the shape of the grid");
+            goto release_radii;
+        }
+    }
+    offsets_buf = offsets.buf;
+    if (noffsets != nradii_indices + 1 || offsets_buf[0] != 0 || offsets_buf[noffsets - 1] != nimages) {
+        PyErr_SetString(PyExc_ValueError, "invalid halo or number of radii indices");
+        goto release_radii;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    switch (grid.view.itemsize) {
+        case 2:
+            atomstogrid_int16(grid.view.buf, grid.dimensions, grid.strides, nradii_indices, offsets.buf,
+                    images.buf, radii_indices.buf, nradii, radii.buf,
+                    discretization_grid.view.buf, discretization_grid.strides, nthreads);
+            break;
+        case 4:
+            atomstogrid_int32(grid.view.buf, grid.dimensions, grid.strides, nradii_indices, offsets.buf,
+                    images.buf, radii_indices.buf, nradii, radii.buf,
+                    discretization_grid.view.buf, discretization_grid.strides, nthreads);
+            break;
+        default:
+            atomstogrid_int64(grid.view.buf, grid.dimensions, grid.strides, nradii_indices, offsets.buf,
+                    images.buf, radii_indices.buf, nradii, radii.buf,
+                    discretization_grid.view.buf, discretization_grid.strides, nthreads);
+            break;
+    }
+    Py_END_ALLOW_THREADS
+
+    result = Py_None;
+    Py_INCREF(result);
+release_radii:
+    PyBuffer_Release(&radii);
+release_radii_indices:
+    PyBuffer_Release(&radii_indices);
+release_images:
+    PyBuffer_Release(&images);
+release_offsets:
+    PyBuffer_Release(&offsets);
+release_discretization_grid:
+    PyBuffer_Release(&discretization_grid.view);
+release_grid:
+    PyBuffer_Release(&grid.view);
+    return result;
+}
+
+
+static PyObject *py_mark_cavities(PyObject *self, PyObject *args)
+{
+    PyObject *grid_object, *domain_grid_object, *discretization_grid_object;
+    PyObject *subgrid_object;
+    grid_buffer_t grid, domain_grid, discretization_grid;
+    subgrid_t *sg;
+    int use_surface_points, nthreads;
+    int has_domain_grid;
+    void *domain_grid_buf;
+    int k;
+    PyObject *result = NULL;
+
+    (void) self;
+    if (!PyArg_ParseTuple(args, "OOOO!pi", &grid_object, &domain_grid_object, &discretization_grid_object,
+            &subgrid_type, &subgrid_object, &use_surface_points, &nthreads)) {
+        return NULL;
+    }
+    if ((sg = get_subgrid((subgrid_object_t *) subgrid_object)) == NULL) {
+        return NULL;
+    }
+    has_domain_grid = domain_grid_object != Py_None;
+    if (use_surface_points && !has_domain_grid) {
+        PyErr_SetString(PyExc_ValueError, "surface points require a domain grid");
+        return NULL;
+    }
+    if (get_grid(grid_object, &grid, 1, 0, "grid") < 0) {
+        return NULL;
+    }
+    if (get_grid(discretization_grid_object, &discretization_grid, 0, 1, "discretization_grid") < 0) {
+        goto release_grid;
+    }
+    if (has_domain_grid && get_grid(domain_grid_object, &domain_grid, 0, (int) grid.view.itemsize, "domain_grid") < 0) {
+        goto release_discretization_grid;
+    }
+    for (k = 0; k < 3; k++) {
+        /* the kernel uses the strides of the grid for the domain grid */
+        if (discretization_grid.dimensions[k] != grid.dimensions[k]
+                || (has_domain_grid && (domain_grid.dimensions[k] != grid.dimensions[k]
+                        || domain_grid.strides[k] != grid.strides[k]))) {
+            PyErr_SetString(PyExc_ValueError, "the grids must have the same shape and layout");
+            goto release_domain_grid;
+        }
+    }
+    domain_grid_buf = has_domain_grid ? domain_grid.view.buf : NULL;
+
+    Py_BEGIN_ALLOW_THREADS
+    switch (grid.view.itemsize) {
+        case 2:
+            mark_cavities_int16(grid.view.buf, domain_grid_buf, grid.dimensions, grid.strides,
+                    discretization_grid.view.buf, discretization_grid.strides, sg, use_surface_points, nthreads);
+            break;
+        case 4:
+            mark_cavities_int32(grid.view.buf, domain_grid_buf, grid.dimensions, grid.strides,
+                    discretization_grid.view.buf, discretization_grid.strides, sg, use_surface_points, nthreads);
+            break;
+        default:
+            mark_cavities_int64(grid.view.buf, domain_grid_buf, grid.dimensions, grid.strides,
+                    discretization_grid.view.buf, discretization_grid.strides, sg, use_surface_points, nthreads);
+            break;
+    }
+    Py_END_ALLOW_THREADS
+
+    result = Py_None;
+    Py_INCREF(result);
+release_domain_grid:
+    if (has_domain_grid) {
+        PyBuffer_Release(&domain_grid.view);
+    }
+release_discretization_grid:
+    PyBuffer_Release(&discretization_grid.view);
+release_grid:
+    PyBuffer_Release(&grid.view);
+    return result;
+}
+
+
+/**
+ * Convert the indexed mesh of a group (see cavity_triangles_multi) to a
+ * tuple (vertices, normals, indices, surface_area) with the arrays as
+ * bytearrays.
+ */
+static PyObject *mesh_to_tuple(int ntriangles, int nvertices, float *vertices, float *normals, unsigned int *indices,
+        float surface_area)
+{
+    PyObject *items[4];
+    PyObject *result;
+    int k;
+
+    items[0] = PyByteArray_FromStringAndSize((const char *) vertices, (Py_ssize_t) nvertices * 3 * sizeof(float));
+    items[1] = PyByteArray_FromStringAndSize((const char *) normals, (Py_ssize_t) nvertices * 3 * sizeof(float));
+    items[2] = PyByteArray_FromStringAndSize(
+            (const char *) indices, (Py_ssize_t) ntriangles * 3 * sizeof(unsigned int));
+    items[3] = PyFloat_FromDouble(surface_area);
+    result = NULL;
+    if (items[0] != NULL && items[1] != NULL && items[2] != NULL && items[3] != NULL) {
+        result = PyTuple_Pack(4, items[0], items[1], items[2], items[3]);
+    }
+    for (k = 0; k < 4; k++) {
+        Py_XDECREF(items[k]);
+    }
+    return result;
+}
+
+
+static PyObject *py_cavity_triangles_multi(PyObject *self, PyObject *args)
+{
+    PyObject *grid_object, *groups_object, *discretization_grid_object;
+    grid_buffer_t grid, discretization_grid;
+    Py_buffer groups;
+    int ncavities, ngroups, isolevel, with_triangles, nthreads;
+    float step[3], offset[3];
+    int *groups_buf;
+    int *ntriangles, *nvertices;
+    float **vertices, **normals;
+    unsigned int **indices;
+    float *surface_areas;
+    int k, group;
+    PyObject *item;
+    PyObject *result = NULL;
+
+    (void) self;
+    if (!PyArg_ParseTuple(args, "OOii(fff)(fff)Opi", &grid_object, &groups_object, &ngroups, &isolevel,
+            &step[0], &step[1], &step[2], &offset[0], &offset[1], &offset[2], &discretization_grid_object,
+            &with_triangles, &nthreads)) {
+        return NULL;
+    }
+    if (ngroups < 0) {
+        PyErr_SetString(PyExc_ValueError, "the number of groups must not be negative");
+        return NULL;
+    }
+    if (get_grid(grid_object, &grid, 0, 0, "cavity_grid") < 0) {
+        return NULL;
+    }
+    if (get_grid(discretization_grid_object, &discretization_grid, 0, 1, "discretization_grid") < 0) {
+        goto release_grid;
+    }
+    if (get_int_array(groups_object, &groups, 1, &ncavities, "cavity_groups") < 0) {
+        goto release_discretization_grid;
+    }
+    for (k = 0; k < 3; k++) {
+        if (discretization_grid.dimensions[k] != grid.dimensions[k]) {
+            PyErr_SetString(PyExc_ValueError, "the discretization grid must have the shape of the grid");
+            goto release_groups;
+        }
+    }
+    groups_buf = groups.buf;
+    for (k = 0; k < ncavities; k++) {
+        if (groups_buf[k] < -1 || groups_buf[k] >= ngroups) {
+            PyErr_SetString(PyExc_ValueError, "invalid group index");
+            goto release_groups;
+        }
+    }
+
+    /* one extra item, so the allocations of zero groups do not return NULL */
+    ntriangles = PyMem_Calloc(ngroups + 1, sizeof(int));
+    nvertices = PyMem_Calloc(ngroups + 1, sizeof(int));
+    vertices = PyMem_Calloc(ngroups + 1, sizeof(float *));
+    normals = PyMem_Calloc(ngroups + 1, sizeof(float *));
+    indices = PyMem_Calloc(ngroups + 1, sizeof(unsigned int *));
+    surface_areas = PyMem_Calloc(ngroups + 1, sizeof(float));
+    if (ntriangles == NULL || nvertices == NULL || vertices == NULL || normals == NULL || indices == NULL
+            || surface_areas == NULL) {
+        PyErr_NoMemory();
+        goto free_outputs;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    switch (grid.view.itemsize) {
+        case 2:
+            cavity_triangles_multi_int16(grid.view.buf, grid.dimensions, grid.strides, ncavities, groups_buf,
+                    ngroups, isolevel, step, offset, discretization_grid.view.buf, discretization_grid.strides,
+                    nthreads, ntriangles, with_triangles ? nvertices : NULL, with_triangles ? vertices : NULL,
+                    with_triangles ? normals : NULL, with_triangles ? indices : NULL, surface_areas);
+            break;
+        case 4:
+            cavity_triangles_multi_int32(grid.view.buf, grid.dimensions, grid.strides, ncavities, groups_buf,
+                    ngroups, isolevel, step, offset, discretization_grid.view.buf, discretization_grid.strides,
+                    nthreads, ntriangles, with_triangles ? nvertices : NULL, with_triangles ? vertices : NULL,
+                    with_triangles ? normals : NULL, with_triangles ? indices : NULL, surface_areas);
+            break;
+        default:
+            cavity_triangles_multi_int64(grid.view.buf, grid.dimensions, grid.strides, ncavities, groups_buf,
+                    ngroups, isolevel, step, offset, discretization_grid.view.buf, discretization_grid.strides,
+                    nthreads, ntriangles, with_triangles ? nvertices : NULL, with_triangles ? vertices : NULL,
+                    with_triangles ? normals : NULL, with_triangles ? indices : NULL, surface_areas);
+            break;
+    }
+    Py_END_ALLOW_THREADS
+
+    result = PyList_New(ngroups);
+    for (group = 0; group < ngroups && result != NULL; group++) {
+        if (with_triangles) {
+            item = mesh_to_tuple(ntriangles[group], nvertices[group], vertices[group], normals[group],
+                    indices[group], surface_areas[group]);
+        } else {
+            item = PyFloat_FromDouble(surface_areas[group]);
+        }
+        if (item == NULL) {
+            Py_CLEAR(result);
+        } else {
+            PyList_SET_ITEM(result, group, item);
+        }
+    }
+    if (with_triangles) {
+        for (group = 0; group < ngroups; group++) {
+            free_float_p(vertices[group]);
+            free_float_p(normals[group]);
+            free_uint_p(indices[group]);
+        }
+    }
+free_outputs:
+    PyMem_Free(ntriangles);
+    PyMem_Free(nvertices);
+    PyMem_Free(vertices);
+    PyMem_Free(normals);
+    PyMem_Free(indices);
+    PyMem_Free(surface_areas);
+release_groups:
+    PyBuffer_Release(&groups);
+release_discretization_grid:
+    PyBuffer_Release(&discretization_grid.view);
+release_grid:
+    PyBuffer_Release(&grid.view);
+    return result;
+}
+
+
+static PyObject *py_cavity_intersection_pairs(PyObject *self, PyObject *args)
+{
+    PyObject *grid_object;
+    grid_buffer_t grid;
+    int *pairs = NULL;
+    int npairs = 0;
+    PyObject *result;
+
+    (void) self;
+    if (!PyArg_ParseTuple(args, "O", &grid_object)) {
+        return NULL;
+    }
+    if (get_grid(grid_object, &grid, 0, 0, "grid") < 0) {
+        return NULL;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    switch (grid.view.itemsize) {
+        case 2:
+            cavity_intersection_pairs_int16(grid.view.buf, grid.dimensions, grid.strides, &pairs, &npairs);
+            break;
+        case 4:
+            cavity_intersection_pairs_int32(grid.view.buf, grid.dimensions, grid.strides, &pairs, &npairs);
+            break;
+        default:
+            cavity_intersection_pairs_int64(grid.view.buf, grid.dimensions, grid.strides, &pairs, &npairs);
+            break;
+    }
+    Py_END_ALLOW_THREADS
+
+    result = PyBytes_FromStringAndSize((const char *) pairs, (Py_ssize_t) npairs * 2 * sizeof(int));
+    free_int_p(pairs);
+    PyBuffer_Release(&grid.view);
+    return result;
+}
+
+
+static PyObject *py_mark_translation_vectors(PyObject *self, PyObject *args)
+{
+    PyObject *grid_object, *translations_object;
+    grid_buffer_t grid;
+    Py_buffer translations;
+    int ntranslations;
+
+    (void) self;
+    if (!PyArg_ParseTuple(args, "OO", &grid_object, &translations_object)) {
+        return NULL;
+    }
+    if (get_grid(grid_object, &grid, 1, 1, "grid") < 0) {
+        return NULL;
+    }
+    if (get_int_array(translations_object, &translations, 3, &ntranslations, "translation_vectors") < 0) {
+        PyBuffer_Release(&grid.view);
+        return NULL;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    mark_translation_vectors(grid.view.buf, grid.dimensions, grid.strides, ntranslations, translations.buf);
+    Py_END_ALLOW_THREADS
+
+    PyBuffer_Release(&translations);
+    PyBuffer_Release(&grid.view);
+    Py_RETURN_NONE;
+}
+
+
+static PyMethodDef methods[] = {
+    {"atomstogrid", py_atomstogrid, METH_VARARGS,
+        "atomstogrid(grid, image_offsets, images, radii_indices, discrete_radii, discretization_grid, "
+        "num_threads)"},
+    {"mark_cavities", py_mark_cavities, METH_VARARGS,
+        "mark_cavities(grid, domain_grid, discretization_grid, subgrid, use_surface_points, num_threads)"},
+    {"cavity_triangles_multi", py_cavity_triangles_multi, METH_VARARGS,
+        "cavity_triangles_multi(cavity_grid, cavity_groups, num_groups, isolevel, step, offset, "
+        "discretization_grid, with_triangles, num_threads) -> meshes or surface areas"},
+    {"cavity_intersection_pairs", py_cavity_intersection_pairs, METH_VARARGS,
+        "cavity_intersection_pairs(grid) -> pairs"},
+    {"mark_translation_vectors", py_mark_translation_vectors, METH_VARARGS,
+        "mark_translation_vectors(grid, translation_vectors)"},
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef module = {
+    PyModuleDef_HEAD_INIT,
+    "_algorithm",
+    NULL,
+    -1,
+    methods
+};
+
+PyMODINIT_FUNC PyInit__algorithm(void)
+{
+    PyObject *m;
+
+    if (PyType_Ready(&subgrid_type) < 0) {
+        return NULL;
+    }
+    m = PyModule_Create(&module);
+    if (m == NULL) {
+        return NULL;
+    }
+    Py_INCREF(&subgrid_type);
+    if (PyModule_AddObject(m, "Subgrid", (PyObject *) &subgrid_type) < 0) {
+        Py_DECREF(&subgrid_type);
+        Py_DECREF(m);
+        return NULL;
+    }
+    return m;
+}
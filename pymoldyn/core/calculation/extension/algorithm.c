@@ -1,145 +1,52 @@
 #include <stdlib.h>
+#include <string.h>
 #include <math.h>
 #include <stdint.h>
 #include <limits.h>
 #include <gr3.h>
-
-#ifdef _WIN32
-#define EXPORT __declspec(dllexport)
-#else
-#define EXPORT
+#ifdef _OPENMP
+#include <omp.h>
 #endif
 
+#define ALGORITHM_BUILD
+#include "algorithm.h"
+
 #define SQUARE(x) ((x)*(x))
 #define CLIP(x,a,b) ((x)<(a)?(a):((x)>(b)?(b):(x)))
+#define MIN(a,b) ((a)<(b)?(a):(b))
+#define MAX(a,b) ((a)>(b)?(a):(b))
 
+/* number of threads for OpenMP loops; values less than 1 use the OpenMP default */
+#define NUM_THREADS(n) ((n) > 0 ? (n) : omp_get_max_threads())
 
-typedef struct subgrid_cell {
-    int num_atoms;
-    int *atom_positions;
-    int num_domains;
-    int *domain_points;
-    int *domain_indices;
-} subgrid_cell_t;
+/* width of the grid slabs that are processed in parallel by atomstogrid */
+#define ATOMSTOGRID_SLAB_WIDTH 8
 
-typedef struct subgrid {
-    subgrid_cell_t *a;
-    int cubesize;
-    int ncells;
-    int dimensions[3];
-    int strides[3];
-} subgrid_t;
+/* cells without a seed in the input and output of distance_transform */
+#define DISTANCE_INFINITY INT32_MAX
 
+#define CONCAT_SUFFIX_(name, suffix) name ## _ ## suffix
+#define CONCAT_SUFFIX(name, suffix) CONCAT_SUFFIX_(name, suffix)
 
-#define INDEXGRID(i,j,k) ((int64_t)(i)*strides[0]+(j)*strides[1]+(k)*strides[2])
-#define INDEXDISCGRID(i,j,k) ((int64_t)(i)*discgrid_strides[0]+(j)*discgrid_strides[1]+(k)*discgrid_strides[2])
 
-/**
- * Mark spheres around atoms on the grid.
- * For each discretized atom and its equivalents in adjacent cells:
- * for each cell of the discretized sphere around them:
- * find the grid cells which are inside the cutoff radius.
- * For each of this grid cells:
- * check if the cell is inside the volume,
- * check if this atom is the closest to this cell
- * and write the atom index (+1) into it.
+/*
+ * The subgrid divides the grid into cubes and stores the (translated) atom
+ * positions and domain points of each cube. Both layers are stored in
+ * compressed sparse row format: the entries of cell c are the entries
+ * offsets[c] to offsets[c + 1] - 1 of the packed arrays, in the order in
+ * which they were added.
  */
-EXPORT void atomstogrid(
-        int64_t *grid, int dimensions[3], int strides[3],
-        int natoms, int *atom_positions, int *radii_indices,
-        int nradii, int *radii,
-        int ntranslations, int *translations,
-        char *discretization_grid, int discgrid_strides[3])
-{
-    int i, j, k;
-    int radius;
+struct subgrid {
     int cubesize;
-    int atompos[3];
-    int transpos[3];
-    int sphereindex[3];
-    int gridpos[3];
-    int grid_index;
-    int grid_value;
-    int this_squared_distance;
-    int other_squared_distance;
-    int other_atompos[3];
-    int other_transpos[3];
-
-    (void) nradii;
-
-    for (i = 0; i < natoms; i++) {
-        radius = radii[radii_indices[i]];
-        cubesize = 2 * radius + 1;
-        atompos[0] = atom_positions[i * 3 + 0];
-        atompos[1] = atom_positions[i * 3 + 1];
-        atompos[2] = atom_positions[i * 3 + 2];
-        for (j = 0; j < ntranslations; j++) {
-            transpos[0] = atompos[0] + translations[j * 3 + 0];
-            transpos[1] = atompos[1] + translations[j * 3 + 1];
-            transpos[2] = atompos[2] + translations[j * 3 + 2];
-            if (transpos[0] + radius < 0 || transpos[0] - radius >= dimensions[0]
-                    || transpos[1] + radius < 0 || transpos[1] - radius >= dimensions[1]
-                    || transpos[2] + radius < 0 || transpos[2] - radius >= dimensions[2]) {
-                /* entire cube is outside */
-                continue;
-            }
-            for (sphereindex[0] = 0; sphereindex[0] < cubesize; sphereindex[0]++) {
-                gridpos[0] = transpos[0] + sphereindex[0] - radius;
-                if (gridpos[0] < 0 || gridpos[0] >= dimensions[0]) {
-                    continue;
-                }
-                for (sphereindex[1] = 0; sphereindex[1] < cubesize; sphereindex[1]++) {
-                    gridpos[1] = transpos[1] + sphereindex[1] - radius;
-                    if (gridpos[1] < 0 || gridpos[1] >= dimensions[1]) {
-                        continue;
-                    }
-                    for (sphereindex[2] = 0; sphereindex[2] < cubesize; sphereindex[2]++) {
-                        gridpos[2] = transpos[2] + sphereindex[2] - radius;
-                        if (gridpos[2] < 0 || gridpos[2] >= dimensions[2]) {
-                            continue;
-                        }
-                        if (SQUARE(sphereindex[0] - radius)
-                                + SQUARE(sphereindex[1] - radius)
-                                + SQUARE(sphereindex[2] - radius)
-                                <= SQUARE(radius)
-                                && discretization_grid[INDEXDISCGRID(gridpos[0], gridpos[1], gridpos[2])] == 0) {
-                            grid_index = INDEXGRID(gridpos[0], gridpos[1], gridpos[2]);
-                            grid_value = grid[grid_index];
-                            /* check if it is the closest atom */
-                            if (grid_value == 0) {
-                                grid[grid_index] = i + 1;
-                            } else {
-                                this_squared_distance = SQUARE(transpos[0] - gridpos[0])
-                                        + SQUARE(transpos[1] - gridpos[1])
-                                        + SQUARE(transpos[2] - gridpos[2]);
-                                other_atompos[0] = atom_positions[3 * (grid_value - 1) + 0];
-                                other_atompos[1] = atom_positions[3 * (grid_value - 1) + 1];
-                                other_atompos[2] = atom_positions[3 * (grid_value - 1) + 2];
-                                for (k = 0; k < ntranslations; k++) {
-                                    other_transpos[0] = other_atompos[0] + translations[k * 3 + 0];
-                                    other_transpos[1] = other_atompos[1] + translations[k * 3 + 1];
-                                    other_transpos[2] = other_atompos[2] + translations[k * 3 + 2];
-                                    other_squared_distance = SQUARE(other_transpos[0] - gridpos[0])
-                                            + SQUARE(other_transpos[1] - gridpos[1])
-                                            + SQUARE(other_transpos[2] - gridpos[2]);
-                                    if (other_squared_distance <= this_squared_distance) {
-                                        break;
-                                    }
-                                }
-                                if (this_squared_distance < other_squared_distance) {
-                                    grid[grid_index] = i + 1;
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        }
-    }
-}
-
-#undef INDEXGRID
-#undef INDEXDISCGRID
+    int ncells;
+    int dimensions[3];
+    int strides[3];
+    int *atom_offsets;
+    int *atom_positions;
+    int *domain_offsets;
+    int *domain_points;
+    int *domain_indices;
+};
 
 
 /**
@@ -161,21 +68,22 @@ EXPORT subgrid_t *subgrid_create(int cubesize, int grid_dimensions[3])
     sg->strides[1] = sg->dimensions[2];
     sg->strides[2] = 1;
 
-    sg->a = calloc(sg->ncells, sizeof(subgrid_cell_t));
+    sg->atom_offsets = calloc(sg->ncells + 1, sizeof(int));
+    sg->atom_positions = NULL;
+    sg->domain_offsets = calloc(sg->ncells + 1, sizeof(int));
+    sg->domain_points = NULL;
+    sg->domain_indices = NULL;
 
     return sg;
 }
 
 EXPORT void subgrid_destroy(subgrid_t *sg)
 {
-    int i;
-
-    for (i = 0; i < sg->ncells; i++) {
-        free(sg->a[i].atom_positions);
-        free(sg->a[i].domain_points);
-        free(sg->a[i].domain_indices);
-    }
-    free(sg->a);
+    free(sg->atom_offsets);
+    free(sg->atom_positions);
+    free(sg->domain_offsets);
+    free(sg->domain_points);
+    free(sg->domain_indices);
     free(sg);
 }
 
@@ -195,191 +103,192 @@ int subgrid_index(subgrid_t *sg, int *pos)
     return index;
 }
 
-EXPORT void subgrid_add_atoms(subgrid_t *sg,
-        int natoms, int *atom_positions,
-        int ntranslations, int *translations)
+/**
+ * Add points to one layer of a subgrid with a stable counting sort: the new
+ * entries of each cell are placed after its existing ones. The points are
+ * images from a halo, so they already include the needed equivalents in
+ * adjacent cells. `indices` (one value per point) and `*packed_indices` may
+ * be NULL if the layer has no indices.
+ */
+static void subgrid_insert(subgrid_t *sg, int *offsets, int **packed_points, int **packed_indices,
+        int npoints, int *points, int *indices)
 {
-    int i, j;
-    int real_pos[3];
-    subgrid_cell_t *cell;
-
-    for (i = 0; i < natoms; i++) {
-        for (j = 0; j < ntranslations; j++) {
-            real_pos[0] = atom_positions[i * 3 + 0] + translations[j * 3 + 0];
-            real_pos[1] = atom_positions[i * 3 + 1] + translations[j * 3 + 1];
-            real_pos[2] = atom_positions[i * 3 + 2] + translations[j * 3 + 2];
-            cell = sg->a + subgrid_index(sg, real_pos);
-            cell->atom_positions = realloc(cell->atom_positions,
-                    (cell->num_atoms + 1) * 3 * sizeof(int));
-            cell->atom_positions[3 * cell->num_atoms + 0] = real_pos[0];
-            cell->atom_positions[3 * cell->num_atoms + 1] = real_pos[1];
-            cell->atom_positions[3 * cell->num_atoms + 2] = real_pos[2];
-            cell->num_atoms++;
-        }
+    int64_t i;
+    int c;
+    int index;
+    int nold, nnew;
+    int *cells;
+    int *new_offsets;
+    int *cursors;
+    int *new_points;
+    int *new_indices = NULL;
+
+    nold = offsets[sg->ncells];
+    nnew = npoints;
+    if (nnew == 0) {
+        return;
+    }
+    cells = malloc(nnew * sizeof(int));
+    new_offsets = calloc(sg->ncells + 1, sizeof(int));
+    cursors = malloc(sg->ncells * sizeof(int));
+    new_points = malloc(3 * (int64_t) (nold + nnew) * sizeof(int));
+    if (indices != NULL) {
+        new_indices = malloc((int64_t) (nold + nnew) * sizeof(int));
     }
-}
 
-EXPORT void subgrid_add_domains(subgrid_t *sg,
-        int npoints, int *domain_indices, int *domain_points,
-        int ntranslations, int *translations)
-{
-    int i, j;
-    int real_pos[3];
-    subgrid_cell_t *cell;
+    /* first pass: count the entries of each cell */
+    for (i = 0; i < npoints; i++) {
+        c = subgrid_index(sg, points + i * 3);
+        cells[i] = c;
+        new_offsets[c + 1]++;
+    }
+    for (c = 0; c < sg->ncells; c++) {
+        new_offsets[c + 1] += new_offsets[c] + offsets[c + 1] - offsets[c];
+    }
 
+    /* second pass: move the existing entries and place the new ones */
+    for (c = 0; c < sg->ncells; c++) {
+        if (offsets[c + 1] > offsets[c]) {
+            memcpy(new_points + 3 * (int64_t) new_offsets[c], *packed_points + 3 * (int64_t) offsets[c],
+                    3 * (offsets[c + 1] - offsets[c]) * sizeof(int));
+            if (indices != NULL) {
+                memcpy(new_indices + new_offsets[c], *packed_indices + offsets[c],
+                        (offsets[c + 1] - offsets[c]) * sizeof(int));
+            }
+        }
+        cursors[c] = new_offsets[c] + offsets[c + 1] - offsets[c];
+    }
     for (i = 0; i < npoints; i++) {
-        for (j = 0; j < ntranslations; j++) {
-            real_pos[0] = domain_points[i * 3 + 0] + translations[j * 3 + 0];
-            real_pos[1] = domain_points[i * 3 + 1] + translations[j * 3 + 1];
-            real_pos[2] = domain_points[i * 3 + 2] + translations[j * 3 + 2];
-            cell = sg->a + subgrid_index(sg, real_pos);
-            cell->domain_indices = realloc(cell->domain_indices,
-                    (cell->num_domains + 1) * sizeof(int));
-            cell->domain_indices[cell->num_domains] = domain_indices[i];
-            cell->domain_points = realloc(cell->domain_points,
-                    (cell->num_domains + 1) * 3 * sizeof(int));
-            cell->domain_points[3 * cell->num_domains + 0] = real_pos[0];
-            cell->domain_points[3 * cell->num_domains + 1] = real_pos[1];
-            cell->domain_points[3 * cell->num_domains + 2] = real_pos[2];
-            cell->num_domains++;
+        index = cursors[cells[i]]++;
+        new_points[3 * (int64_t) index + 0] = points[i * 3 + 0];
+        new_points[3 * (int64_t) index + 1] = points[i * 3 + 1];
+        new_points[3 * (int64_t) index + 2] = points[i * 3 + 2];
+        if (indices != NULL) {
+            new_indices[index] = indices[i];
         }
     }
+
+    memcpy(offsets, new_offsets, (sg->ncells + 1) * sizeof(int));
+    free(*packed_points);
+    *packed_points = new_points;
+    if (indices != NULL) {
+        free(*packed_indices);
+        *packed_indices = new_indices;
+    }
+    free(cells);
+    free(new_offsets);
+    free(cursors);
 }
 
+EXPORT void subgrid_add_atoms(subgrid_t *sg,
+        int nimages, int *atom_images)
+{
+    subgrid_insert(sg, sg->atom_offsets, &sg->atom_positions, NULL,
+            nimages, atom_images, NULL);
+}
 
-#define INDEXGRID(i,j,k) ((int64_t)(i)*strides[0]+(j)*strides[1]+(k)*strides[2])
-#define INDEXDISCGRID(i,j,k) ((int64_t)(i)*discgrid_strides[0]+(j)*discgrid_strides[1]+(k)*discgrid_strides[2])
+EXPORT void subgrid_add_domains(subgrid_t *sg,
+        int nimages, int *domain_indices, int *domain_images)
+{
+    subgrid_insert(sg, sg->domain_offsets, &sg->domain_points, &sg->domain_indices,
+            nimages, domain_images, domain_indices);
+}
 
 /**
- * For each cell, determine if it is closer to a cavity domain than
- * to an atom center. If so, mark the cell in the grid.
+ * Remove all domain points from a subgrid, so it can be reused with other
+ * domains. The atoms are kept.
  */
-EXPORT void mark_cavities(int64_t *grid, int64_t *domain_grid, int dimensions[3], int strides[3],
-        char *discretization_grid, int discgrid_strides[3],
-        subgrid_t *sg, int use_surface_points)
+EXPORT void subgrid_clear_domains(subgrid_t *sg)
 {
-    int pos[3];
-    int grid_index;
-    int grid_value;
-    int sg_index;
-    int min_squared_atom_distance;
-    int squared_atom_distance;
-    int neigh[3];
-    int neigh_index;
-    subgrid_cell_t *cell;
-    int i;
-    int breaknext;
-    int squared_domain_distance;
+    free(sg->domain_points);
+    free(sg->domain_indices);
+    sg->domain_points = NULL;
+    sg->domain_indices = NULL;
+    memset(sg->domain_offsets, 0, (sg->ncells + 1) * sizeof(int));
+}
 
-    for (pos[0] = 0; pos[0] < dimensions[0]; pos[0]++) {
-        for (pos[1] = 0; pos[1] < dimensions[1]; pos[1]++) {
-            for (pos[2] = 0; pos[2] < dimensions[2]; pos[2]++) {
-                grid_index = INDEXGRID(pos[0], pos[1], pos[2]);
-                if (use_surface_points) {
-                    grid_value = domain_grid[grid_index];
-                    if (grid_value == 0) {
-                        /* outside the volume */
-                        grid[grid_index] = 0;
-                        continue;
-                    } else if (grid_value < 0) {
-                        /* cavity domain (stored as: -index-1), therefore guaranteed to be in a cavity */
-                        grid[grid_index] = grid_value;
-                        continue;
-                    } else {
-                        grid[grid_index] = 0;
-                    }
-                } else {
-                    if (discretization_grid[INDEXDISCGRID(pos[0], pos[1], pos[2])] != 0) {
-                        continue;
-                    }
-                }
-                /* step 5 */
-                min_squared_atom_distance = INT_MAX;
-                sg_index = subgrid_index(sg, pos);
-                for (neigh[0] = -1; neigh[0] <= 1; neigh[0]++) {
-                    for (neigh[1] = -1; neigh[1] <= 1; neigh[1]++) {
-                        for (neigh[2] = -1; neigh[2] <= 1; neigh[2]++) {
-                            neigh_index = sg_index + neigh[0] * sg->strides[0]
-                                    + neigh[1] * sg->strides[1]
-                                    + neigh[2] * sg->strides[2];
-                            cell = sg->a + neigh_index;
-                            for (i = 0; i < cell->num_atoms; i++) {
-                                squared_atom_distance =
-                                        SQUARE(cell->atom_positions[i * 3 + 0] - pos[0])
-                                        + SQUARE(cell->atom_positions[i * 3 + 1] - pos[1])
-                                        + SQUARE(cell->atom_positions[i * 3 + 2] - pos[2]);
-                                if (squared_atom_distance < min_squared_atom_distance) {
-                                    min_squared_atom_distance = squared_atom_distance;
-                                }
-                            }
-                        }
-                    }
-                }
-                breaknext = 0;
-                for (neigh[0] = -1; neigh[0] <= 1; neigh[0]++) {
-                    for (neigh[1] = -1; neigh[1] <= 1; neigh[1]++) {
-                        for (neigh[2] = -1; neigh[2] <= 1; neigh[2]++) {
-                            neigh_index = sg_index + neigh[0] * sg->strides[0]
-                                    + neigh[1] * sg->strides[1]
-                                    + neigh[2] * sg->strides[2];
-                            cell = sg->a + neigh_index;
-                            for (i = 0; i < cell->num_domains; i++) {
-                                squared_domain_distance =
-                                        SQUARE(cell->domain_points[i * 3 + 0] - pos[0])
-                                        + SQUARE(cell->domain_points[i * 3 + 1] - pos[1])
-                                        + SQUARE(cell->domain_points[i * 3 + 2] - pos[2]);
-                                if (squared_domain_distance < min_squared_atom_distance) {
-                                    grid[grid_index] = -cell->domain_indices[i] - 1;
-                                    breaknext = 1;
-                                    break; /* i */
-                                }
-                            }
-                            if (breaknext) {
-                                break; /* neigh[2] */
-                            }
-                        }
-                        if (breaknext) {
-                            break; /* neigh[1] */
-                        }
-                    }
-                    if (breaknext) {
-                        break; /* neigh[0] */
-                    }
-                }
+
+/**
+ * Weld the vertices of a triangle soup in place: each distinct pair of
+ * vertex position and normal (compared bitwise) is moved to the front of
+ * `vertices` and `normals` in the order of its first occurrence and
+ * indices[i] is set to the new index of the i-th vertex. Returns the number
+ * of distinct vertices.
+ */
+static int weld_vertices(int nvertices, float *vertices, float *normals, unsigned int *indices)
+{
+    int i, j, k;
+    int nwelded;
+    size_t capacity;
+    size_t slot;
+    uint32_t bits;
+    uint64_t hash;
+    int *table;
+
+    capacity = 1;
+    while (capacity < 2 * (size_t) nvertices) {
+        capacity *= 2;
+    }
+    table = malloc(capacity * sizeof(int));
+    memset(table, -1, capacity * sizeof(int));
+    nwelded = 0;
+    for (i = 0; i < nvertices; i++) {
+        /* FNV-1a hash of the bits of position and normal */
+        hash = 14695981039346656037ULL;
+        for (k = 0; k < 6; k++) {
+            memcpy(&bits, k < 3 ? vertices + i * 3 + k : normals + i * 3 + k - 3, sizeof(bits));
+            hash = (hash ^ bits) * 1099511628211ULL;
+        }
+        slot = (size_t) (hash ^ (hash >> 32)) & (capacity - 1);
+        while ((j = table[slot]) != -1) {
+            if (memcmp(vertices + j * 3, vertices + i * 3, 3 * sizeof(float)) == 0
+                    && memcmp(normals + j * 3, normals + i * 3, 3 * sizeof(float)) == 0) {
+                break;
             }
+            slot = (slot + 1) & (capacity - 1);
+        }
+        if (j == -1) {
+            /* the slots before i only contain welded vertices, so this does not overwrite unread ones */
+            j = nwelded++;
+            memmove(vertices + j * 3, vertices + i * 3, 3 * sizeof(float));
+            memmove(normals + j * 3, normals + i * 3, 3 * sizeof(float));
+            table[slot] = j;
         }
+        indices[i] = j;
     }
+    free(table);
+    return nwelded;
 }
-#undef INDEXGRID
-#undef INDEXDISCGRID
 
 
-#define INDEXGRID(i,j,k) ((int64_t)(i)*strides[0]+(j)*strides[1]+(k)*strides[2])
 #define INDEXDISCGRID(i,j,k) ((int64_t)(i)*discgrid_strides[0]+(j)*discgrid_strides[1]+(k)*discgrid_strides[2])
-EXPORT int cavity_triangles(
-        int64_t *cavity_grid,
-        int dimensions[3],
-        int strides[3],
-        int ncavity_indices,
-        int *cavity_indices,
+/**
+ * Triangulate a counts grid with gr3 and convert the resulting triangles
+ * to continuous coordinates. `counts` points to the first cell of the
+ * bounding box `bbox`, which is given in discrete grid coordinates.
+ * The surface area only includes triangles whose vertices are all inside
+ * the volume. The triangles are returned as an indexed mesh: shared
+ * vertices are welded (see weld_vertices), `*vertices` and `*normals` store
+ * `*nvertices` vertices and `*indices` stores three vertex indices per
+ * triangle. If `vertices`, `normals` and `indices` are NULL, only the
+ * surface area is calculated and no triangles are stored.
+ */
+static int triangulate_counts(
+        uint16_t *counts,
+        int bbox[2][3],
+        int counts_strides[3],
         int isolevel,
         float step[3],
         float offset[3],
         int8_t *discretization_grid,
         int discgrid_strides[3],
+        int *nvertices,
         float **vertices,
         float **normals,
+        unsigned int **indices,
         float *surface_area)
 {
-    uint16_t *counts;
-    int pos[3];
-    int gridindex;
-    int gridval;
     int i, j, k;
-    int is_cavity;
-    int neigh[3];
-    int neighindex;
-    int bbox[2][3] = {{-1, -1, -1}, {-1, -1, -1}};
     int ntriangles;
     float *triangles_p;
     float *continuous_vertices;
@@ -388,73 +297,29 @@ EXPORT int cavity_triangles(
     int any_outside;
     float *vertex_p;
     float *normal_p;
+    float triangle[3][3];
     int disc_pos[3];
     double a[3], b[3];
     double cross[3];
 
-    counts = calloc(dimensions[0] * dimensions[1] * dimensions[2],
-            sizeof(uint16_t));
-    for (pos[0] = 1; pos[0] < dimensions[0] - 1; pos[0]++) {
-        for (pos[1] = 1; pos[1] < dimensions[1] - 1; pos[1]++) {
-            for (pos[2] = 1; pos[2] < dimensions[2] - 1; pos[2]++) {
-                gridindex = INDEXGRID(pos[0], pos[1], pos[2]);
-                counts[gridindex] += 100;
-                gridval = cavity_grid[gridindex];
-                is_cavity = 0;
-                for (i = 0; i < ncavity_indices; i++) {
-                    if (gridval == -cavity_indices[i] - 1) {
-                        is_cavity = 1;
-                        break;
-                    }
-                }
-                if (!is_cavity) {
-                    continue;
-                }
-                for (neigh[0] = -1; neigh[0] <= 1; neigh[0]++) {
-                    for (neigh[1] = -1; neigh[1] <= 1; neigh[1]++) {
-                        for (neigh[2] = -1; neigh[2] <= 1; neigh[2]++) {
-                            neighindex = gridindex + INDEXGRID(
-                                    neigh[0], neigh[1], neigh[2]);
-                            counts[neighindex]++;
-                        }
-                    }
-                }
-                for (i = 0; i < 3; i++) {
-                    if (bbox[0][i] == -1 ||
-                            bbox[0][i] > pos[i] - 1) {
-                        bbox[0][i] = pos[i] - 1;
-                    }
-                    if (bbox[1][i] == -1 ||
-                            bbox[1][i] < pos[i] + 1) {
-                        bbox[1][i] = pos[i] + 1;
-                    }
-                }
-            }
-        }
-    }
-    for (i = 0; i < 3; i++) {
-        if (bbox[0][i] >= 1) {
-            bbox[0][i]--;
-        }
-        if (bbox[1][i] < dimensions[i] - 1) {
-            bbox[1][i]++;
-        }
-    }
-
     ntriangles = gr3_triangulate(
-            counts + INDEXGRID(bbox[0][0], bbox[0][1], bbox[0][2]),
+            counts,
             100 + isolevel,
             bbox[1][0] - bbox[0][0] + 1,
             bbox[1][1] - bbox[0][1] + 1,
             bbox[1][2] - bbox[0][2] + 1,
-            strides[0], strides[1], strides[2],
+            counts_strides[0], counts_strides[1], counts_strides[2],
             1.0, 1.0, 1.0,
             bbox[0][0], bbox[0][1], bbox[0][2],
             (gr3_triangle_t **) &triangles_p);
-    free(counts);
 
-    continuous_vertices = malloc(ntriangles * 3 * 3 * sizeof(float));
-    continuous_normals = malloc(ntriangles * 3 * 3 * sizeof(float));
+    if (vertices != NULL) {
+        continuous_vertices = malloc(ntriangles * 3 * 3 * sizeof(float));
+        continuous_normals = malloc(ntriangles * 3 * 3 * sizeof(float));
+    } else {
+        continuous_vertices = NULL;
+        continuous_normals = NULL;
+    }
     area = 0.0;
     for (i = 0; i < ntriangles; i++) {
         any_outside = 0;
@@ -463,10 +328,12 @@ EXPORT int cavity_triangles(
             normal_p = vertex_p + 3 * 3;
             for (k = 0; k < 3; k++) {
                 disc_pos[k] = floor(vertex_p[k] + 0.5);
-                continuous_vertices[(i * 3 + j) * 3 + k] =
-                        vertex_p[k] * step[k] + offset[k];
-                continuous_normals[(i * 3 + j) * 3 + k] =
-                        normal_p[k] / step[k];
+                triangle[j][k] = vertex_p[k] * step[k] + offset[k];
+                if (continuous_vertices != NULL) {
+                    continuous_vertices[(i * 3 + j) * 3 + k] = triangle[j][k];
+                    continuous_normals[(i * 3 + j) * 3 + k] =
+                            normal_p[k] / step[k];
+                }
             }
             if (discretization_grid[INDEXDISCGRID(
                     disc_pos[0], disc_pos[1], disc_pos[2])] != 0) {
@@ -475,10 +342,8 @@ EXPORT int cavity_triangles(
         }
         if (!any_outside) {
             for (k = 0; k < 3; k++) {
-                a[k] = continuous_vertices[(i * 3 + 1) * 3 + k]
-                        - continuous_vertices[(i * 3 + 0) * 3 + k];
-                b[k] = continuous_vertices[(i * 3 + 2) * 3 + k]
-                        - continuous_vertices[(i * 3 + 0) * 3 + k];
+                a[k] = triangle[1][k] - triangle[0][k];
+                b[k] = triangle[2][k] - triangle[0][k];
             }
             cross[0] = a[1] * b[2] - a[2] * b[1];
             cross[1] = a[2] * b[0] - a[0] * b[2];
@@ -489,12 +354,15 @@ EXPORT int cavity_triangles(
     }
     free(triangles_p);
 
-    *vertices = continuous_vertices;
-    *normals = continuous_normals;
+    if (vertices != NULL) {
+        *indices = malloc(MAX(ntriangles, 1) * 3 * sizeof(unsigned int));
+        *nvertices = weld_vertices(ntriangles * 3, continuous_vertices, continuous_normals, *indices);
+        *vertices = realloc(continuous_vertices, MAX(*nvertices, 1) * 3 * sizeof(float));
+        *normals = realloc(continuous_normals, MAX(*nvertices, 1) * 3 * sizeof(float));
+    }
     *surface_area = area;
     return ntriangles;
 }
-#undef INDEXGRID
 #undef INDEXDISCGRID
 
 
@@ -504,59 +372,146 @@ EXPORT void free_float_p(float *p)
 }
 
 
-#define INDEXGRID(i,j,k) ((int64_t)(i)*strides[0]+(j)*strides[1]+(k)*strides[2])
-EXPORT void cavity_intersections(
-        int64_t *grid,
-        int dimensions[3],
-        int strides[3],
-        int num_domains,
-        int8_t *intersection_table)
+EXPORT void free_int_p(int *p)
+{
+    free(p);
+}
+
+
+EXPORT void free_uint_p(unsigned int *p)
+{
+    free(p);
+}
+
+
+/**
+ * Sphere stencils for atomstogrid: for each radius r, the stencil stores
+ * the half length of the sphere row through each (dx, dy) with
+ * -r <= dx, dy <= r (at index (dx + r) * (2r + 1) + dy + r), so the row
+ * contains the cells dz with |dz| <= half length. Rows outside of the sphere
+ * have a half length of -1. The stencil of the i-th radius starts at
+ * stencil_offsets[i] of the returned array.
+ */
+static int *sphere_stencils(int nradii, int *radii, int64_t *stencil_offsets)
 {
-    int pos[3];
     int i;
-    int neigh[3];
-    int gridindex, neighindex;
-    int64_t domain1, domain2;
-    int offsets[13][3] = {
-        {-1, -1, -1},
-        {-1, -1, 0},
-        {-1, -1, 1},
-        {-1, 0, -1},
-        {-1, 0, 0},
-        {-1, 0, 1},
-        {-1, 1, -1},
-        {-1, 1, 0},
-        {-1, 1, 1},
-        {0, -1, -1},
-        {0, -1, 0},
-        {0, -1, 1},
-        {0, 0, -1}
-    };
-
-    for (pos[0] = 1; pos[0] < dimensions[0] - 1; pos[0]++) {
-        for (pos[1] = 1; pos[1] < dimensions[1] - 1; pos[1]++) {
-            for (pos[2] = 1; pos[2] < dimensions[2] - 1; pos[2]++) {
-                gridindex = INDEXGRID(pos[0], pos[1], pos[2]);
-                domain1 = -grid[gridindex] - 1;
-                if (domain1 != -1) {
-                    for (i = 0; i < 13; i++) {
-                        neigh[0] = offsets[i][0];
-                        neigh[1] = offsets[i][1];
-                        neigh[2] = offsets[i][2];
-                        neighindex = gridindex + INDEXGRID(
-                                neigh[0], neigh[1], neigh[2]);
-                        domain2 = -grid[neighindex] - 1;
-                        if (domain2 != -1) {
-                            intersection_table[domain1 * num_domains + domain2] = 1;
-                            intersection_table[domain2 * num_domains + domain1] = 1;
-                        } /* if domain2 */
-                    } /* for i */
-                } /* if domain1 */
-            } /* for pos[2] */
-        } /* for pos[1] */
-    } /* for pos[0] */
+    int dx, dy;
+    int radius;
+    int remainder;
+    int half;
+    int *stencils;
+    int *stencil;
+
+    stencil_offsets[0] = 0;
+    for (i = 0; i < nradii; i++) {
+        stencil_offsets[i + 1] = stencil_offsets[i] + SQUARE((int64_t) 2 * radii[i] + 1);
+    }
+    stencils = malloc(MAX(stencil_offsets[nradii], 1) * sizeof(int));
+    for (i = 0; i < nradii; i++) {
+        radius = radii[i];
+        stencil = stencils + stencil_offsets[i];
+        for (dx = -radius; dx <= radius; dx++) {
+            for (dy = -radius; dy <= radius; dy++) {
+                remainder = SQUARE(radius) - SQUARE(dx) - SQUARE(dy);
+                half = -1;
+                if (remainder >= 0) {
+                    half = (int) sqrt((double) remainder);
+                    /* correct rounding errors of sqrt */
+                    while (SQUARE(half) > remainder) {
+                        half--;
+                    }
+                    while (SQUARE(half + 1) <= remainder) {
+                        half++;
+                    }
+                }
+                stencil[(dx + radius) * (2 * radius + 1) + dy + radius] = half;
+            }
+        }
+    }
+    return stencils;
 }
-#undef INDEXGRID
+
+
+typedef struct {
+    uint64_t code;
+    int index;
+} morton_key_t;
+
+static uint64_t morton_spread(uint64_t x)
+{
+    x &= 0x1fffff;
+    x = (x | x << 32) & 0x1f00000000ffffULL;
+    x = (x | x << 16) & 0x1f0000ff0000ffULL;
+    x = (x | x << 8) & 0x100f00f00f00f00fULL;
+    x = (x | x << 4) & 0x10c30c30c30c30c3ULL;
+    x = (x | x << 2) & 0x1249249249249249ULL;
+    return x;
+}
+
+static int compare_morton_keys(const void *a, const void *b)
+{
+    const morton_key_t *key_a = a;
+    const morton_key_t *key_b = b;
+
+    if (key_a->code != key_b->code) {
+        return key_a->code < key_b->code ? -1 : 1;
+    }
+    return key_a->index - key_b->index;
+}
+
+/**
+ * Return the indices of the given points sorted by their Morton (Z-order)
+ * code, so that points which are close to each other are usually close in
+ * the order, too. Coordinates may be negative (as for periodic images).
+ */
+static int *morton_order(int npoints, int *points)
+{
+    int i, k;
+    uint64_t code;
+    morton_key_t *keys;
+    int *order;
+
+    keys = malloc(MAX(npoints, 1) * sizeof(morton_key_t));
+    for (i = 0; i < npoints; i++) {
+        code = 0;
+        for (k = 0; k < 3; k++) {
+            code |= morton_spread((uint64_t) ((int64_t) points[i * 3 + k] + (1 << 20))) << (2 - k);
+        }
+        keys[i].code = code;
+        keys[i].index = i;
+    }
+    qsort(keys, npoints, sizeof(morton_key_t), compare_morton_keys);
+    order = malloc(MAX(npoints, 1) * sizeof(int));
+    for (i = 0; i < npoints; i++) {
+        order[i] = keys[i].index;
+    }
+    free(keys);
+    return order;
+}
+
+
+/**
+ * Kernels on label grids, specialized for each supported label type
+ * (see algorithm_labels.h). The python wrappers choose the kernel by the
+ * dtype of the grid, e.g. atomstogrid_int16 for a numpy.int16 grid.
+ */
+#define LABEL_T int16_t
+#define LABEL_FUNC(name) CONCAT_SUFFIX(name, int16)
+#include "algorithm_labels.h"
+#undef LABEL_T
+#undef LABEL_FUNC
+
+#define LABEL_T int32_t
+#define LABEL_FUNC(name) CONCAT_SUFFIX(name, int32)
+#include "algorithm_labels.h"
+#undef LABEL_T
+#undef LABEL_FUNC
+
+#define LABEL_T int64_t
+#define LABEL_FUNC(name) CONCAT_SUFFIX(name, int64)
+#include "algorithm_labels.h"
+#undef LABEL_T
+#undef LABEL_FUNC
 
 
 #define INDEXGRID(i,j,k) ((int64_t)(i)*strides[0]+(j)*strides[1]+(k)*strides[2])
@@ -686,3 +641,110 @@ EXPORT void mark_translation_vectors(
     free(trans_valid);
 }
 #undef INDEXGRID
+
+
+/**
+ * One-dimensional squared distance transform (Felzenszwalb and Huttenlocher)
+ * of the `n` values in `f`, which are read and written with the given
+ * stride. Cells with the value DISTANCE_INFINITY contain no seed; they stay
+ * DISTANCE_INFINITY if there is no seed in the whole line. `v` and `z` are
+ * buffers for the indices of the lower envelope parabolas and their
+ * intersections with at least `n` and `n + 1` elements.
+ */
+static void distance_transform_line(int32_t *f, int n, int64_t stride, int64_t *values, int *v, double *z)
+{
+    int q;
+    int k;
+    double s;
+
+    k = -1;
+    for (q = 0; q < n; q++) {
+        values[q] = f[q * stride];
+        if (values[q] == DISTANCE_INFINITY) {
+            continue;
+        }
+        if (k < 0) {
+            k = 0;
+            v[0] = q;
+            z[0] = -HUGE_VAL;
+            z[1] = HUGE_VAL;
+            continue;
+        }
+        s = ((double) (values[q] + (int64_t) q * q) - (double) (values[v[k]] + (int64_t) v[k] * v[k]))
+                / (2.0 * (q - v[k]));
+        while (s <= z[k]) {
+            k--;
+            s = ((double) (values[q] + (int64_t) q * q) - (double) (values[v[k]] + (int64_t) v[k] * v[k]))
+                    / (2.0 * (q - v[k]));
+        }
+        k++;
+        v[k] = q;
+        z[k] = s;
+        z[k + 1] = HUGE_VAL;
+    }
+    if (k < 0) {
+        /* no seed in this line */
+        return;
+    }
+    k = 0;
+    for (q = 0; q < n; q++) {
+        while (z[k + 1] < q) {
+            k++;
+        }
+        f[q * stride] = (int32_t) CLIP(SQUARE((int64_t) (q - v[k])) + values[v[k]], 0, DISTANCE_INFINITY);
+    }
+}
+
+
+/**
+ * Exact squared euclidean distance transform of a grid, in which all seed
+ * cells are 0 and all other cells are DISTANCE_INFINITY. Afterwards, each
+ * cell contains the squared distance (in cells) to the nearest seed.
+ * The transform is separable: the lines along each axis are transformed one
+ * after another and are processed in parallel.
+ */
+EXPORT void distance_transform(int32_t *grid, int dimensions[3], int strides[3], int nthreads)
+{
+    int axis;
+    int other_axes[2];
+    int max_dimension;
+
+    (void) nthreads;
+
+    max_dimension = dimensions[0];
+    if (dimensions[1] > max_dimension) {
+        max_dimension = dimensions[1];
+    }
+    if (dimensions[2] > max_dimension) {
+        max_dimension = dimensions[2];
+    }
+    for (axis = 0; axis < 3; axis++) {
+        other_axes[0] = (axis + 1) % 3;
+        other_axes[1] = (axis + 2) % 3;
+#ifdef _OPENMP
+#pragma omp parallel num_threads(NUM_THREADS(nthreads))
+#endif
+        {
+            int64_t *values = malloc(max_dimension * sizeof(int64_t));
+            int *v = malloc(max_dimension * sizeof(int));
+            double *z = malloc((max_dimension + 1) * sizeof(double));
+            int line;
+            int nlines = dimensions[other_axes[0]] * dimensions[other_axes[1]];
+
+#ifdef _OPENMP
+#pragma omp for schedule(static)
+#endif
+            for (line = 0; line < nlines; line++) {
+                int i = line / dimensions[other_axes[1]];
+                int j = line % dimensions[other_axes[1]];
+
+                distance_transform_line(
+                        grid + (int64_t) i * strides[other_axes[0]] + (int64_t) j * strides[other_axes[1]],
+                        dimensions[axis], strides[axis], values, v, z);
+            }
+            free(values);
+            free(v);
+            free(z);
+        }
+    }
+}
@@ -0,0 +1,66 @@
+/**
+ * Declarations of the algorithm library kernels that are called by the
+ * native Python module (_algorithm.c), which is linked against this library
+ * instead of compiling its own copy of the kernels. algorithm.c includes this
+ * file as well, so the declarations are checked against the definitions.
+ */
+#ifndef ALGORITHM_H
+#define ALGORITHM_H
+
+#include <stdint.h>
+
+#ifdef _WIN32
+#ifdef ALGORITHM_BUILD
+#define EXPORT __declspec(dllexport)
+#else
+#define EXPORT __declspec(dllimport)
+#endif
+#else
+#define EXPORT
+#endif
+
+/* the subgrid of atom and domain positions (see subgrid_create in algorithm.c) */
+typedef struct subgrid subgrid_t;
+
+EXPORT subgrid_t *subgrid_create(int cubesize, int grid_dimensions[3]);
+EXPORT void subgrid_destroy(subgrid_t *sg);
+EXPORT void subgrid_add_atoms(subgrid_t *sg, int nimages, int *atom_images);
+EXPORT void subgrid_add_domains(subgrid_t *sg, int nimages, int *domain_indices, int *domain_images);
+EXPORT void subgrid_clear_domains(subgrid_t *sg);
+
+EXPORT void free_float_p(float *p);
+EXPORT void free_int_p(int *p);
+EXPORT void free_uint_p(unsigned int *p);
+
+EXPORT void mark_translation_vectors(int8_t *grid, int dimensions[3], int strides[3], int ntranslations,
+        int *translations);
+
+/* the kernels of algorithm_labels.h for the label type LABEL_T and the function name suffix */
+#define DECLARE_LABEL_KERNELS(LABEL_T, suffix) \
+    EXPORT void atomstogrid_ ## suffix( \
+            LABEL_T *grid, int dimensions[3], int strides[3], \
+            int natoms, int *image_offsets, int *images, int *radii_indices, \
+            int nradii, int *radii, \
+            char *discretization_grid, int discgrid_strides[3], \
+            int nthreads); \
+    EXPORT void mark_cavities_ ## suffix(LABEL_T *grid, LABEL_T *domain_grid, int dimensions[3], int strides[3], \
+            char *discretization_grid, int discgrid_strides[3], \
+            subgrid_t *sg, int use_surface_points, int nthreads); \
+    EXPORT void cavity_triangles_multi_ ## suffix( \
+            LABEL_T *cavity_grid, int dimensions[3], int strides[3], \
+            int ncavities, int *cavity_groups, int ngroups, \
+            int isolevel, float step[3], float offset[3], \
+            int8_t *discretization_grid, int discgrid_strides[3], \
+            int nthreads, \
+            int *ntriangles, int *nvertices, float **vertices, float **normals, unsigned int **indices, \
+            float *surface_areas); \
+    EXPORT void cavity_intersection_pairs_ ## suffix( \
+            LABEL_T *grid, int dimensions[3], int strides[3], int **pairs, int *npairs);
+
+DECLARE_LABEL_KERNELS(int16_t, int16)
+DECLARE_LABEL_KERNELS(int32_t, int32)
+DECLARE_LABEL_KERNELS(int64_t, int64)
+
+#undef DECLARE_LABEL_KERNELS
+
+#endif
@@ -0,0 +1,682 @@
+/**
+ * Kernels that work on label grids (atom, domain and cavity grids). Atoms are
+ * stored as (index + 1), domains and cavities as -(index + 1) and empty cells
+ * as 0. Depending on the number of labels, these grids use 16, 32 or 64 bit
+ * integers, so this file is included once for each label type by algorithm.c
+ * with the following macros defined:
+ *
+ * - LABEL_T: integer type of the grid cells
+ * - LABEL_FUNC(name): name of the function specialized for LABEL_T
+ *
+ * There is no include guard, as this file is meant to be included several
+ * times.
+ */
+
+#define INDEXGRID(i,j,k) ((int64_t)(i)*strides[0]+(j)*strides[1]+(k)*strides[2])
+#define INDEXDISCGRID(i,j,k) ((int64_t)(i)*discgrid_strides[0]+(j)*discgrid_strides[1]+(k)*discgrid_strides[2])
+
+/**
+ * Mark the cells of the box begin <= (x, y, z) < end which are inside the
+ * sphere around the atom with the given index at the (translated) position
+ * transpos. The sphere is given by its stencil (see sphere_stencils), so
+ * each row of the sphere is a contiguous run of cells along the last axis.
+ * Only cells inside the volume are marked and a cell is only overwritten if
+ * this atom is closer than the atom already stored in it. Atoms with the
+ * same distance are ordered by their index, so the result does not depend
+ * on the order in which the atoms are processed.
+ */
+static void LABEL_FUNC(atomstogrid_box)(
+        LABEL_T *grid, int strides[3],
+        int atom_index, int transpos[3], int radius, int *stencil, int begin[3], int end[3],
+        int *image_offsets, int *images,
+        char *discretization_grid, int discgrid_strides[3])
+{
+    int k;
+    int gridpos[3];
+    int half;
+    int z_begin, z_end;
+    int64_t grid_index;
+    int grid_value;
+    int row_squared_distance;
+    int this_squared_distance;
+    int other_squared_distance;
+    int replace;
+
+    for (gridpos[0] = begin[0]; gridpos[0] < end[0]; gridpos[0]++) {
+        for (gridpos[1] = begin[1]; gridpos[1] < end[1]; gridpos[1]++) {
+            half = stencil[(gridpos[0] - transpos[0] + radius) * (2 * radius + 1)
+                    + gridpos[1] - transpos[1] + radius];
+            if (half < 0) {
+                continue;
+            }
+            z_begin = MAX(begin[2], transpos[2] - half);
+            z_end = MIN(end[2], transpos[2] + half + 1);
+            row_squared_distance = SQUARE(transpos[0] - gridpos[0]) + SQUARE(transpos[1] - gridpos[1]);
+            for (gridpos[2] = z_begin; gridpos[2] < z_end; gridpos[2]++) {
+                if (discretization_grid[INDEXDISCGRID(gridpos[0], gridpos[1], gridpos[2])] != 0) {
+                    continue;
+                }
+                grid_index = INDEXGRID(gridpos[0], gridpos[1], gridpos[2]);
+                grid_value = grid[grid_index];
+                /* check if it is the closest atom */
+                if (grid_value == 0) {
+                    grid[grid_index] = atom_index + 1;
+                    continue;
+                }
+                this_squared_distance = row_squared_distance + SQUARE(transpos[2] - gridpos[2]);
+                /* the images of the other atom that are missing in the halo are farther away than radius */
+                replace = 1;
+                for (k = image_offsets[grid_value - 1]; k < image_offsets[grid_value]; k++) {
+                    other_squared_distance = SQUARE(images[k * 3 + 0] - gridpos[0])
+                            + SQUARE(images[k * 3 + 1] - gridpos[1])
+                            + SQUARE(images[k * 3 + 2] - gridpos[2]);
+                    if (other_squared_distance < this_squared_distance
+                            || (other_squared_distance == this_squared_distance && grid_value - 1 < atom_index)) {
+                        replace = 0;
+                        break;
+                    }
+                }
+                if (replace) {
+                    grid[grid_index] = atom_index + 1;
+                }
+            }
+        }
+    }
+}
+
+/**
+ * Mark spheres around atoms on the grid, but only in the slab of cells with
+ * slab_begin <= x < slab_end.
+ * The atoms are given by their halo: the images of atom i (the atom and its
+ * equivalents in adjacent cells which are close enough to the grid) are the
+ * points image_offsets[i] to image_offsets[i + 1] - 1 of images. The halo
+ * must contain all images that are at most the maximum radius away from the
+ * grid. The images are processed in the given order; image_atoms contains
+ * the atom index of each image.
+ * For each image:
+ * find the grid cells which are inside the cutoff radius.
+ * For each of this grid cells:
+ * check if the cell is inside the volume,
+ * check if this atom is the closest to this cell
+ * and write the atom index (+1) into it.
+ */
+static void LABEL_FUNC(atomstogrid_slab)(
+        LABEL_T *grid, int dimensions[3], int strides[3],
+        int nimages, int *image_order, int *image_atoms, int *image_offsets, int *images,
+        int *radii_indices, int *radii, int *stencils, int64_t *stencil_offsets,
+        char *discretization_grid, int discgrid_strides[3],
+        int slab_begin, int slab_end)
+{
+    int i, j, k;
+    int atom_index;
+    int radius;
+    int *stencil;
+    int transpos[3];
+    int begin[3];
+    int end[3];
+    int skip;
+
+    for (i = 0; i < nimages; i++) {
+        j = image_order[i];
+        atom_index = image_atoms[j];
+        radius = radii[radii_indices[atom_index]];
+        skip = 0;
+        for (k = 0; k < 3; k++) {
+            transpos[k] = images[j * 3 + k];
+            begin[k] = MAX(transpos[k] - radius, k == 0 ? slab_begin : 0);
+            end[k] = MIN(transpos[k] + radius + 1, k == 0 ? slab_end : dimensions[k]);
+            if (begin[k] >= end[k]) {
+                /* entire cube is outside */
+                skip = 1;
+            }
+        }
+        if (skip) {
+            continue;
+        }
+        stencil = stencils + stencil_offsets[radii_indices[atom_index]];
+        LABEL_FUNC(atomstogrid_box)(grid, strides, atom_index, transpos, radius, stencil, begin, end,
+                image_offsets, images,
+                discretization_grid, discgrid_strides);
+    }
+}
+
+
+/**
+ * Mark spheres around atoms on the grid (see atomstogrid_slab).
+ * The sphere stencils are calculated once for each radius and the atom
+ * images are processed in Morton order, so consecutive spheres usually
+ * touch the same part of the grid.
+ * The grid is divided into slabs along the first axis, which are processed
+ * in parallel. Each slab is written by one thread only. This makes the
+ * closest atom updates race-free and, as ties are broken by the atom index,
+ * the result is independent of the number of threads and the order of the
+ * atoms.
+ */
+EXPORT void LABEL_FUNC(atomstogrid)(
+        LABEL_T *grid, int dimensions[3], int strides[3],
+        int natoms, int *image_offsets, int *images, int *radii_indices,
+        int nradii, int *radii,
+        char *discretization_grid, int discgrid_strides[3],
+        int nthreads)
+{
+    int nslabs;
+    int slab;
+    int nimages;
+    int i, j;
+    int *image_order;
+    int *image_atoms;
+    int *stencils;
+    int64_t *stencil_offsets;
+
+    (void) nthreads;
+
+    nimages = image_offsets[natoms];
+    image_atoms = malloc(MAX(nimages, 1) * sizeof(int));
+    for (i = 0; i < natoms; i++) {
+        for (j = image_offsets[i]; j < image_offsets[i + 1]; j++) {
+            image_atoms[j] = i;
+        }
+    }
+    image_order = morton_order(nimages, images);
+    stencil_offsets = malloc((nradii + 1) * sizeof(int64_t));
+    stencils = sphere_stencils(nradii, radii, stencil_offsets);
+
+    nslabs = (dimensions[0] + ATOMSTOGRID_SLAB_WIDTH - 1) / ATOMSTOGRID_SLAB_WIDTH;
+#ifdef _OPENMP
+#pragma omp parallel for schedule(dynamic) num_threads(NUM_THREADS(nthreads))
+#endif
+    for (slab = 0; slab < nslabs; slab++) {
+        LABEL_FUNC(atomstogrid_slab)(grid, dimensions, strides,
+                nimages, image_order, image_atoms, image_offsets, images,
+                radii_indices, radii, stencils, stencil_offsets,
+                discretization_grid, discgrid_strides,
+                slab * ATOMSTOGRID_SLAB_WIDTH,
+                CLIP((slab + 1) * ATOMSTOGRID_SLAB_WIDTH, 0, dimensions[0]));
+    }
+
+    free(image_atoms);
+    free(image_order);
+    free(stencil_offsets);
+    free(stencils);
+}
+
+#undef INDEXGRID
+#undef INDEXDISCGRID
+
+
+#define INDEXGRID(i,j,k) ((int64_t)(i)*strides[0]+(j)*strides[1]+(k)*strides[2])
+#define INDEXDISCGRID(i,j,k) ((int64_t)(i)*discgrid_strides[0]+(j)*discgrid_strides[1]+(k)*discgrid_strides[2])
+
+/**
+ * For each cell, determine if it is closer to a cavity domain than
+ * to an atom center. If so, mark the cell in the grid.
+ * The cells are independent of each other, so the slices of the grid are
+ * processed in parallel.
+ */
+EXPORT void LABEL_FUNC(mark_cavities)(LABEL_T *grid, LABEL_T *domain_grid, int dimensions[3], int strides[3],
+        char *discretization_grid, int discgrid_strides[3],
+        subgrid_t *sg, int use_surface_points, int nthreads)
+{
+    int x;
+    int pos[3];
+    int grid_index;
+    int grid_value;
+    int sg_index;
+    int min_squared_atom_distance;
+    int squared_atom_distance;
+    int neigh[3];
+    int neigh_index;
+    int i;
+    int breaknext;
+    int squared_domain_distance;
+
+    (void) nthreads;
+
+#ifdef _OPENMP
+#pragma omp parallel for schedule(dynamic) num_threads(NUM_THREADS(nthreads)) \
+        private(pos, grid_index, grid_value, sg_index, min_squared_atom_distance, squared_atom_distance, \
+                neigh, neigh_index, i, breaknext, squared_domain_distance)
+#endif
+    for (x = 0; x < dimensions[0]; x++) {
+        pos[0] = x;
+        for (pos[1] = 0; pos[1] < dimensions[1]; pos[1]++) {
+            for (pos[2] = 0; pos[2] < dimensions[2]; pos[2]++) {
+                grid_index = INDEXGRID(pos[0], pos[1], pos[2]);
+                if (use_surface_points) {
+                    grid_value = domain_grid[grid_index];
+                    if (grid_value == 0) {
+                        /* outside the volume */
+                        grid[grid_index] = 0;
+                        continue;
+                    } else if (grid_value < 0) {
+                        /* cavity domain (stored as: -index-1), therefore guaranteed to be in a cavity */
+                        grid[grid_index] = grid_value;
+                        continue;
+                    } else {
+                        grid[grid_index] = 0;
+                    }
+                } else {
+                    if (discretization_grid[INDEXDISCGRID(pos[0], pos[1], pos[2])] != 0) {
+                        continue;
+                    }
+                }
+                /* step 5 */
+                min_squared_atom_distance = INT_MAX;
+                sg_index = subgrid_index(sg, pos);
+                for (neigh[0] = -1; neigh[0] <= 1; neigh[0]++) {
+                    for (neigh[1] = -1; neigh[1] <= 1; neigh[1]++) {
+                        for (neigh[2] = -1; neigh[2] <= 1; neigh[2]++) {
+                            neigh_index = sg_index + neigh[0] * sg->strides[0]
+                                    + neigh[1] * sg->strides[1]
+                                    + neigh[2] * sg->strides[2];
+                            for (i = sg->atom_offsets[neigh_index]; i < sg->atom_offsets[neigh_index + 1]; i++) {
+                                squared_atom_distance =
+                                        SQUARE(sg->atom_positions[i * 3 + 0] - pos[0])
+                                        + SQUARE(sg->atom_positions[i * 3 + 1] - pos[1])
+                                        + SQUARE(sg->atom_positions[i * 3 + 2] - pos[2]);
+                                if (squared_atom_distance < min_squared_atom_distance) {
+                                    min_squared_atom_distance = squared_atom_distance;
+                                }
+                            }
+                        }
+                    }
+                }
+                breaknext = 0;
+                for (neigh[0] = -1; neigh[0] <= 1; neigh[0]++) {
+                    for (neigh[1] = -1; neigh[1] <= 1; neigh[1]++) {
+                        for (neigh[2] = -1; neigh[2] <= 1; neigh[2]++) {
+                            neigh_index = sg_index + neigh[0] * sg->strides[0]
+                                    + neigh[1] * sg->strides[1]
+                                    + neigh[2] * sg->strides[2];
+                            for (i = sg->domain_offsets[neigh_index]; i < sg->domain_offsets[neigh_index + 1]; i++) {
+                                squared_domain_distance =
+                                        SQUARE(sg->domain_points[i * 3 + 0] - pos[0])
+                                        + SQUARE(sg->domain_points[i * 3 + 1] - pos[1])
+                                        + SQUARE(sg->domain_points[i * 3 + 2] - pos[2]);
+                                if (squared_domain_distance < min_squared_atom_distance) {
+                                    grid[grid_index] = -sg->domain_indices[i] - 1;
+                                    breaknext = 1;
+                                    break; /* i */
+                                }
+                            }
+                            if (breaknext) {
+                                break; /* neigh[2] */
+                            }
+                        }
+                        if (breaknext) {
+                            break; /* neigh[1] */
+                        }
+                    }
+                    if (breaknext) {
+                        break; /* neigh[0] */
+                    }
+                }
+            }
+        }
+    }
+}
+#undef INDEXGRID
+#undef INDEXDISCGRID
+
+
+#define INDEXGRID(i,j,k) ((int64_t)(i)*strides[0]+(j)*strides[1]+(k)*strides[2])
+EXPORT int LABEL_FUNC(cavity_triangles)(
+        LABEL_T *cavity_grid,
+        int dimensions[3],
+        int strides[3],
+        int ncavity_indices,
+        int *cavity_indices,
+        int isolevel,
+        float step[3],
+        float offset[3],
+        int8_t *discretization_grid,
+        int discgrid_strides[3],
+        int *nvertices,
+        float **vertices,
+        float **normals,
+        unsigned int **indices,
+        float *surface_area)
+{
+    uint16_t *counts;
+    int pos[3];
+    int gridindex;
+    int gridval;
+    int i;
+    int is_cavity;
+    int neigh[3];
+    int neighindex;
+    int bbox[2][3] = {{-1, -1, -1}, {-1, -1, -1}};
+    int ntriangles;
+
+    counts = calloc(dimensions[0] * dimensions[1] * dimensions[2],
+            sizeof(uint16_t));
+    for (pos[0] = 1; pos[0] < dimensions[0] - 1; pos[0]++) {
+        for (pos[1] = 1; pos[1] < dimensions[1] - 1; pos[1]++) {
+            for (pos[2] = 1; pos[2] < dimensions[2] - 1; pos[2]++) {
+                gridindex = INDEXGRID(pos[0], pos[1], pos[2]);
+                counts[gridindex] += 100;
+                gridval = cavity_grid[gridindex];
+                is_cavity = 0;
+                for (i = 0; i < ncavity_indices; i++) {
+                    if (gridval == -cavity_indices[i] - 1) {
+                        is_cavity = 1;
+                        break;
+                    }
+                }
+                if (!is_cavity) {
+                    continue;
+                }
+                for (neigh[0] = -1; neigh[0] <= 1; neigh[0]++) {
+                    for (neigh[1] = -1; neigh[1] <= 1; neigh[1]++) {
+                        for (neigh[2] = -1; neigh[2] <= 1; neigh[2]++) {
+                            neighindex = gridindex + INDEXGRID(
+                                    neigh[0], neigh[1], neigh[2]);
+                            counts[neighindex]++;
+                        }
+                    }
+                }
+                for (i = 0; i < 3; i++) {
+                    if (bbox[0][i] == -1 ||
+                            bbox[0][i] > pos[i] - 1) {
+                        bbox[0][i] = pos[i] - 1;
+                    }
+                    if (bbox[1][i] == -1 ||
+                            bbox[1][i] < pos[i] + 1) {
+                        bbox[1][i] = pos[i] + 1;
+                    }
+                }
+            }
+        }
+    }
+    for (i = 0; i < 3; i++) {
+        if (bbox[0][i] >= 1) {
+            bbox[0][i]--;
+        }
+        if (bbox[1][i] < dimensions[i] - 1) {
+            bbox[1][i]++;
+        }
+    }
+
+    ntriangles = triangulate_counts(
+            counts + INDEXGRID(bbox[0][0], bbox[0][1], bbox[0][2]),
+            bbox, strides, isolevel, step, offset,
+            discretization_grid, discgrid_strides,
+            nvertices, vertices, normals, indices, surface_area);
+    free(counts);
+
+    return ntriangles;
+}
+
+
+/**
+ * Triangulate several groups of cavities (e.g. all domains or all
+ * multicavities) at once. `cavity_groups` maps each cavity index to the
+ * index of the group it belongs to (or -1 if it should be ignored).
+ * The bounding boxes of all groups are determined in a single pass over
+ * the grid. Afterwards, the counts grid of each group is only built inside
+ * of its bounding box, so groups can be triangulated in parallel with a
+ * memory footprint that does not depend on the number of groups.
+ * The output arrays must have a length of `ngroups`; the indexed mesh of
+ * each group is stored like in triangulate_counts and its vertices, normals
+ * and indices must be freed with `free_float_p` and `free_uint_p`. If
+ * `nvertices`, `vertices`, `normals` and `indices` are NULL, only the
+ * surface areas are calculated.
+ */
+EXPORT void LABEL_FUNC(cavity_triangles_multi)(
+        LABEL_T *cavity_grid,
+        int dimensions[3],
+        int strides[3],
+        int ncavities,
+        int *cavity_groups,
+        int ngroups,
+        int isolevel,
+        float step[3],
+        float offset[3],
+        int8_t *discretization_grid,
+        int discgrid_strides[3],
+        int nthreads,
+        int *ntriangles,
+        int *nvertices,
+        float **vertices,
+        float **normals,
+        unsigned int **indices,
+        float *surface_areas)
+{
+    int pos[3];
+    int64_t gridval;
+    int group;
+    int i;
+    int (*bboxes)[2][3];
+
+    bboxes = malloc(ngroups * sizeof(*bboxes));
+    for (group = 0; group < ngroups; group++) {
+        for (i = 0; i < 3; i++) {
+            bboxes[group][0][i] = -1;
+            bboxes[group][1][i] = -1;
+        }
+    }
+    for (pos[0] = 1; pos[0] < dimensions[0] - 1; pos[0]++) {
+        for (pos[1] = 1; pos[1] < dimensions[1] - 1; pos[1]++) {
+            for (pos[2] = 1; pos[2] < dimensions[2] - 1; pos[2]++) {
+                gridval = -cavity_grid[INDEXGRID(pos[0], pos[1], pos[2])] - 1;
+                if (gridval < 0 || gridval >= ncavities || cavity_groups[gridval] < 0) {
+                    continue;
+                }
+                group = cavity_groups[gridval];
+                for (i = 0; i < 3; i++) {
+                    if (bboxes[group][0][i] == -1 ||
+                            bboxes[group][0][i] > pos[i] - 1) {
+                        bboxes[group][0][i] = pos[i] - 1;
+                    }
+                    if (bboxes[group][1][i] == -1 ||
+                            bboxes[group][1][i] < pos[i] + 1) {
+                        bboxes[group][1][i] = pos[i] + 1;
+                    }
+                }
+            }
+        }
+    }
+
+    (void) nthreads;
+#ifdef _OPENMP
+#pragma omp parallel for schedule(dynamic) num_threads(NUM_THREADS(nthreads))
+#endif
+    for (group = 0; group < ngroups; group++) {
+        int (*bbox)[3] = bboxes[group];
+        int counts_dimensions[3];
+        int counts_strides[3];
+        uint16_t *counts;
+        int cell[3];
+        int neigh[3];
+        int64_t cavity;
+        int j;
+
+        if (bbox[0][0] == -1) {
+            /* empty group */
+            ntriangles[group] = 0;
+            if (vertices != NULL) {
+                nvertices[group] = 0;
+                vertices[group] = NULL;
+                normals[group] = NULL;
+                indices[group] = NULL;
+            }
+            surface_areas[group] = 0.0f;
+            continue;
+        }
+        for (j = 0; j < 3; j++) {
+            if (bbox[0][j] >= 1) {
+                bbox[0][j]--;
+            }
+            if (bbox[1][j] < dimensions[j] - 1) {
+                bbox[1][j]++;
+            }
+            counts_dimensions[j] = bbox[1][j] - bbox[0][j] + 1;
+        }
+        counts_strides[0] = counts_dimensions[1] * counts_dimensions[2];
+        counts_strides[1] = counts_dimensions[2];
+        counts_strides[2] = 1;
+        counts = malloc((size_t) counts_dimensions[0] * counts_strides[0] * sizeof(uint16_t));
+        /* cells inside of the grid border start with the same offset as in `cavity_triangles` */
+        for (cell[0] = bbox[0][0]; cell[0] <= bbox[1][0]; cell[0]++) {
+            for (cell[1] = bbox[0][1]; cell[1] <= bbox[1][1]; cell[1]++) {
+                for (cell[2] = bbox[0][2]; cell[2] <= bbox[1][2]; cell[2]++) {
+                    counts[(cell[0] - bbox[0][0]) * counts_strides[0]
+                            + (cell[1] - bbox[0][1]) * counts_strides[1]
+                            + (cell[2] - bbox[0][2])] =
+                            (cell[0] >= 1 && cell[0] < dimensions[0] - 1
+                             && cell[1] >= 1 && cell[1] < dimensions[1] - 1
+                             && cell[2] >= 1 && cell[2] < dimensions[2] - 1) ? 100 : 0;
+                }
+            }
+        }
+        for (cell[0] = CLIP(bbox[0][0], 1, dimensions[0] - 2); cell[0] <= CLIP(bbox[1][0], 1, dimensions[0] - 2); cell[0]++) {
+            for (cell[1] = CLIP(bbox[0][1], 1, dimensions[1] - 2); cell[1] <= CLIP(bbox[1][1], 1, dimensions[1] - 2); cell[1]++) {
+                for (cell[2] = CLIP(bbox[0][2], 1, dimensions[2] - 2); cell[2] <= CLIP(bbox[1][2], 1, dimensions[2] - 2); cell[2]++) {
+                    cavity = -cavity_grid[INDEXGRID(cell[0], cell[1], cell[2])] - 1;
+                    if (cavity < 0 || cavity >= ncavities || cavity_groups[cavity] != group) {
+                        continue;
+                    }
+                    for (neigh[0] = cell[0] - 1; neigh[0] <= cell[0] + 1; neigh[0]++) {
+                        for (neigh[1] = cell[1] - 1; neigh[1] <= cell[1] + 1; neigh[1]++) {
+                            for (neigh[2] = cell[2] - 1; neigh[2] <= cell[2] + 1; neigh[2]++) {
+                                counts[(neigh[0] - bbox[0][0]) * counts_strides[0]
+                                        + (neigh[1] - bbox[0][1]) * counts_strides[1]
+                                        + (neigh[2] - bbox[0][2])]++;
+                            }
+                        }
+                    }
+                }
+            }
+        }
+        ntriangles[group] = triangulate_counts(
+                counts, bbox, counts_strides, isolevel, step, offset,
+                discretization_grid, discgrid_strides,
+                vertices != NULL ? nvertices + group : NULL,
+                vertices != NULL ? vertices + group : NULL,
+                vertices != NULL ? normals + group : NULL,
+                vertices != NULL ? indices + group : NULL,
+                surface_areas + group);
+        free(counts);
+    }
+    free(bboxes);
+}
+#undef INDEXGRID
+
+
+#define INDEXGRID(i,j,k) ((int64_t)(i)*strides[0]+(j)*strides[1]+(k)*strides[2])
+/**
+ * Find all pairs of different labels in the grid that touch each other (with
+ * one of the 26 neighbors of a cell). Label i is stored in the grid as
+ * -(i + 1). The pairs are written to `*pairs` as (smaller label, larger label)
+ * and their number to `*npairs`. The list is sparse, but may contain
+ * duplicates. `*pairs` must be freed with `free_int_p`.
+ */
+EXPORT void LABEL_FUNC(cavity_intersection_pairs)(
+        LABEL_T *grid,
+        int dimensions[3],
+        int strides[3],
+        int **pairs,
+        int *npairs)
+{
+    int pos[3];
+    int i;
+    int neigh[3];
+    int64_t gridindex, neighindex;
+    int64_t domain1, domain2;
+    int64_t low, high;
+    int64_t last_low = -1, last_high = -1;
+    int capacity = 1024;
+    int count = 0;
+    int *result;
+    int offsets[13][3] = {
+        {-1, -1, -1},
+        {-1, -1, 0},
+        {-1, -1, 1},
+        {-1, 0, -1},
+        {-1, 0, 0},
+        {-1, 0, 1},
+        {-1, 1, -1},
+        {-1, 1, 0},
+        {-1, 1, 1},
+        {0, -1, -1},
+        {0, -1, 0},
+        {0, -1, 1},
+        {0, 0, -1}
+    };
+
+    result = malloc(capacity * 2 * sizeof(int));
+    for (pos[0] = 1; pos[0] < dimensions[0] - 1; pos[0]++) {
+        for (pos[1] = 1; pos[1] < dimensions[1] - 1; pos[1]++) {
+            for (pos[2] = 1; pos[2] < dimensions[2] - 1; pos[2]++) {
+                gridindex = INDEXGRID(pos[0], pos[1], pos[2]);
+                domain1 = -grid[gridindex] - 1;
+                if (domain1 != -1) {
+                    for (i = 0; i < 13; i++) {
+                        neigh[0] = offsets[i][0];
+                        neigh[1] = offsets[i][1];
+                        neigh[2] = offsets[i][2];
+                        neighindex = gridindex + INDEXGRID(
+                                neigh[0], neigh[1], neigh[2]);
+                        domain2 = -grid[neighindex] - 1;
+                        if (domain2 == -1 || domain2 == domain1) {
+                            continue;
+                        }
+                        low = domain1 < domain2 ? domain1 : domain2;
+                        high = domain1 < domain2 ? domain2 : domain1;
+                        /* neighboring cells mostly repeat the last pair, so skip it */
+                        if (low != last_low || high != last_high) {
+                            if (count == capacity) {
+                                capacity *= 2;
+                                result = realloc(result, capacity * 2 * sizeof(int));
+                            }
+                            result[2 * count] = (int) low;
+                            result[2 * count + 1] = (int) high;
+                            count++;
+                            last_low = low;
+                            last_high = high;
+                        }
+                    } /* for i */
+                } /* if domain1 */
+            } /* for pos[2] */
+        } /* for pos[1] */
+    } /* for pos[0] */
+    *pairs = result;
+    *npairs = count;
+}
+#undef INDEXGRID
+
+
+#define INDEXGRID(i,j,k) ((int64_t)(i)*strides[0]+(j)*strides[1]+(k)*strides[2])
+/**
+ * Collect statistics for all labels of a domain or cavity grid in a single
+ * pass. Label i is stored in the grid as -(i + 1). For each label, the number
+ * of cells is written into `counts`; labels without any cell keep a count of 0.
+ */
+EXPORT void LABEL_FUNC(label_statistics)(
+        LABEL_T *grid,
+        int dimensions[3],
+        int strides[3],
+        int num_labels,
+        int64_t *counts)
+{
+    int pos[3];
+    int i;
+    int64_t label;
+
+    for (i = 0; i < num_labels; i++) {
+        counts[i] = 0;
+    }
+
+    for (pos[0] = 0; pos[0] < dimensions[0]; pos[0]++) {
+        for (pos[1] = 0; pos[1] < dimensions[1]; pos[1]++) {
+            for (pos[2] = 0; pos[2] < dimensions[2]; pos[2]++) {
+                label = -grid[INDEXGRID(pos[0], pos[1], pos[2])] - 1;
+                if (label < 0 || label >= num_labels) {
+                    continue;
+                }
+                counts[label]++;
+            }
+        }
+    }
+}
+#undef INDEXGRID
@@ -1,9 +1,21 @@
-__all__ = ["atomstogrid", "mark_cavities", "cavity_triangles", "cavity_intersections"]
+__all__ = [
+    "AtomSubgrid",
+    "atomstogrid",
+    "mark_cavities",
+    "cavity_triangles",
+    "cavity_triangles_multi",
+    "cavity_surface_areas_multi",
+    "cavity_intersection_pairs",
+    "label_statistics",
+    "distance_transform",
+    "get_num_threads",
+    "set_num_threads",
+]
 
 
 import os
 import platform
-from ctypes import CDLL, POINTER, Structure, byref, c_float, c_int, c_int8, c_int64, cast
+from ctypes import CDLL, POINTER, Structure, byref, c_float, c_int, c_int8, c_int16, c_int32, c_int64, c_uint
 
 # Import gr3 to load `libGR3.so` which is needed by the ctypes extension
 import gr3  # noqa: F401 pylint: disable=unused-import
@@ -11,24 +23,22 @@ import numpy as np
 
 int_type = np.dtype(c_int)
 
-
-class subgrid_cell_t(Structure):
-    _fields_ = [
-        ("num_atoms", c_int),
-        ("atom_positions", POINTER(c_int)),
-        ("num_domains", c_int),
-        ("domain_indices", POINTER(c_int)),
-        ("domain_positions", POINTER(c_int)),
-    ]
+# number of threads used by the parallel parts of the C extension; 0 means the OpenMP default
+# (`OMP_NUM_THREADS` or the number of processors)
+num_threads = 0
 
 
 class subgrid_t(Structure):
     _fields_ = [
-        ("subgrid_cell_t", POINTER(subgrid_cell_t)),
         ("cubesize", c_int),
         ("ncells", c_int),
         ("dimensions", c_int * 3),
         ("strides", c_int * 3),
+        ("atom_offsets", POINTER(c_int)),
+        ("atom_positions", POINTER(c_int)),
+        ("domain_offsets", POINTER(c_int)),
+        ("domain_points", POINTER(c_int)),
+        ("domain_indices", POINTER(c_int)),
     ]
 
 
@@ -47,22 +57,6 @@ libpath = os.path.join(
 )
 lib = CDLL(libpath)
 
-lib.atomstogrid.restype = None
-lib.atomstogrid.argtypes = [
-    POINTER(c_int64),  # grid
-    c_int * 3,  # dimensions
-    c_int * 3,  # strides
-    c_int,  # natoms
-    POINTER(c_int),  # atom_positions
-    POINTER(c_int),  # radii_indices
-    c_int,  # nradii
-    POINTER(c_int),  # radii
-    c_int,  # ntranslations
-    POINTER(c_int),  # translations
-    POINTER(c_int8),  # discretization_grid
-    c_int * 3,
-]  # discretization_grid_strides
-
 lib.subgrid_create.restype = POINTER(subgrid_t)
 lib.subgrid_create.argtypes = [c_int, c_int * 3]  # cubesize  # grid_dimensions
 
@@ -72,62 +66,29 @@ lib.subgrid_destroy.argtypes = [POINTER(subgrid_t)]  # sg
 lib.subgrid_add_atoms.restype = None
 lib.subgrid_add_atoms.argtypes = [
     POINTER(subgrid_t),  # sg
-    c_int,  # natoms
-    POINTER(c_int),  # atom_positions
-    c_int,  # ntranslations
+    c_int,  # nimages
     POINTER(c_int),
-]  # translations
+]  # atom_images
+
+lib.subgrid_clear_domains.restype = None
+lib.subgrid_clear_domains.argtypes = [POINTER(subgrid_t)]  # sg
 
 lib.subgrid_add_domains.restype = None
 lib.subgrid_add_domains.argtypes = [
     POINTER(subgrid_t),  # sg
-    c_int,  # npoints
+    c_int,  # nimages
     POINTER(c_int),  # domain_indices
-    POINTER(c_int),  # domain_points
-    c_int,  # ntranslations
     POINTER(c_int),
-]  # translations
-
-lib.mark_cavities.restype = None
-lib.mark_cavities.argtypes = [
-    POINTER(c_int64),  # grid
-    POINTER(c_int64),  # domain_grid
-    c_int * 3,  # dimensions
-    c_int * 3,  # strides
-    POINTER(c_int8),  # discretization_grid
-    c_int * 3,  # discgrid_strides
-    POINTER(subgrid_t),  # sg
-    c_int,
-]  # use_surface_points
-
-lib.cavity_triangles.restype = c_int
-lib.cavity_triangles.argtypes = [
-    POINTER(c_int64),  # cavity_grid
-    c_int * 3,  # dimensions
-    c_int * 3,  # strides
-    c_int,  # ncavity_indices
-    POINTER(c_int),  # cavity_indices
-    c_int,  # isolevel
-    c_float * 3,  # step
-    c_float * 3,  # offset
-    POINTER(c_int8),  # discretization_grid
-    c_int * 3,  # discgrid_strides
-    POINTER(POINTER(c_float)),  # vertices
-    POINTER(POINTER(c_float)),  # normals
-    POINTER(c_float),
-]  # surface_area
+]  # domain_images
 
 lib.free_float_p.restype = None
 lib.free_float_p.argtypes = [POINTER(c_float)]
 
-lib.cavity_intersections.restype = None
-lib.cavity_intersections.argtypes = [
-    POINTER(c_int64),  # grid
-    c_int * 3,  # dimensions
-    c_int * 3,  # strides
-    c_int,  # num_domains
-    POINTER(c_int8),
-]  # intersection_table
+lib.free_int_p.restype = None
+lib.free_int_p.argtypes = [POINTER(c_int)]
+
+lib.free_uint_p.restype = None
+lib.free_uint_p.argtypes = [POINTER(c_uint)]
 
 lib.mark_translation_vectors.restype = None
 lib.mark_translation_vectors.argtypes = [
@@ -138,22 +99,170 @@ lib.mark_translation_vectors.argtypes = [
     POINTER(c_int),
 ]  # translations
 
+lib.distance_transform.restype = None
+lib.distance_transform.argtypes = [
+    POINTER(c_int32),  # grid
+    c_int * 3,  # dimensions
+    c_int * 3,  # strides
+    c_int,
+]  # nthreads
+
+# the kernels on label grids exist for each supported label type, e.g. `atomstogrid_int16` for `numpy.int16` grids
+label_types = {
+    np.dtype(np.int16): c_int16,
+    np.dtype(np.int32): c_int32,
+    np.dtype(np.int64): c_int64,
+}
+
+for label_dtype, c_label in label_types.items():
+    function = getattr(lib, "atomstogrid_" + label_dtype.name)
+    function.restype = None
+    function.argtypes = [
+        POINTER(c_label),  # grid
+        c_int * 3,  # dimensions
+        c_int * 3,  # strides
+        c_int,  # natoms
+        POINTER(c_int),  # image_offsets
+        POINTER(c_int),  # images
+        POINTER(c_int),  # radii_indices
+        c_int,  # nradii
+        POINTER(c_int),  # radii
+        POINTER(c_int8),  # discretization_grid
+        c_int * 3,  # discretization_grid_strides
+        c_int,
+    ]  # nthreads
+
+    function = getattr(lib, "mark_cavities_" + label_dtype.name)
+    function.restype = None
+    function.argtypes = [
+        POINTER(c_label),  # grid
+        POINTER(c_label),  # domain_grid
+        c_int * 3,  # dimensions
+        c_int * 3,  # strides
+        POINTER(c_int8),  # discretization_grid
+        c_int * 3,  # discgrid_strides
+        POINTER(subgrid_t),  # sg
+        c_int,  # use_surface_points
+        c_int,
+    ]  # nthreads
+
+    function = getattr(lib, "cavity_triangles_" + label_dtype.name)
+    function.restype = c_int
+    function.argtypes = [
+        POINTER(c_label),  # cavity_grid
+        c_int * 3,  # dimensions
+        c_int * 3,  # strides
+        c_int,  # ncavity_indices
+        POINTER(c_int),  # cavity_indices
+        c_int,  # isolevel
+        c_float * 3,  # step
+        c_float * 3,  # offset
+        POINTER(c_int8),  # discretization_grid
+        c_int * 3,  # discgrid_strides
+        POINTER(c_int),  # nvertices
+        POINTER(POINTER(c_float)),  # vertices
+        POINTER(POINTER(c_float)),  # normals
+        POINTER(POINTER(c_uint)),  # indices
+        POINTER(c_float),
+    ]  # surface_area
+
+    function = getattr(lib, "cavity_triangles_multi_" + label_dtype.name)
+    function.restype = None
+    function.argtypes = [
+        POINTER(c_label),  # cavity_grid
+        c_int * 3,  # dimensions
+        c_int * 3,  # strides
+        c_int,  # ncavities
+        POINTER(c_int),  # cavity_groups
+        c_int,  # ngroups
+        c_int,  # isolevel
+        c_float * 3,  # step
+        c_float * 3,  # offset
+        POINTER(c_int8),  # discretization_grid
+        c_int * 3,  # discgrid_strides
+        c_int,  # nthreads
+        POINTER(c_int),  # ntriangles
+        POINTER(c_int),  # nvertices
+        POINTER(POINTER(c_float)),  # vertices
+        POINTER(POINTER(c_float)),  # normals
+        POINTER(POINTER(c_uint)),  # indices
+        POINTER(c_float),
+    ]  # surface_areas
+
+    function = getattr(lib, "cavity_intersection_pairs_" + label_dtype.name)
+    function.restype = None
+    function.argtypes = [
+        POINTER(c_label),  # grid
+        c_int * 3,  # dimensions
+        c_int * 3,  # strides
+        POINTER(POINTER(c_int)),  # pairs
+        POINTER(c_int),
+    ]  # npairs
+
+    function = getattr(lib, "label_statistics_" + label_dtype.name)
+    function.restype = None
+    function.argtypes = [
+        POINTER(c_label),  # grid
+        c_int * 3,  # dimensions
+        c_int * 3,  # strides
+        c_int,  # num_labels
+        POINTER(c_int64),
+    ]  # counts
+
+
+def label_function(name, grid):
+    """
+    Returns the C function `name` that is specialized for the label type of
+    `grid`.
+    """
+    if grid.dtype not in label_types:
+        raise TypeError("Unsupported label grid type: {}".format(grid.dtype))
+    return getattr(lib, name + "_" + grid.dtype.name)
+
+
+def label_pointer(grid):
+    return grid.ctypes.data_as(POINTER(label_types[grid.dtype]))
+
+
+def set_num_threads(n):
+    """
+    Set the number of threads used by the parallel parts of the C extension.
+    If `n` is less than 1, the OpenMP default is used.
+    """
+    global num_threads
+    num_threads = max(0, int(n))
+
+
+def get_num_threads():
+    return num_threads
+
+
+def _threads(n):
+    return c_int(num_threads if n is None else n)
+
 
 def atomstogrid(
     grid,
-    discrete_positions,
+    halo,
     radii_indices,
     discrete_radii,
-    translation_vectors,
     discretization_grid,
+    num_threads=None,
 ):
+    """
+    Mark the spheres of the atoms given by their `halo` (see
+    ``Discretization.halo``) on `grid`. The halo must contain all images
+    that are at most the largest discrete radius away from the grid.
+    """
     dimensions = (c_int * 3)(*grid.shape)
     strides = (c_int * 3)(*[s // grid.itemsize for s in grid.strides])
-    grid_p = grid.ctypes.data_as(POINTER(c_int64))
+    grid_p = label_pointer(grid)
 
-    discrete_positions = np.ascontiguousarray(discrete_positions, dtype=int_type)
-    natoms = c_int(discrete_positions.shape[0])
-    discrete_positions_p = discrete_positions.ctypes.data_as(POINTER(c_int))
+    image_offsets = np.ascontiguousarray(halo.offsets, dtype=int_type)
+    natoms = c_int(image_offsets.shape[0] - 1)
+    image_offsets_p = image_offsets.ctypes.data_as(POINTER(c_int))
+    images = np.ascontiguousarray(halo.images, dtype=int_type)
+    images_p = images.ctypes.data_as(POINTER(c_int))
 
     radii_indices = np.ascontiguousarray(radii_indices, dtype=int_type)
     radii_indices_p = radii_indices.ctypes.data_as(POINTER(c_int))
@@ -162,26 +271,22 @@ def atomstogrid(
     nradii = discrete_radii.shape[0]
     discrete_radii_p = discrete_radii.ctypes.data_as(POINTER(c_int))
 
-    translation_vectors = np.ascontiguousarray(translation_vectors, dtype=int_type)
-    ntranslations = c_int(translation_vectors.shape[0])
-    translation_vectors_p = translation_vectors.ctypes.data_as(POINTER(c_int))
-
     discretization_grid_strides = (c_int * 3)(*[s // discretization_grid.itemsize for s in discretization_grid.strides])
     discretization_grid_p = discretization_grid.ctypes.data_as(POINTER(c_int8))
 
-    lib.atomstogrid(
+    label_function("atomstogrid", grid)(
         grid_p,
         dimensions,
         strides,
         natoms,
-        discrete_positions_p,
+        image_offsets_p,
+        images_p,
         radii_indices_p,
         nradii,
         discrete_radii_p,
-        ntranslations,
-        translation_vectors_p,
         discretization_grid_p,
         discretization_grid_strides,
+        _threads(num_threads),
     )
 
 
@@ -196,56 +301,87 @@ def subgrid_destroy(sg):
     lib.subgrid_destroy(sg)
 
 
-def subgrid_add_atoms(sg, atom_positions, translation_vectors):
-    atom_positions = np.ascontiguousarray(atom_positions, dtype=int_type)
-    natoms_c = c_int(atom_positions.shape[0])
-    atom_positions_c = atom_positions.ctypes.data_as(POINTER(c_int))
+def subgrid_add_atoms(sg, atom_images):
+    atom_images = np.ascontiguousarray(atom_images, dtype=int_type).reshape((-1, 3))
+    nimages_c = c_int(atom_images.shape[0])
+    atom_images_c = atom_images.ctypes.data_as(POINTER(c_int))
 
-    translations = np.ascontiguousarray(translation_vectors, dtype=int_type)
-    ntranslations_c = c_int(translations.shape[0])
-    translations_c = translations.ctypes.data_as(POINTER(c_int))
+    lib.subgrid_add_atoms(sg, nimages_c, atom_images_c)
 
-    lib.subgrid_add_atoms(sg, natoms_c, atom_positions_c, ntranslations_c, translations_c)
 
-
-def subgrid_add_domains(sg, domain_indices, domain_points, translation_vectors):
+def subgrid_add_domains(sg, domain_indices, domain_images):
     domain_indices = np.ascontiguousarray(domain_indices, dtype=int_type)
-    npoints_c = c_int(domain_indices.shape[0])
+    nimages_c = c_int(domain_indices.shape[0])
     domain_indices_c = domain_indices.ctypes.data_as(POINTER(c_int))
 
-    domain_points = np.ascontiguousarray(domain_points, dtype=int_type)
-    domain_points_c = domain_points.ctypes.data_as(POINTER(c_int))
+    domain_images = np.ascontiguousarray(domain_images, dtype=int_type).reshape((-1, 3))
+    domain_images_c = domain_images.ctypes.data_as(POINTER(c_int))
 
-    translations = np.ascontiguousarray(translation_vectors, dtype=int_type)
-    ntranslations_c = c_int(translations.shape[0])
-    translations_c = translations.ctypes.data_as(POINTER(c_int))
+    lib.subgrid_add_domains(sg, nimages_c, domain_indices_c, domain_images_c)
 
-    lib.subgrid_add_domains(
-        sg,
-        npoints_c,
-        domain_indices_c,
-        domain_points_c,
-        ntranslations_c,
-        translations_c,
-    )
 
+def subgrid_clear_domains(sg):
+    lib.subgrid_clear_domains(sg)
+
+
+class AtomSubgrid(object):
+    """
+    Subgrid with the atom images of a frame, which can be used for several
+    calls of :func:`mark_cavities` (e.g. for surface- and center-based
+    cavities). The domain seed points are a separate layer that is replaced
+    by each call. The subgrid must be freed with :meth:`free` or by using it
+    as a context manager.
+
+    The atom and domain images are taken from halos (see
+    ``Discretization.halo``) which must contain all images up to two cube
+    sizes away from the grid; images that are farther away are never used.
+    """
 
-def mark_cavities_c(grid, domain_grid, discretization_grid, sg, use_surface_points):
+    def __init__(self, cubesize, grid_dimensions, atom_images):
+        self.cubesize = cubesize
+        self.grid_dimensions = tuple(grid_dimensions)
+        self.sg = subgrid_create(cubesize, grid_dimensions)
+        subgrid_add_atoms(self.sg, atom_images)
+
+    def set_domains(self, domain_images, domain_indices):
+        """
+        Replace the domain seed points by `domain_images` with the domain
+        index of each image in `domain_indices`.
+        """
+        subgrid_clear_domains(self.sg)
+        subgrid_add_domains(self.sg, domain_indices, domain_images)
+
+    def clear_domains(self):
+        subgrid_clear_domains(self.sg)
+
+    def free(self):
+        if self.sg is not None:
+            subgrid_destroy(self.sg)
+            self.sg = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.free()
+
+
+def mark_cavities_c(grid, domain_grid, discretization_grid, sg, use_surface_points, num_threads=None):
     dimensions_c = (c_int * 3)(*grid.shape)
     strides_c = (c_int * 3)(*[s // grid.itemsize for s in grid.strides])
-    grid_c = grid.ctypes.data_as(POINTER(c_int64))
+    grid_c = label_pointer(grid)
 
     if domain_grid is not None:
-        domain_grid_c = domain_grid.ctypes.data_as(POINTER(c_int64))
+        domain_grid_c = label_pointer(domain_grid)
     else:
-        domain_grid_c = POINTER(c_int64)()
+        domain_grid_c = POINTER(label_types[grid.dtype])()
 
     discgrid_strides_c = (c_int * 3)(*[s // discretization_grid.itemsize for s in discretization_grid.strides])
     discretization_grid_c = discretization_grid.ctypes.data_as(POINTER(c_int8))
 
     use_surface_points_c = c_int(use_surface_points)
 
-    lib.mark_cavities(
+    label_function("mark_cavities", grid)(
         grid_c,
         domain_grid_c,
         dimensions_c,
@@ -254,6 +390,7 @@ def mark_cavities_c(grid, domain_grid, discretization_grid, sg, use_surface_poin
         discgrid_strides_c,
         sg,
         use_surface_points_c,
+        _threads(num_threads),
     )
 
 
@@ -262,37 +399,57 @@ def mark_cavities(
     discretization_grid,
     grid_dimensions,
     sg_cube_size,
-    atom_positions,
-    translation_vectors,
-    domain_point_list,
+    atom_images,
+    domain_images,
+    domain_indices,
     use_surface_points,
+    dtype=None,
+    subgrid=None,
+    num_threads=None,
 ):
-
-    # step 1
-    sg = subgrid_create(sg_cube_size, grid_dimensions)
-    # step 2
-    subgrid_add_atoms(sg, atom_positions, translation_vectors)
-
-    # step 3
-    domain_indices = []
-    domain_points = []
-    for i in range(len(domain_point_list)):
-        for p in domain_point_list[i]:
-            domain_indices.append(i)
-            domain_points.append(p)
-    subgrid_add_domains(sg, domain_indices, domain_points, translation_vectors)
-
-    grid = np.zeros(grid_dimensions, dtype=np.int64)
-    # step 4 and 5
-    mark_cavities_c(grid, domain_grid, discretization_grid, sg, use_surface_points)
-
-    subgrid_destroy(sg)
+    """
+    Mark all cells that are closer to a cavity domain than to an atom and
+    return the resulting cavity grid. The atoms and domain seed points are
+    given by their images (see :class:`AtomSubgrid`) and `domain_indices`
+    contains the domain index of each domain image. The grid uses the label
+    type of `domain_grid` or `dtype` if no domain grid is given. If an
+    :class:`AtomSubgrid` is given as `subgrid`, its atoms are used (instead
+    of `atom_images`) and its domain seed points are replaced.
+    """
+    if domain_grid is not None:
+        dtype = domain_grid.dtype
+    elif dtype is None:
+        dtype = np.int64
+
+    if subgrid is None:
+        # steps 1 and 2
+        subgrid = AtomSubgrid(sg_cube_size, grid_dimensions, atom_images)
+        owns_subgrid = True
+    else:
+        owns_subgrid = False
+    try:
+        # step 3
+        subgrid.set_domains(domain_images, domain_indices)
+
+        grid = np.zeros(grid_dimensions, dtype=dtype)
+        # step 4 and 5
+        mark_cavities_c(grid, domain_grid, discretization_grid, subgrid.sg, use_surface_points, num_threads)
+    finally:
+        if owns_subgrid:
+            subgrid.free()
+        else:
+            subgrid.clear_domains()
 
     return grid
 
 
 def cavity_triangles(cavity_grid, cavity_indices, isolevel, step, offset, discretization_grid):
-    cavity_grid_c = cavity_grid.ctypes.data_as(POINTER(c_int64))
+    """
+    Triangulate the surface of the cavities in `cavity_indices`. Returns a
+    ``(vertices, normals, indices, surface_area)`` tuple: the indexed mesh
+    (see :func:`mesh_from_c`) and the area of the surface inside the volume.
+    """
+    cavity_grid_c = label_pointer(cavity_grid)
     dimensions_c = (c_int * 3)(*cavity_grid.shape)
     strides_c = (c_int * 3)(*[s // cavity_grid.itemsize for s in cavity_grid.strides])
 
@@ -309,11 +466,13 @@ def cavity_triangles(cavity_grid, cavity_indices, isolevel, step, offset, discre
     discretization_grid_c = discretization_grid.ctypes.data_as(POINTER(c_int8))
     discgrid_strides_c = (c_int * 3)(*[s // discretization_grid.itemsize for s in discretization_grid.strides])
 
+    nvertices_c = c_int()
     vertices_c = POINTER(c_float)()
     normals_c = POINTER(c_float)()
+    indices_c = POINTER(c_uint)()
     surface_area_c = c_float()
 
-    ntriangles = lib.cavity_triangles(
+    ntriangles = label_function("cavity_triangles", cavity_grid)(
         cavity_grid_c,
         dimensions_c,
         strides_c,
@@ -324,37 +483,207 @@ def cavity_triangles(cavity_grid, cavity_indices, isolevel, step, offset, discre
         offset_c,
         discretization_grid_c,
         discgrid_strides_c,
+        byref(nvertices_c),
         byref(vertices_c),
         byref(normals_c),
+        byref(indices_c),
         byref(surface_area_c),
     )
 
-    ArrayType = c_float * ntriangles * 3 * 3
-    vertices_p = cast(vertices_c, POINTER(ArrayType))
-    vertices = np.frombuffer(vertices_p.contents, dtype=c_float)
-    vertices = np.array(vertices, dtype=float, copy=True).reshape((ntriangles, 3, 3))
+    vertices, normals, indices = mesh_from_c(ntriangles, nvertices_c.value, vertices_c, normals_c, indices_c)
+    surface_area = surface_area_c.value
+
+    return vertices, normals, indices, surface_area
+
+
+def cavity_triangles_multi(cavity_grid, cavity_groups, isolevel, step, offset, discretization_grid, num_threads=None):
+    """
+    Triangulate each group of cavity indices in `cavity_groups` (e.g. all
+    domains or all multicavities) with a single call. Returns a list that
+    contains a ``(vertices, normals, indices, surface_area)`` tuple for each
+    group, like :func:`cavity_triangles`.
+    """
+    ngroups = len(cavity_groups)
+    ntriangles_c = (c_int * ngroups)()
+    nvertices_c = (c_int * ngroups)()
+    vertices_c = (POINTER(c_float) * ngroups)()
+    normals_c = (POINTER(c_float) * ngroups)()
+    indices_c = (POINTER(c_uint) * ngroups)()
+    surface_areas_c = _cavity_triangles_multi(
+        cavity_grid,
+        cavity_groups,
+        isolevel,
+        step,
+        offset,
+        discretization_grid,
+        num_threads,
+        ntriangles_c,
+        nvertices_c,
+        vertices_c,
+        normals_c,
+        indices_c,
+    )
+
+    return [
+        mesh_from_c(ntriangles_c[i], nvertices_c[i], vertices_c[i], normals_c[i], indices_c[i]) + (surface_areas_c[i],)
+        for i in range(ngroups)
+    ]
+
+
+def cavity_surface_areas_multi(
+    cavity_grid, cavity_groups, isolevel, step, offset, discretization_grid, num_threads=None
+):
+    """
+    Calculate the surface area of each group of cavity indices in
+    `cavity_groups` like :func:`cavity_triangles_multi`, but without storing
+    the triangles. Returns a list of surface areas.
+    """
+    ntriangles_c = (c_int * len(cavity_groups))()
+    surface_areas_c = _cavity_triangles_multi(
+        cavity_grid,
+        cavity_groups,
+        isolevel,
+        step,
+        offset,
+        discretization_grid,
+        num_threads,
+        ntriangles_c,
+        None,
+        None,
+        None,
+        None,
+    )
+    return list(surface_areas_c)
+
+
+def _cavity_triangles_multi(
+    cavity_grid,
+    cavity_groups,
+    isolevel,
+    step,
+    offset,
+    discretization_grid,
+    num_threads,
+    ntriangles_c,
+    nvertices_c,
+    vertices_c,
+    normals_c,
+    indices_c,
+):
+    cavity_grid_c = label_pointer(cavity_grid)
+    dimensions_c = (c_int * 3)(*cavity_grid.shape)
+    strides_c = (c_int * 3)(*[s // cavity_grid.itemsize for s in cavity_grid.strides])
+
+    ngroups = len(cavity_groups)
+    cavity_to_group = group_indices(cavity_groups)
+    ncavities = len(cavity_to_group)
+    cavity_to_group_c = cavity_to_group.ctypes.data_as(POINTER(c_int))
+
+    isolevel_c = c_int(isolevel)
+    step_c = (c_float * 3)(*step)
+    offset_c = (c_float * 3)(*offset)
+
+    discretization_grid_c = discretization_grid.ctypes.data_as(POINTER(c_int8))
+    discgrid_strides_c = (c_int * 3)(*[s // discretization_grid.itemsize for s in discretization_grid.strides])
+
+    surface_areas_c = (c_float * ngroups)()
+
+    label_function("cavity_triangles_multi", cavity_grid)(
+        cavity_grid_c,
+        dimensions_c,
+        strides_c,
+        c_int(ncavities),
+        cavity_to_group_c,
+        c_int(ngroups),
+        isolevel_c,
+        step_c,
+        offset_c,
+        discretization_grid_c,
+        discgrid_strides_c,
+        _threads(num_threads),
+        ntriangles_c,
+        nvertices_c,
+        vertices_c,
+        normals_c,
+        indices_c,
+        surface_areas_c,
+    )
+    return surface_areas_c
+
+
+def group_indices(cavity_groups):
+    """
+    Returns an array that maps each cavity index to the index of its group in
+    `cavity_groups` (or -1 for cavities without a group).
+    """
+    ncavities = max((max(group) + 1 for group in cavity_groups if len(group) > 0), default=0)
+    cavity_to_group = np.full(ncavities, -1, dtype=int_type)
+    for group_index, group in enumerate(cavity_groups):
+        cavity_to_group[list(group)] = group_index
+    return cavity_to_group
+
+
+def mesh_from_c(ntriangles, nvertices, vertices_c, normals_c, indices_c):
+    """
+    Copy an indexed mesh allocated by the C extension into numpy arrays and
+    free it. Returns a ``(vertices, normals, indices)`` tuple with the
+    ``float32`` vertices and normals of shape ``(nvertices, 3)`` and the
+    ``uint32`` vertex indices of the triangles with shape ``(ntriangles, 3)``.
+    Each vertex is shared by all triangles that use it with the same normal.
+    """
+    vertices = _array_from_c(vertices_c, nvertices * 3, np.float32).reshape((nvertices, 3))
+    normals = _array_from_c(normals_c, nvertices * 3, np.float32).reshape((nvertices, 3))
+    indices = _array_from_c(indices_c, ntriangles * 3, np.uint32).reshape((ntriangles, 3))
     lib.free_float_p(vertices_c)
-    normals_p = cast(normals_c, POINTER(ArrayType))
-    normals = np.frombuffer(normals_p.contents, dtype=c_float)
-    normals = np.array(normals, dtype=float, copy=True).reshape((ntriangles, 3, 3))
     lib.free_float_p(normals_c)
-    surface_area = surface_area_c.value
+    lib.free_uint_p(indices_c)
+    return vertices, normals, indices
 
-    return vertices, normals, surface_area
 
+def _array_from_c(array_c, size, dtype):
+    if size == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.ctypeslib.as_array(array_c, shape=(size,)).copy()
 
-def cavity_intersections(grid, num_domains):
+
+def cavity_intersection_pairs(grid):
+    """
+    Returns all pairs of different labels that touch each other in `grid` as
+    an array of shape ``(n, 2)``. Each pair is stored once as
+    ``(smaller label, larger label)``.
+    """
     dimensions_c = (c_int * 3)(*grid.shape)
     strides_c = (c_int * 3)(*[s // grid.itemsize for s in grid.strides])
-    grid_c = grid.ctypes.data_as(POINTER(c_int64))
+    grid_c = label_pointer(grid)
+
+    pairs_c = POINTER(c_int)()
+    npairs_c = c_int()
 
-    num_domains_c = c_int(num_domains)
-    intersection_table = np.zeros((num_domains, num_domains), dtype=np.int8)
-    intersection_table_c = intersection_table.ctypes.data_as(POINTER(c_int8))
+    label_function("cavity_intersection_pairs", grid)(grid_c, dimensions_c, strides_c, byref(pairs_c), byref(npairs_c))
 
-    lib.cavity_intersections(grid_c, dimensions_c, strides_c, num_domains_c, intersection_table_c)
+    npairs = npairs_c.value
+    if npairs > 0:
+        pairs = np.ctypeslib.as_array(pairs_c, shape=(npairs, 2))
+        pairs = np.unique(pairs, axis=0)
+    else:
+        pairs = np.zeros((0, 2), dtype=int_type)
+    lib.free_int_p(pairs_c)
 
-    return intersection_table
+    return pairs
+
+
+def label_statistics(grid, num_labels):
+    dimensions_c = (c_int * 3)(*grid.shape)
+    strides_c = (c_int * 3)(*[s // grid.itemsize for s in grid.strides])
+    grid_c = label_pointer(grid)
+
+    num_labels_c = c_int(num_labels)
+    counts = np.zeros(num_labels, dtype=np.int64)
+    counts_c = counts.ctypes.data_as(POINTER(c_int64))
+
+    label_function("label_statistics", grid)(grid_c, dimensions_c, strides_c, num_labels_c, counts_c)
+
+    return counts
 
 
 def mark_translation_vectors(grid, translation_vectors):
@@ -367,3 +696,18 @@ def mark_translation_vectors(grid, translation_vectors):
     translation_vectors_c = translation_vectors.ctypes.data_as(POINTER(c_int))
 
     lib.mark_translation_vectors(grid_c, dimensions_c, strides_c, ntranslations_c, translation_vectors_c)
+
+
+def distance_transform(grid, num_threads=None):
+    """
+    Replace the values of an int32 grid, in which all seed cells are 0 and
+    all other cells are ``numpy.iinfo(numpy.int32).max``, with the squared
+    distance (in cells) to the nearest seed.
+    """
+    if grid.dtype != np.int32:
+        raise TypeError("Unsupported distance grid type: {}".format(grid.dtype))
+    dimensions_c = (c_int * 3)(*grid.shape)
+    strides_c = (c_int * 3)(*[s // grid.itemsize for s in grid.strides])
+    grid_c = grid.ctypes.data_as(POINTER(c_int32))
+
+    lib.distance_transform(grid_c, dimensions_c, strides_c, _threads(num_threads))
@@ -0,0 +1,185 @@
+"""
+Wrappers for the native ``_algorithm`` module. It calls the kernels of the
+ctypes library, but accesses numpy arrays through the buffer protocol
+(without copying contiguous arrays of the right type), checks their types once
+in C and releases the GIL while a kernel runs. The functions and
+:class:`AtomSubgrid` have the same signatures as the ones in
+:mod:`extension_ctypes` and replace them if the module is available.
+"""
+
+__all__ = [
+    "AtomSubgrid",
+    "atomstogrid",
+    "mark_cavities",
+    "cavity_triangles_multi",
+    "cavity_surface_areas_multi",
+    "cavity_intersection_pairs",
+    "mark_translation_vectors",
+]
+
+
+import numpy as np
+
+from . import _algorithm, extension_ctypes
+from .extension_ctypes import int_type
+
+
+def _threads(n):
+    return extension_ctypes.num_threads if n is None else n
+
+
+def _int_array(values, columns=1):
+    return np.ascontiguousarray(values, dtype=int_type).reshape((-1, columns))
+
+
+class AtomSubgrid(object):
+    """
+    Like :class:`extension_ctypes.AtomSubgrid`, but the subgrid is created
+    and freed by the native module, which also runs :func:`mark_cavities`.
+    """
+
+    def __init__(self, cubesize, grid_dimensions, atom_images):
+        self.cubesize = cubesize
+        self.grid_dimensions = tuple(grid_dimensions)
+        self.sg = _algorithm.Subgrid(cubesize, self.grid_dimensions, _int_array(atom_images, 3))
+
+    def set_domains(self, domain_images, domain_indices):
+        self.sg.set_domains(_int_array(domain_indices), _int_array(domain_images, 3))
+
+    def clear_domains(self):
+        self.sg.clear_domains()
+
+    def free(self):
+        self.sg.free()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.free()
+
+
+def atomstogrid(
+    grid,
+    halo,
+    radii_indices,
+    discrete_radii,
+    discretization_grid,
+    num_threads=None,
+):
+    _algorithm.atomstogrid(
+        grid,
+        _int_array(halo.offsets),
+        _int_array(halo.images, 3),
+        _int_array(radii_indices),
+        _int_array(discrete_radii),
+        discretization_grid,
+        _threads(num_threads),
+    )
+
+
+def mark_cavities(
+    domain_grid,
+    discretization_grid,
+    grid_dimensions,
+    sg_cube_size,
+    atom_images,
+    domain_images,
+    domain_indices,
+    use_surface_points,
+    dtype=None,
+    subgrid=None,
+    num_threads=None,
+):
+    """
+    Like :func:`extension_ctypes.mark_cavities`. A `subgrid` must be an
+    :class:`AtomSubgrid` of this module.
+    """
+    if domain_grid is not None:
+        dtype = domain_grid.dtype
+    elif dtype is None:
+        dtype = np.int64
+
+    if subgrid is None:
+        subgrid = AtomSubgrid(sg_cube_size, grid_dimensions, atom_images)
+        owns_subgrid = True
+    else:
+        owns_subgrid = False
+    try:
+        subgrid.set_domains(domain_images, domain_indices)
+
+        grid = np.zeros(grid_dimensions, dtype=dtype)
+        _algorithm.mark_cavities(
+            grid,
+            domain_grid,
+            discretization_grid,
+            subgrid.sg,
+            bool(use_surface_points),
+            _threads(num_threads),
+        )
+    finally:
+        if owns_subgrid:
+            subgrid.free()
+        else:
+            subgrid.clear_domains()
+
+    return grid
+
+
+def cavity_triangles_multi(cavity_grid, cavity_groups, isolevel, step, offset, discretization_grid, num_threads=None):
+    """
+    Like :func:`extension_ctypes.cavity_triangles_multi`.
+    """
+    meshes = _algorithm.cavity_triangles_multi(
+        cavity_grid,
+        extension_ctypes.group_indices(cavity_groups),
+        len(cavity_groups),
+        isolevel,
+        tuple(step),
+        tuple(offset),
+        discretization_grid,
+        True,
+        _threads(num_threads),
+    )
+    return [
+        (
+            np.frombuffer(vertices, dtype=np.float32).reshape((-1, 3)),
+            np.frombuffer(normals, dtype=np.float32).reshape((-1, 3)),
+            np.frombuffer(indices, dtype=np.uint32).reshape((-1, 3)),
+            surface_area,
+        )
+        for vertices, normals, indices, surface_area in meshes
+    ]
+
+
+def cavity_surface_areas_multi(
+    cavity_grid, cavity_groups, isolevel, step, offset, discretization_grid, num_threads=None
+):
+    """
+    Like :func:`extension_ctypes.cavity_surface_areas_multi`.
+    """
+    return _algorithm.cavity_triangles_multi(
+        cavity_grid,
+        extension_ctypes.group_indices(cavity_groups),
+        len(cavity_groups),
+        isolevel,
+        tuple(step),
+        tuple(offset),
+        discretization_grid,
+        False,
+        _threads(num_threads),
+    )
+
+
+def cavity_intersection_pairs(grid):
+    """
+    Like :func:`extension_ctypes.cavity_intersection_pairs`.
+    """
+    pairs = np.frombuffer(_algorithm.cavity_intersection_pairs(grid), dtype=int_type).reshape((-1, 2))
+    if len(pairs) > 0:
+        return np.unique(pairs, axis=0)
+    return np.zeros((0, 2), dtype=int_type)
+
+
+def mark_translation_vectors(grid, translation_vectors):
+    _algorithm.mark_translation_vectors(grid, _int_array(translation_vectors, 3))
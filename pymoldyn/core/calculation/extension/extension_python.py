@@ -1,8 +1,19 @@
-__all__ = ["atomstogrid", "mark_cavities", "cavity_triangles", "cavity_intersections"]
+__all__ = [
+    "AtomSubgrid",
+    "atomstogrid",
+    "mark_cavities",
+    "cavity_triangles",
+    "cavity_triangles_multi",
+    "cavity_surface_areas_multi",
+    "cavity_intersection_pairs",
+    "label_statistics",
+    "distance_transform",
+    "get_num_threads",
+    "set_num_threads",
+]
 
 
 import itertools
-import sys
 from math import ceil
 
 import numpy as np
@@ -11,87 +22,197 @@ from gr3 import triangulate
 dimension = 3
 dimensions = range(dimension)
 
+# the Python functions are not parallelized, the number of threads is only stored
+num_threads = 0
+
+
+def set_num_threads(n):
+    global num_threads
+    num_threads = max(0, int(n))
+
+
+def get_num_threads():
+    return num_threads
+
+
+# upper limit for the number of cell/point pairs that are processed at once
+chunk_size = 1 << 21
+
 
 def atomstogrid(
     grid,
-    discrete_positions,
+    halo,
     radii_indices,
     discrete_radii,
-    translation_vectors,
     discretization_grid,
+    num_threads=None,
 ):
-    last_radius_index = -1  # (for reuse of sphere grids)
-    atom_information = zip(range(len(discrete_positions)), radii_indices, discrete_positions)
-    for atom_index, radius_index, real_discrete_position in atom_information:
-        discrete_radius = discrete_radii[radius_index]
+    """
+    Like the C extension: each cell inside of the volume and inside of the
+    sphere around an atom image gets the index (+1) of the closest atom,
+    ties are broken by the atom index. The cells of the spheres are
+    collected as flat indices into a grid padded by twice the maximum radius
+    (so no bounds checks are needed) and the closest atom of each cell is found
+    by a scatter minimum of keys that combine the squared distance and the
+    atom index. Atoms already stored in the grid are only replaced by closer
+    ones.
+    """
+    image_offsets = np.asarray(halo.offsets, dtype=np.int64)
+    images = np.asarray(halo.images, dtype=np.int64).reshape((-1, 3))
+    radii_indices = np.asarray(radii_indices, dtype=np.int64)
+    natoms = len(image_offsets) - 1
+    if natoms == 0:
+        return
+    image_atoms = np.repeat(np.arange(natoms), np.diff(image_offsets))
+    image_radii = np.asarray(discrete_radii, dtype=np.int64)[radii_indices[image_atoms]]
+    # images whose sphere does not touch the grid are skipped
+    visible = np.all(
+        (images + image_radii[:, np.newaxis] >= 0) & (images - image_radii[:, np.newaxis] < grid.shape), axis=1
+    )
+    images = images[visible]
+    image_atoms = image_atoms[visible]
+    image_radii = image_radii[visible]
+    if len(images) == 0:
+        return
+
+    # the visible images are at most one radius away from the grid
+    margin = 2 * int(image_radii.max())
+    padded_shape = tuple(n + 2 * margin for n in grid.shape)
+    inner = tuple(slice(margin, margin + n) for n in grid.shape)
+    padded_strides = np.array([padded_shape[1] * padded_shape[2], padded_shape[2], 1])
+    fillable = np.zeros(padded_shape, dtype=bool)
+    fillable[inner] = discretization_grid == 0
+    fillable = fillable.ravel()
+    no_key = np.iinfo(np.int64).max
+    keys = np.full(fillable.size, no_key, dtype=np.int64)
+
+    for discrete_radius in np.unique(image_radii):
         cube_size = 2 * discrete_radius + 1
-        if radius_index != last_radius_index:
-            last_radius_index = radius_index
-            cube_indices = np.indices([cube_size] * 3).transpose(1, 2, 3, 0) - discrete_radius
-            sphere_grid = np.sum(cube_indices**2, axis=3) <= discrete_radius**2
-            last_radius_index = radius_index
-        for v in translation_vectors:
-            discrete_position = [real_discrete_position[i] + v[i] for i in dimensions]
-            for point in itertools.product(range(discrete_radius * 2 + 1), repeat=dimension):
-                if sphere_grid[point]:
-                    p = [point[i] - discrete_radius + discrete_position[i] for i in dimensions]
-                    if all([0 <= p[i] <= grid.shape[i] - 1 for i in dimensions]):
-                        discretization_grid_value = discretization_grid[tuple(p)]
-                        if discretization_grid_value == 0:
-                            grid_value = grid[tuple(p)]
-                            # check if the atom is the closest one
-                            if grid_value == 0:
-                                grid[tuple(p)] = atom_index + 1
-                            else:
-                                this_squared_distance = sum([(x - y) ** 2 for x, y in zip(discrete_position, p)])
-                                other_position = discrete_positions[grid_value - 1]
-                                for v2 in translation_vectors:
-                                    other_discrete_position = [other_position[i] + v2[i] for i in dimensions]
-                                    other_squared_distance = sum(
-                                        [(x - y) ** 2 for x, y in zip(other_discrete_position, p)]
-                                    )
-                                    if other_squared_distance <= this_squared_distance:
-                                        break
-                                if this_squared_distance < other_squared_distance:
-                                    grid[tuple(p)] = atom_index + 1
+        stencil = np.indices([cube_size] * dimension).reshape((dimension, -1)).T - discrete_radius
+        squared_distances = np.sum(stencil**2, axis=1)
+        inside_sphere = squared_distances <= discrete_radius**2
+        stencil_offsets = np.dot(stencil[inside_sphere], padded_strides)
+        stencil_keys = squared_distances[inside_sphere] * natoms
+        radius_images = np.flatnonzero(image_radii == discrete_radius)
+        images_per_chunk = max(1, chunk_size // len(stencil_offsets))
+        for start in range(0, len(radius_images), images_per_chunk):
+            chunk_images = radius_images[start : start + images_per_chunk]
+            cells = (np.dot(images[chunk_images] + margin, padded_strides)[:, np.newaxis] + stencil_offsets).ravel()
+            candidate_keys = (image_atoms[chunk_images][:, np.newaxis] + stencil_keys).ravel()
+            valid = fillable[cells]
+            np.minimum.at(keys, cells[valid], candidate_keys[valid])
+
+    keys = keys.reshape(padded_shape)[inner]
+    cells = np.nonzero(keys != no_key)
+    keys = keys[cells]
+    # the key of an atom already stored in a cell uses its closest image
+    stored_atoms = grid[cells].astype(np.int64) - 1
+    stored = np.flatnonzero(stored_atoms >= 0)
+    if len(stored) > 0:
+        stored_atoms = stored_atoms[stored]
+        stored_positions = np.stack([c[stored] for c in cells], axis=1)
+        image_counts = np.diff(image_offsets)[stored_atoms]
+        stored_squared_distances = np.full(len(stored), no_key // natoms - 1, dtype=np.int64)
+        all_images = np.asarray(halo.images, dtype=np.int64).reshape((-1, 3))
+        for k in range(image_counts.max(initial=0)):
+            has_image = image_counts > k
+            image_positions = all_images[image_offsets[stored_atoms[has_image]] + k]
+            stored_squared_distances[has_image] = np.minimum(
+                stored_squared_distances[has_image],
+                np.sum((image_positions - stored_positions[has_image]) ** 2, axis=1),
+            )
+        keys[stored] = np.minimum(keys[stored], stored_squared_distances * natoms + stored_atoms)
+    grid[cells] = keys % natoms + 1
 
 
 class Subgrid(object):
+    """
+    Subgrid of cubes with `cubesize` cells per side and a border of two
+    cubes, like the C extension. The atom images and the domain seed points
+    are sorted by their cube (stable, so the points of each cube keep their
+    order): the points of cube ``c`` are ``points[offsets[c]:offsets[c + 1]]``.
+    """
+
     def __init__(self, cubesize, grid_dimensions):
         self.cubesize = cubesize
         self.sgd = tuple([2 + int(ceil(1.0 * d / cubesize)) + 2 for d in grid_dimensions])
-        self.sg = []
-        for x in range(self.sgd[0]):
-            self.sg.append([])
-            for y in range(self.sgd[1]):
-                self.sg[x].append([])
-                for z in range(self.sgd[2]):
-                    self.sg[x][y].append([[], [], []])  # SEG fault was here
-
-    def add_atoms(self, atom_positions, translation_vectors):
-        for atom_index, atom_position in enumerate(atom_positions):
-            for v in translation_vectors:
-                real_atom_position = [atom_position[i] + v[i] for i in dimensions]
-                sgp = self.to_subgrid(real_atom_position)
-                self.sg[sgp[0]][sgp[1]][sgp[2]][0].append(real_atom_position)
-
-    def add_domains(self, domain_point_list, translation_vectors):
-        for domain_index, domain_seed_points in enumerate(domain_point_list):
-            for domain_seed_point in domain_seed_points:
-                for v in translation_vectors:
-                    real_domain_seed_point = [domain_seed_point[i] + v[i] for i in dimensions]
-                    sgp = self.to_subgrid(real_domain_seed_point)
-                    self.sg[sgp[0]][sgp[1]][sgp[2]][1].append(real_domain_seed_point)
-                    self.sg[sgp[0]][sgp[1]][sgp[2]][2].append(domain_index)
-
-    def to_subgrid(self, position):
-        sgp = [c // self.cubesize + 2 for c in position]
-        for i in dimensions:
-            if sgp[i] < 0:
-                sgp[i] = 0
-            if sgp[i] >= self.sgd[i]:
-                sgp[i] = self.sgd[i] - 1
-        return tuple(sgp)
+        self.ncubes = int(np.prod(self.sgd))
+        self.atom_offsets, self.atom_positions = self._pack(np.zeros((0, 3), dtype=np.int32))
+        self.clear_domains()
+
+    def add_atoms(self, atom_images):
+        self.atom_offsets, self.atom_positions = self._pack(
+            np.concatenate((self.atom_positions, np.reshape(atom_images, (-1, 3))))
+        )
+
+    def add_domains(self, domain_images, domain_indices):
+        self.domain_offsets, self.domain_points, self.domain_indices = self._pack(
+            np.concatenate((self.domain_points, np.reshape(domain_images, (-1, 3)))),
+            np.concatenate((self.domain_indices, np.ravel(domain_indices))),
+        )
+
+    def clear_domains(self):
+        self.domain_offsets, self.domain_points, self.domain_indices = self._pack(
+            np.zeros((0, 3), dtype=np.int32), np.zeros(0, dtype=np.int64)
+        )
+
+    def to_subgrid(self, positions):
+        """
+        Returns the flat cube indices of an array of positions. Positions
+        outside of the subgrid belong to its outermost cubes.
+        """
+        cubes = np.floor_divide(positions, self.cubesize) + 2
+        return np.ravel_multi_index(tuple(np.clip(cubes, 0, np.array(self.sgd) - 1).T), self.sgd)
+
+    def neighbor_pairs(self, offsets, cubes):
+        """
+        Returns the pairs of positions (given by their cubes) and points in
+        the 27 cubes around them: the number of pairs of each position and
+        the point index of each pair. The pairs are sorted by position, then
+        by the neighbor cube and then by the order of the points in a cube.
+        """
+        neighbors = np.ravel_multi_index(
+            tuple(np.array(list(itertools.product((-1, 0, 1), repeat=dimension))).T + 2), self.sgd
+        ) - np.ravel_multi_index((2, 2, 2), self.sgd)
+        neighbor_cubes = (cubes[:, np.newaxis] + neighbors).ravel()
+        starts = offsets[neighbor_cubes]
+        counts = offsets[neighbor_cubes + 1] - starts
+        pair_starts = np.cumsum(counts) - counts
+        pair_points = np.arange(counts.sum()) + np.repeat(starts - pair_starts, counts)
+        return counts.reshape((len(cubes), -1)).sum(axis=1), pair_points
+
+    def _pack(self, points, *values):
+        points = np.asarray(points, dtype=np.int32)
+        cubes = self.to_subgrid(points)
+        order = np.argsort(cubes, kind="stable")
+        offsets = np.zeros(self.ncubes + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(cubes, minlength=self.ncubes))
+        return (offsets, points[order]) + tuple(np.asarray(v, dtype=np.int64)[order] for v in values)
+
+
+class AtomSubgrid(Subgrid):
+    """
+    Subgrid with the atoms of a frame that can be used for several calls of
+    :func:`mark_cavities` (see ``extension_ctypes.AtomSubgrid``).
+    """
+
+    def __init__(self, cubesize, grid_dimensions, atom_images):
+        super().__init__(cubesize, grid_dimensions)
+        self.grid_dimensions = tuple(grid_dimensions)
+        self.add_atoms(atom_images)
+
+    def set_domains(self, domain_images, domain_indices):
+        self.clear_domains()
+        self.add_domains(domain_images, domain_indices)
+
+    def free(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.free()
 
 
 def mark_cavities(
@@ -99,68 +220,85 @@ def mark_cavities(
     discretization_grid,
     grid_dimensions,
     sg_cube_size,
-    atom_positions,
-    translation_vectors,
-    domain_point_list,
+    atom_images,
+    domain_images,
+    domain_indices,
     use_surface_points,
+    dtype=None,
+    subgrid=None,
+    num_threads=None,
 ):
+    """
+    Like the C extension: a cell is marked with the first domain seed point
+    in the neighbor cubes of its subgrid cube which is closer than all atoms
+    in these cubes. The cells are processed in chunks; for each chunk, all
+    pairs of cells and atoms or seed points are created at once.
+    """
+    if domain_grid is not None:
+        dtype = domain_grid.dtype
+    elif dtype is None:
+        dtype = np.int64
 
     # steps 1 to 3
-    sg = Subgrid(sg_cube_size, grid_dimensions)
-    sg.add_atoms(atom_positions, translation_vectors)
-    sg.add_domains(domain_point_list, translation_vectors)
+    if subgrid is None:
+        sg = AtomSubgrid(sg_cube_size, grid_dimensions, atom_images)
+    else:
+        sg = subgrid
+    sg.set_domains(domain_images, domain_indices)
 
     # step 4
-    grid = np.zeros(grid_dimensions, dtype=np.int64)
-    for p in itertools.product(*map(range, grid_dimensions)):
-        if use_surface_points:
-            grid_value = domain_grid[p]
-            if grid_value == 0:  # outside the volume
-                grid[p] = 0
-                possibly_in_cavity = False
-            elif grid_value < 0:  # cavity domain (stored as: -index-1), therefore guaranteed to be in a cavity
-                grid[p] = grid_value
-                possibly_in_cavity = False  # is already marked
-            elif grid_value > 0:  # in radius of atom (stored as: index+1), therefore possibly in a cavity
-                grid[p] = 0
-                possibly_in_cavity = True
-        else:
-            possibly_in_cavity = discretization_grid[p] == 0
-        if possibly_in_cavity:
-            # step 5
-            min_squared_atom_distance = sys.maxsize
-            sgp = sg.to_subgrid(p)
-            for i in itertools.product((-1, 0, 1), repeat=dimension):
-                sgci = [sgp[j] + i[j] for j in dimensions]
-                for atom_position in sg.sg[sgci[0]][sgci[1]][sgci[2]][0]:
-                    squared_atom_distance = sum(
-                        [(atom_position[j] - p[j]) * (atom_position[j] - p[j]) for j in dimensions]
-                    )
-                    min_squared_atom_distance = min(min_squared_atom_distance, squared_atom_distance)
-            for i in itertools.product((-1, 0, 1), repeat=dimension):
-                next = False
-                sgci = [sgp[j] + i[j] for j in dimensions]
-                for domain_index, domain_seed_point in zip(
-                    sg.sg[sgci[0]][sgci[1]][sgci[2]][2],
-                    sg.sg[sgci[0]][sgci[1]][sgci[2]][1],
-                ):
-                    squared_domain_seed_point_distance = sum(
-                        [(domain_seed_point[j] - p[j]) * (domain_seed_point[j] - p[j]) for j in dimensions]
-                    )
-                    if squared_domain_seed_point_distance < min_squared_atom_distance:
-                        grid[p] = -domain_index - 1
-                        next = True
-                        break
-                if next:
-                    break
+    grid = np.zeros(grid_dimensions, dtype=dtype)
+    if use_surface_points:
+        # cavity domains are guaranteed to be in a cavity, cells in the radius of an atom are possibly in a cavity
+        cavity_domains = domain_grid < 0
+        grid[cavity_domains] = domain_grid[cavity_domains]
+        positions = np.argwhere(domain_grid > 0)
+    else:
+        positions = np.argwhere(discretization_grid == 0)
+
+    # step 5
+    positions = positions.astype(np.int32)
+    neighbor_points = max(1, 27 * (len(sg.atom_positions) + len(sg.domain_points)) // max(1, sg.ncubes))
+    positions_per_chunk = max(1, chunk_size // neighbor_points)
+    for start in range(0, len(positions), positions_per_chunk):
+        chunk_positions = positions[start : start + positions_per_chunk]
+        cubes = sg.to_subgrid(chunk_positions)
+
+        min_squared_atom_distances = np.full(len(chunk_positions), np.iinfo(np.int32).max, dtype=np.int32)
+        pair_counts, pair_atoms = sg.neighbor_pairs(sg.atom_offsets, cubes)
+        has_atoms = pair_counts > 0
+        if np.any(has_atoms):
+            # the pairs of each position are contiguous
+            min_squared_atom_distances[has_atoms] = np.minimum.reduceat(
+                _squared_distances(chunk_positions, pair_counts, sg.atom_positions, pair_atoms),
+                (np.cumsum(pair_counts) - pair_counts)[has_atoms],
+            )
+
+        pair_counts, pair_domains = sg.neighbor_pairs(sg.domain_offsets, cubes)
+        pair_positions = np.repeat(np.arange(len(chunk_positions)), pair_counts)
+        closer = np.flatnonzero(
+            _squared_distances(chunk_positions, pair_counts, sg.domain_points, pair_domains)
+            < min_squared_atom_distances[pair_positions]
+        )
+        # the pairs are sorted by position, so the first closer seed point of each position is its first pair
+        marked_positions, first_pairs = np.unique(pair_positions[closer], return_index=True)
+        grid[tuple(chunk_positions[marked_positions].T)] = -sg.domain_indices[pair_domains[closer[first_pairs]]] - 1
     return grid
 
 
-def cavity_triangles(cavity_grid, cavity_indices, isolevel, step, offset, discretization_grid):
-    grid = np.zeros(cavity_grid.shape, dtype=bool)
+def _squared_distances(positions, pair_counts, points, pair_points):
+    # one axis at a time, as the pairs are only stored as indices
+    squared_distances = np.zeros(len(pair_points), dtype=np.int32)
+    for i in dimensions:
+        differences = points[:, i][pair_points]
+        differences -= np.repeat(positions[:, i], pair_counts)
+        differences *= differences
+        squared_distances += differences
+    return squared_distances
 
-    for cavity_index in cavity_indices:
-        grid = np.logical_or(grid, cavity_grid == -(cavity_index + 1))
+
+def cavity_triangles(cavity_grid, cavity_indices, isolevel, step, offset, discretization_grid):
+    grid = np.isin(cavity_grid, -np.asarray(list(cavity_indices), dtype=np.int64) - 1)
     views = []
     for x, y, z in itertools.product(*map(range, (3, 3, 3))):
         view = grid[
@@ -179,74 +317,194 @@ def cavity_triangles(cavity_grid, cavity_indices, isolevel, step, offset, discre
     vertices += np.tile(offset, (vertices.shape[0], 3, 1))
     normals /= np.tile(step, (normals.shape[0], 3, 1))
 
-    cavity_surface_area = 0
-    for cavity_triangle, discrete_triangle in zip(vertices, discrete_vertices):
-        any_outside = False
-        for vertex, discrete_vertex in zip(cavity_triangle, discrete_triangle):
-            if discretization_grid[tuple(discrete_vertex)] != 0:
-                any_outside = True
-                break
-        if not any_outside:
-            v1, v2, v3 = cavity_triangle
-            a = v2 - v1
-            b = v3 - v1
-            triangle_surface_area = np.linalg.norm(np.cross(a, b)) * 0.5
-            cavity_surface_area += triangle_surface_area
-
-    return vertices, normals, cavity_surface_area
-
-
-def cavity_intersections(grid, num_domains):
-    intersection_table = np.zeros((num_domains, num_domains), dtype=np.int8)
-    directions = []
-    for dx, dy, dz in itertools.product((0, 1), repeat=3):
-        if any((dx > 0, dy > 0, dz > 0)):
-            directions.append((dx, dy, dz))
-    for p in itertools.product(*[range(x - 1) for x in grid.shape]):
-        domain1 = -grid[p] - 1
-        if domain1 != -1:
-            for direction in directions:
-                p2 = tuple([p[i] + direction[i] for i in dimensions])
-                domain2 = -grid[p2] - 1
-                if domain2 != -1:
-                    intersection_table[domain1][domain2] = 1
-                    intersection_table[domain2][domain1] = 1
-    return intersection_table
+    # only triangles with all vertices inside of the volume are part of the surface area
+    inside = np.all(discretization_grid[tuple(np.moveaxis(discrete_vertices, 2, 0))] == 0, axis=1)
+    inside_vertices = vertices[inside]
+    cross = np.cross(inside_vertices[:, 1] - inside_vertices[:, 0], inside_vertices[:, 2] - inside_vertices[:, 0])
+    cavity_surface_area = np.sum(np.linalg.norm(cross, axis=1)) * 0.5
+
+    vertices, normals, indices = weld_vertices(vertices, normals)
+    return vertices, normals, indices, cavity_surface_area
+
+
+def weld_vertices(vertices, normals):
+    """
+    Turn a triangle soup into an indexed mesh like the C extension: vertices
+    with equal ``float32`` position and normal are merged, in the order of
+    their first occurrence.
+    """
+    soup = np.concatenate(
+        (
+            np.asarray(vertices, dtype=np.float32).reshape((-1, 3)),
+            np.asarray(normals, dtype=np.float32).reshape((-1, 3)),
+        ),
+        axis=1,
+    )
+    keys = np.ascontiguousarray(soup).view(np.dtype((np.void, soup.dtype.itemsize * 6))).ravel()
+    _, first_indices, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first_indices)
+    ranks = np.empty_like(order)
+    ranks[order] = np.arange(len(order))
+    welded = soup[first_indices[order]]
+    indices = ranks[inverse.ravel()].astype(np.uint32).reshape((-1, 3))
+    return welded[:, :3].copy(), welded[:, 3:].copy(), indices
+
+
+def cavity_triangles_multi(cavity_grid, cavity_groups, isolevel, step, offset, discretization_grid, num_threads=None):
+    return [
+        cavity_triangles(cavity_grid, cavity_indices, isolevel, step, offset, discretization_grid)
+        for cavity_indices in cavity_groups
+    ]
+
+
+def cavity_surface_areas_multi(
+    cavity_grid, cavity_groups, isolevel, step, offset, discretization_grid, num_threads=None
+):
+    return [
+        surface_area
+        for _, _, _, surface_area in cavity_triangles_multi(
+            cavity_grid, cavity_groups, isolevel, step, offset, discretization_grid
+        )
+    ]
+
+
+def cavity_intersection_pairs(grid):
+    pairs = []
+    inner = tuple(slice(1, d - 1) for d in grid.shape)
+    labels = -grid[inner] - 1
+    for direction in itertools.product((-1, 0, 1), repeat=3):
+        # like the C extension, only look at the 13 neighbors that precede a cell
+        if direction >= (0, 0, 0):
+            continue
+        neighbor_view = tuple(slice(1 + direction[i], grid.shape[i] - 1 + direction[i]) for i in dimensions)
+        neighbor_labels = -grid[neighbor_view] - 1
+        touching = (labels != -1) & (neighbor_labels != -1) & (labels != neighbor_labels)
+        pairs.append(
+            np.stack(
+                (
+                    np.minimum(labels[touching], neighbor_labels[touching]),
+                    np.maximum(labels[touching], neighbor_labels[touching]),
+                ),
+                axis=1,
+            )
+        )
+    return np.unique(np.concatenate(pairs), axis=0)
+
+
+def label_statistics(grid, num_labels):
+    labels = -grid[grid < 0].astype(np.int64) - 1
+    return np.bincount(labels[labels < num_labels], minlength=num_labels).astype(np.int64)
 
 
 def mark_translation_vectors(grid, translation_vectors):
-    # step 5
-    for p in itertools.product(*map(range, grid.shape)):
-        equivalent_points = [[p[i] + v[i] for i in dimensions] for v in translation_vectors]
-        valid_equivalent_points = [
-            tuple(point) for point in equivalent_points if all([0 <= point[i] <= grid.shape[i] - 1 for i in dimensions])
-        ]
-        if grid[p] == 0:
-            equivalent_points_inside = [point for point in valid_equivalent_points if grid[point] == 0]
-            for point in equivalent_points_inside:
-                grid[point] = 1
-    # step 6 & 7
-    for p in itertools.product(*map(range, grid.shape)):
-        equivalent_points = [([p[i] + v[i] for i in dimensions], vi) for vi, v in enumerate(translation_vectors)]
-        valid_equivalent_points = [
-            (tuple(point), vi)
-            for point, vi in equivalent_points
-            if all([0 <= point[i] <= grid.shape[i] - 1 for i in dimensions])
-        ]
-        if grid[p] == 1:
-            equivalent_points_inside = [(point, vi) for point, vi in valid_equivalent_points if grid[point] == 0]
-            if not equivalent_points_inside:
-                nearest_to_center = p
-                nearest_to_center_index = -1  # -1 -> -(-1+1) == 0
-                min_d_center = sum([(p[i] - grid.shape[i] / 2) * (p[i] - grid.shape[i] / 2) for i in dimensions])
-                for p2, vi in valid_equivalent_points:
-                    d_center = sum([(p2[i] - grid.shape[i] / 2) * (p2[i] - grid.shape[i] / 2) for i in dimensions])
-                    if d_center < min_d_center:
-                        min_d_center = d_center
-                        nearest_to_center = p2
-                        nearest_to_center_index = vi
-                grid[nearest_to_center] = 0
-                grid[p] = -(nearest_to_center_index + 1)
-            else:
-                translation_vector_index = equivalent_points_inside[0][1]
-                grid[p] = -(translation_vector_index + 1)
+    """
+    Like the C extension, which processes the cells sequentially in C order.
+    The dependencies between cells only exist along the translation vectors,
+    so most cells are processed at once for all cells with shifted views of
+    the grid.
+    """
+    translation_vectors = [tuple(int(c) for c in v) for v in translation_vectors]
+
+    # step 5: a cell inside of the volume which has not been marked by a previous cell marks all its equivalent
+    # cells. The cells that stay inside of the volume are found in rounds: a cell is decided as soon as all previous
+    # cells which could mark it are decided.
+    undecided = grid == 0
+    kept = np.zeros(grid.shape, dtype=bool)
+    # p - v precedes p in C order if v is lexicographically positive
+    previous_vectors = [tuple(-c for c in v) for v in translation_vectors if v > (0, 0, 0)]
+    while np.any(undecided):
+        has_kept_previous = np.zeros(grid.shape, dtype=bool)
+        for v in previous_vectors:
+            has_kept_previous[_shifted_view(grid.shape, v, 0)] |= kept[_shifted_view(grid.shape, v, 1)]
+        undecided &= ~has_kept_previous
+        has_undecided_previous = np.zeros(grid.shape, dtype=bool)
+        for v in previous_vectors:
+            has_undecided_previous[_shifted_view(grid.shape, v, 0)] |= undecided[_shifted_view(grid.shape, v, 1)]
+        newly_kept = undecided & ~has_undecided_previous
+        kept |= newly_kept
+        undecided &= ~newly_kept
+    for v in translation_vectors:
+        grid[_shifted_view(grid.shape, v, 1)][kept[_shifted_view(grid.shape, v, 0)]] = 1
+
+    # step 6: each marked cell stores the index of the first translation vector that leads to a cell inside of the
+    # volume (-1 if there is none)
+    first_vectors = np.full(grid.shape, -1, dtype=np.int64)
+    for vi in reversed(range(len(translation_vectors))):
+        view = _shifted_view(grid.shape, translation_vectors[vi], 0)
+        first_vectors[view][grid[_shifted_view(grid.shape, translation_vectors[vi], 1)] == 0] = vi
+    marked = grid == 1
+
+    # step 7: marked cells without an equivalent inside of the volume select their equivalent that is closest to
+    # the center (or themselves). As this creates new cells inside of the volume, which change the first translation
+    # vector of the following cells, these cells are processed sequentially, but their choice is calculated at once.
+    vectors = np.array(translation_vectors, dtype=np.int64).reshape((-1, dimension))
+    vector_offsets = np.dot(vectors, np.array(first_vectors.strides) // first_vectors.itemsize)
+    candidates = np.flatnonzero(marked & (first_vectors == -1))
+    positions = np.stack(np.unravel_index(candidates, grid.shape), axis=1)
+    center = np.array(grid.shape) // 2
+    equivalents = positions[:, np.newaxis, :] + vectors
+    center_distances = np.where(
+        np.all((equivalents >= 0) & (equivalents < grid.shape), axis=2),
+        np.sum((equivalents - center) ** 2, axis=2),
+        np.iinfo(np.int64).max,
+    )
+    nearest_indices = np.argmin(center_distances, axis=1) if len(vectors) > 0 else np.zeros(len(candidates), int)
+    moves = center_distances[np.arange(len(candidates)), nearest_indices] < np.sum((positions - center) ** 2, axis=1)
+    nearest_indices = np.where(moves, nearest_indices, -1)  # -1 -> -(-1+1) == 0
+    nearest_positions = np.where(
+        moves[:, np.newaxis], equivalents[np.arange(len(candidates)), nearest_indices], positions
+    )
+    marked_cells = marked.reshape(-1)
+    first_cells = first_vectors.reshape(-1)
+    for flat_index, p, nearest_to_center, nearest_to_center_index in zip(
+        candidates, positions, nearest_positions, nearest_indices
+    ):
+        if not marked_cells[flat_index] or first_cells[flat_index] != -1:
+            continue
+        grid[tuple(nearest_to_center)] = 0
+        grid[tuple(p)] = -(nearest_to_center_index + 1)
+        new_inside = np.ravel_multi_index(tuple(nearest_to_center), grid.shape)
+        marked_cells[new_inside] = False
+        marked_cells[flat_index] = False
+        # the new cell inside of the volume can be the first equivalent of following marked cells
+        following = nearest_to_center - vectors
+        following = np.flatnonzero(np.all((following >= 0) & (following < grid.shape), axis=1))
+        following_cells = new_inside - vector_offsets[following]
+        following = following[following_cells > flat_index]
+        following_cells = following_cells[following_cells > flat_index]
+        first_cells[following_cells] = np.where(
+            (first_cells[following_cells] == -1) | (following < first_cells[following_cells]),
+            following,
+            first_cells[following_cells],
+        )
+    grid[marked] = -(first_vectors[marked] + 1)
+
+
+def _shifted_view(shape, vector, shifted):
+    """
+    Returns the slices of the cells p with a valid p + `vector` (if `shifted`
+    is false) or of these p + `vector` (if `shifted` is true).
+    """
+    view = []
+    for n, c in zip(shape, vector):
+        begin = min(max(0, -c), n)
+        end = max(n - max(0, c), begin)
+        if shifted:
+            begin, end = begin + c, end + c
+        view.append(slice(begin, end))
+    return tuple(view)
+
+
+def distance_transform(grid, num_threads=None):
+    # separable transform: along each axis, every cell takes the minimum of all values of its line plus the squared
+    # distance to them
+    infinity = np.iinfo(np.int32).max
+    distances = np.where(grid == infinity, np.inf, grid.astype(np.float64))
+    for axis in dimensions:
+        lines = np.moveaxis(distances, axis, -1)
+        n = lines.shape[-1]
+        transformed = np.empty_like(lines)
+        for q in range(n):
+            transformed[..., q] = np.min(lines + (np.arange(n) - q) ** 2, axis=-1)
+        distances = np.moveaxis(transformed, -1, axis)
+    grid[...] = np.where(np.isinf(distances), infinity, np.minimum(distances, infinity)).astype(np.int32)
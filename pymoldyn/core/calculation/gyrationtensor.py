@@ -24,6 +24,83 @@ def calculate_gyration_tensor_parameters(points):
     # cell volume is constant, cavity volume is proportional to len(points)
     gyration_tensor /= len(points)
 
+    return (mean,) + gyration_tensor_parameters(gyration_tensor)
+
+
+def calculate_box_gyration_tensor_parameters(boxes):
+    """
+    Calculates the same parameters as calculate_gyration_tensor_parameters for
+    all cells of a cavity that is given as an array of boxes with the rows
+    (x, y, z, width, height, depth). The moments of the cells in a box have a
+    closed form, so no cell positions are generated.
+    """
+
+    boxes = np.asarray(boxes, dtype=np.float64).reshape((-1, 6))
+    # coordinates relative to the first box keep the moments small
+    origin = boxes[0, :3]
+    starts = boxes[:, :3] - origin
+    sizes = boxes[:, 3:]
+    # sums of the coordinates (and their squares) of one row of cells along each axis
+    sums = sizes * starts + 0.5 * sizes * (sizes - 1)
+    square_sums = sizes * starts**2 + starts * sizes * (sizes - 1) + (sizes - 1) * sizes * (2 * sizes - 1) / 6
+    volumes = np.prod(sizes, axis=1)
+    num_points = np.sum(volumes)
+
+    mean = np.sum(sums * (volumes[:, np.newaxis] / sizes), axis=0) / num_points
+    gyration_tensor = np.zeros((3, 3))
+    for i in range(3):
+        for j in range(i, 3):
+            if i == j:
+                moment = np.sum(square_sums[:, i] * volumes / sizes[:, i])
+            else:
+                moment = np.sum(sums[:, i] * sums[:, j] * volumes / (sizes[:, i] * sizes[:, j]))
+            gyration_tensor[i, j] = moment / num_points - mean[i] * mean[j]
+            gyration_tensor[j, i] = gyration_tensor[i, j]
+
+    return (mean + origin,) + gyration_tensor_parameters(gyration_tensor)
+
+
+def calculate_cell_gyration_tensor_parameters(cells, cell_cavities, num_cavities):
+    """
+    Calculates the same parameters as calculate_gyration_tensor_parameters for
+    several cavities at once. `cells` contains the positions of the cells of
+    all cavities and `cell_cavities` the index of the cavity of each cell. The
+    moments of all cavities are accumulated in one pass, so the cells do not
+    need to be sorted by cavity. Every cavity must contain at least one cell.
+
+    **Returns:**
+        A list with the parameters of each cavity.
+    """
+
+    cells = np.asarray(cells, dtype=np.float64).reshape((-1, 3))
+    cell_cavities = np.asarray(cell_cavities, dtype=np.int64)
+    # coordinates relative to the first cell of each cavity keep the moments small
+    _, first_cells = np.unique(cell_cavities, return_index=True)
+    origins = cells[first_cells]
+    cells = cells - origins[cell_cavities]
+    num_points = np.bincount(cell_cavities, minlength=num_cavities)
+
+    means = np.zeros((num_cavities, 3))
+    for i in range(3):
+        means[:, i] = np.bincount(cell_cavities, weights=cells[:, i], minlength=num_cavities) / num_points
+    gyration_tensors = np.zeros((num_cavities, 3, 3))
+    for i in range(3):
+        for j in range(i, 3):
+            moments = np.bincount(cell_cavities, weights=cells[:, i] * cells[:, j], minlength=num_cavities)
+            gyration_tensors[:, i, j] = moments / num_points - means[:, i] * means[:, j]
+            gyration_tensors[:, j, i] = gyration_tensors[:, i, j]
+
+    return [
+        (mean + origin,) + gyration_tensor_parameters(gyration_tensor)
+        for mean, origin, gyration_tensor in zip(means, origins, gyration_tensors)
+    ]
+
+
+def gyration_tensor_parameters(gyration_tensor):
+    """
+    Returns R_g^2, η, c and κ of a gyration tensor.
+    """
+
     eigvals = list(sorted(la.eigvalsh(gyration_tensor), reverse=True))
 
     squared_gyration_radius = sum(eigvals)
@@ -35,7 +112,7 @@ def calculate_gyration_tensor_parameters(points):
         asphericity = 0
         acylindricity = 0
         anisotropy = 0
-    return mean, squared_gyration_radius, asphericity, acylindricity, anisotropy
+    return squared_gyration_radius, asphericity, acylindricity, anisotropy
 
 
 # Test code:
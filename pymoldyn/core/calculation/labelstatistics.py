@@ -0,0 +1,124 @@
+"""
+Domains and cavities are stored in their grids as negative labels: every cell
+of the domain or cavity with the index ``i`` holds the value ``-(i + 1)``. The
+:class:`LabelStatistics` class gathers the statistics of all labels of such a
+grid in a single pass instead of comparing the whole grid with each label
+separately. :func:`group_touching_labels` joins labels that touch each other
+(e.g. cavities to multicavities) without a dense intersection table.
+:func:`label_dtype` chooses the smallest integer type that can hold all labels
+of a grid, so large grids with few labels need less memory.
+:func:`label_runs` stores the labeled cells of a grid as runs of equal labels,
+so the grid can be restored with :func:`grid_from_label_runs` (e.g. to create
+the triangle meshes later) without keeping it in memory.
+"""
+
+import numpy as np
+
+from .extension import label_statistics
+
+__all__ = ["LabelStatistics", "group_touching_labels", "label_dtype", "label_runs", "grid_from_label_runs"]
+
+# label grids are stored with one of these types, ordered by their size
+LABEL_DTYPES = (np.dtype(np.int16), np.dtype(np.int32), np.dtype(np.int64))
+
+
+def label_dtype(max_label):
+    """
+    Returns the smallest supported integer type for a grid that contains
+    labels from ``-max_label`` to ``max_label``.
+    """
+    for dtype in LABEL_DTYPES:
+        if max_label <= np.iinfo(dtype).max:
+            return dtype
+    raise ValueError("too many labels: {}".format(max_label))
+
+
+def label_runs(grid):
+    """
+    Returns the runs of cells with the same label in the flattened grid (in C
+    order) as an ``int64`` array with the rows ``(start, length, label)``,
+    where ``start`` is the flat index of the first cell of the run. Only the
+    negative labels (domains or cavities) are stored.
+    """
+    cells = grid.ravel()
+    starts = np.concatenate(([0], np.flatnonzero(cells[1:] != cells[:-1]) + 1))
+    lengths = np.diff(np.append(starts, len(cells)))
+    is_labeled = cells[starts] < 0
+    starts = starts[is_labeled]
+    return np.column_stack((starts, lengths[is_labeled], -cells[starts].astype(np.int64) - 1))
+
+
+def grid_from_label_runs(runs, shape):
+    """
+    Returns a grid with the given shape that contains the labels of the runs
+    from :func:`label_runs` and zeros everywhere else.
+    """
+    starts, lengths, labels = np.asarray(runs, dtype=np.int64).reshape((-1, 3)).T
+    dtype = label_dtype(int(labels.max(initial=0)) + 1)
+    # the label of a run is added at its start and subtracted after its end, so the cumulative sum restores it
+    changes = np.zeros(int(np.prod(shape)) + 1, dtype=dtype)
+    changes[starts] = -(labels + 1)
+    changes[starts + lengths] += labels + 1
+    return np.cumsum(changes[:-1], dtype=dtype).reshape(shape)
+
+
+class LabelStatistics(object):
+    """
+    Statistics of all labels of a domain or cavity grid:
+
+        - `counts`: number of cells of each label
+    """
+
+    def __init__(self, grid, num_labels):
+        self.num_labels = num_labels
+        self.counts = label_statistics(grid, num_labels)
+
+    @property
+    def critical_labels(self):
+        """
+        Indices of all labels that consist of exactly one cell. These domains
+        can disappear on small changes of the cutoff radii.
+        """
+        return np.flatnonzero(self.counts == 1).tolist()
+
+    def volumes(self, cell_volume):
+        """
+        Returns the volume of each label as a list, given the volume of a
+        single cell.
+        """
+        return (self.counts * cell_volume).tolist()
+
+
+def group_touching_labels(num_labels, pairs):
+    """
+    Joins all labels that are connected by the given pairs of touching labels
+    with a disjoint-set union. Returns a list with a set of labels for each
+    group and an array containing the group index of each label. The groups
+    are sorted by their largest label; labels without any neighbor form a
+    group of their own.
+    """
+    parents = list(range(num_labels))
+
+    def find(label):
+        root = label
+        while parents[root] != root:
+            root = parents[root]
+        while parents[label] != root:
+            parents[label], label = root, parents[label]
+        return root
+
+    for label1, label2 in np.asarray(pairs).tolist():
+        root1 = find(label1)
+        root2 = find(label2)
+        # the largest label of a group always is its root
+        if root1 < root2:
+            parents[root1] = root2
+        elif root2 < root1:
+            parents[root2] = root1
+
+    roots = np.array([find(label) for label in range(num_labels)], dtype=np.int64)
+    group_roots, label_to_group = np.unique(roots, return_inverse=True)
+    groups = [set() for _ in range(len(group_roots))]
+    for label, group_index in enumerate(label_to_group.tolist()):
+        groups[group_index].add(label)
+    return groups, label_to_group
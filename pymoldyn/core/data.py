@@ -46,6 +46,40 @@ def writedataset(h5group, name, data, overwrite=True):
     return True
 
 
+def writemesh(h5group, name, mesh, overwrite=True):
+    """
+    Write an indexed mesh (a tuple of vertices, normals and vertex indices)
+    as a hdf5 group with one dataset for each array.
+    The `overwrite` parameter controls the behaviour when the group
+    already exists.
+    """
+    if name in h5group:
+        if overwrite:
+            del h5group[name]
+        else:
+            return False
+    mesh_group = h5group.create_group(name)
+    for attr, data in zip(("vertices", "normals", "indices"), mesh):
+        mesh_group[attr] = data
+    return True
+
+
+def readmesh(h5object):
+    """
+    Read an indexed mesh written by :func:`writemesh`. Files of older
+    versions store the triangles of a mesh in one dataset of the shape
+    ``(2, ntriangles, 3, 3)`` (vertices and normals of each triangle); they
+    are converted to a mesh without shared vertices.
+    """
+    if isinstance(h5object, h5py.Group):
+        return h5object["vertices"][()], h5object["normals"][()], h5object["indices"][()]
+    triangles = np.asarray(h5object)
+    vertices = triangles[0].reshape((-1, 3))
+    normals = triangles[1].reshape((-1, 3))
+    indices = np.arange(len(vertices)).reshape((-1, 3))
+    return vertices, normals, indices
+
+
 class TimestampList(object):
     """
     A `list`-like structure with a fixed length to store :class:`datetime`
@@ -555,6 +589,14 @@ class CavitiesBase(object):
     """
     Base class to store multiple surface-based objects in the 3-dimensional
     space. The :class:`Domains` and :class:`Cavities` class inherit from it.
+
+    The triangles of the objects are optional: results calculated without
+    meshes only contain the surface areas and the cells of the objects as
+    `cell_runs` (see :func:`core.calculation.labelstatistics.label_runs`).
+    In this case, the triangles are created from the cells by the
+    `triangulate` callback when they are accessed for the first time. The
+    callback is set by the :class:`core.calculation.calculation.Calculation`
+    which provided the results.
     """
 
     def __init__(self, *args):
@@ -562,7 +604,8 @@ class CavitiesBase(object):
         The constructor can be called in two ways:
 
         - ``CavitiesBase(timestamp, volumes, surface_areas, triangles)`` :
-            create the object using the given data
+            create the object using the given data; `triangles` is ``None``
+            if no meshes were calculated
 
         - ``CavitiesBase(hdf5group)`` :
             read the data from this hdf5 group
@@ -580,9 +623,13 @@ class CavitiesBase(object):
             number = int(h5group.attrs["number"])
             volumes = getobj_from_h5group("volumes")
             surface_areas = getobj_from_h5group("surface_areas")
-            triangles = [None] * number
-            for i in range(number):
-                triangles[i] = getobj_from_h5group("triangles{}".format(i))
+            if number > 0 and "triangles0" not in h5group:
+                # the results were calculated without meshes
+                triangles = None
+            else:
+                triangles = [None] * number
+                for i in range(number):
+                    triangles[i] = readmesh(h5group["triangles{}".format(i)])
             mass_centers = getobj_from_h5group("mass_centers")
             squared_gyration_radii = getobj_from_h5group("squared_gyration_radii")
             asphericities = getobj_from_h5group("asphericities")
@@ -590,6 +637,7 @@ class CavitiesBase(object):
             anisotropies = getobj_from_h5group("anisotropies")
             characteristic_radii = getobj_from_h5group("characteristic_radii")
             cyclic_area_indices = getobj_from_h5group("cyclic_area_indices")
+            cell_runs = getobj_from_h5group("cell_runs")
         else:
             (
                 timestamp,
@@ -604,6 +652,7 @@ class CavitiesBase(object):
                 characteristic_radii,
                 cyclic_area_indices,
             ) = args[:11]
+            cell_runs = args[11] if len(args) > 11 else None
 
         if not isinstance(timestamp, datetime):
             timestamp = dateutil.parser.parse(str(timestamp))
@@ -611,7 +660,8 @@ class CavitiesBase(object):
         self.volumes = np.asarray(volumes, dtype=np.float64)
         self.number = len(volumes)
         self.surface_areas = np.asarray(surface_areas, dtype=np.float64)
-        self.triangles = [np.asarray(triangle, dtype=np.float64) for triangle in triangles]
+        self.triangles = triangles
+        self.triangulate = None
         self.mass_centers = np.asarray(mass_centers, dtype=np.float64)
         self.squared_gyration_radii = np.asarray(squared_gyration_radii, dtype=np.float64)
         self.asphericities = np.asarray(asphericities, dtype=np.float64)
@@ -621,10 +671,60 @@ class CavitiesBase(object):
         self.cyclic_area_indices = (
             np.asarray(cyclic_area_indices, dtype=np.int32) if cyclic_area_indices is not None else np.array([])
         )
+        self.cell_runs = np.asarray(cell_runs, dtype=np.int64) if cell_runs is not None else None
+
+    @property
+    def triangles(self):
+        """
+        List with the triangle mesh of each object as a ``(vertices, normals,
+        indices)`` tuple: the ``float32`` vertex positions and normals with
+        the shape ``(nvertices, 3)`` and the ``uint32`` vertex indices of the
+        triangles with the shape ``(ntriangles, 3)``. If the meshes are not
+        available yet, they are created with the `triangulate` callback.
+        """
+        if self._triangles is None and self.triangulate is not None:
+            triangulate = self.triangulate
+            self.triangulate = None
+            self.triangles = triangulate()
+        return self._triangles
+
+    @triangles.setter
+    def triangles(self, triangles):
+        if triangles is not None:
+            triangles = [
+                (
+                    np.asarray(vertices, dtype=np.float32),
+                    np.asarray(normals, dtype=np.float32),
+                    np.asarray(indices, dtype=np.uint32),
+                )
+                for vertices, normals, indices in triangles
+            ]
+        self._triangles = triangles
+
+    @property
+    def has_triangles(self):
+        """
+        ``True`` if the meshes have already been created.
+        """
+        return self._triangles is not None
+
+    @property
+    def has_gyration_tensor_parameters(self):
+        """
+        ``True`` if the gyration tensor parameters have been calculated.
+        """
+        return self.mass_centers.shape == (self.number, 3)
+
+    def __getstate__(self):
+        # the callback can not be sent to other processes
+        state = self.__dict__.copy()
+        state["triangulate"] = None
+        return state
 
     def tohdf(self, h5group, overwrite=True):
         """
-        Write the data to a hdf5 Group.
+        Write the data to a hdf5 Group. Meshes that have not been created yet
+        are not written.
 
         **Parameters:**
             `h5group` :
@@ -637,8 +737,17 @@ class CavitiesBase(object):
         h5group.attrs["number"] = self.number
         writedataset(h5group, "volumes", self.volumes, overwrite)
         writedataset(h5group, "surface_areas", self.surface_areas, overwrite)
-        for index, triangles in enumerate(self.triangles):
-            writedataset(h5group, "triangles{}".format(index), np.array(triangles), overwrite)
+        if self.has_triangles:
+            for index, mesh in enumerate(self._triangles):
+                writemesh(h5group, "triangles{}".format(index), mesh, overwrite)
+        elif overwrite:
+            # meshes of previous results do not belong to these objects
+            for name in [name for name in h5group if name.startswith("triangles")]:
+                del h5group[name]
+        if self.cell_runs is not None:
+            writedataset(h5group, "cell_runs", self.cell_runs, overwrite)
+        elif overwrite and "cell_runs" in h5group:
+            del h5group["cell_runs"]
         writedataset(h5group, "mass_centers", self.mass_centers, overwrite)
         writedataset(h5group, "squared_gyration_radii", self.squared_gyration_radii, overwrite)
         writedataset(h5group, "asphericities", self.asphericities, overwrite)
@@ -737,7 +846,7 @@ class Domains(CavitiesBase):
             timestamp = datetime.now()
             volumes = calculation.domain_volumes
             surface_areas = calculation.domain_surface_areas
-            triangles = calculation.domain_triangles
+            triangles = getattr(calculation, "domain_triangles", None)
             centers = calculation.centers
             discretization = calculation.discretization
             mass_centers = calculation.mass_centers
@@ -747,6 +856,7 @@ class Domains(CavitiesBase):
             anisotropies = calculation.anisotropies
             characteristic_radii = calculation.characteristic_radii
             cyclic_area_indices = calculation.cyclic_area_indices
+            cell_runs = getattr(calculation, "cell_runs", None)
             super().__init__(
                 timestamp,
                 volumes,
@@ -759,6 +869,7 @@ class Domains(CavitiesBase):
                 anisotropies,
                 characteristic_radii,
                 cyclic_area_indices,
+                cell_runs,
             )
         else:
             super().__init__(*args)
@@ -894,7 +1005,7 @@ class Cavities(CavitiesBase):
             timestamp = datetime.now()
             volumes = calculation.multicavity_volumes
             surface_areas = calculation.cavity_surface_areas
-            triangles = calculation.cavity_triangles
+            triangles = getattr(calculation, "cavity_triangles", None)
             multicavities = calculation.multicavities
             mass_centers = calculation.mass_centers
             squared_gyration_radii = calculation.squared_gyration_radii
@@ -903,6 +1014,7 @@ class Cavities(CavitiesBase):
             anisotropies = calculation.anisotropies
             characteristic_radii = calculation.characteristic_radii
             cyclic_area_indices = calculation.cyclic_area_indices
+            cell_runs = getattr(calculation, "cell_runs", None)
             super().__init__(
                 timestamp,
                 volumes,
@@ -915,6 +1027,7 @@ class Cavities(CavitiesBase):
                 anisotropies,
                 characteristic_radii,
                 cyclic_area_indices,
+                cell_runs,
             )
         else:
             super().__init__(*args)
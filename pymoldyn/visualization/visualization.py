@@ -179,16 +179,20 @@ class Visualization(object):
     def draw_cavities(self, cavities, color, cavity_type, indices=None):
         if indices is None:
             indices = range(self.results.domains.number)
+        # results calculated without meshes create them on the first access
+        all_triangles = cavities.triangles
         for index in set(indices):
-            if 0 <= index < len(cavities.triangles):
-                triangles = cavities.triangles[index]
+            if 0 <= index < len(all_triangles):
+                vertices, normals, triangle_indices = all_triangles[index]
                 gr3._gr3.gr3_setobjectid(gr3.c_int(len(self.objectids)))
                 self.objectids.append((cavity_type, index))
-                mesh = gr3.createmesh(
-                    triangles.shape[1] * 3,
-                    triangles[0, :, :, :],
-                    triangles[1, :, :, :],
-                    [color] * (triangles.shape[1] * 3),
+                mesh = gr3.createindexedmesh(
+                    len(vertices),
+                    vertices,
+                    normals,
+                    [color] * len(vertices),
+                    triangle_indices.size,
+                    triangle_indices,
                 )
                 gr3.drawmesh(mesh, 1, (0, 0, 0), (0, 0, 1), (0, 1, 0), (1, 1, 1), (1, 1, 1))
                 gr3.deletemesh(c_int(mesh.value))
@@ -15,6 +15,41 @@ class build_ext(build_ext_orig):
             return ext.export_symbols
         return super().get_export_symbols(ext)
 
+    def build_extension(self, ext):
+        # The `algorithm` extensions parallelize some loops with OpenMP if the compiler supports it
+        if isinstance(ext, OpenMP) and platform.system() != "Darwin":
+            if self.compiler.compiler_type == "msvc":
+                ext.extra_compile_args = ext.extra_compile_args + ["/openmp"]
+            else:
+                ext.extra_compile_args = ext.extra_compile_args + ["-fopenmp"]
+                ext.extra_link_args = ext.extra_link_args + ["-fopenmp"]
+        if isinstance(ext, CTypes) and platform.system() == "Darwin":
+            # Other extensions cannot link against a bundle, so build a dynamic library that is found by its rpath
+            linker_so = self.compiler.linker_so
+            self.compiler.linker_so = ["-dynamiclib" if arg == "-bundle" else arg for arg in linker_so]
+            ext.extra_link_args = ext.extra_link_args + [
+                "-Wl,-install_name,@rpath/{}".format(os.path.basename(self.get_ext_filename(ext.name)))
+            ]
+            try:
+                super().build_extension(ext)
+            finally:
+                self.compiler.linker_so = linker_so
+            return
+        if isinstance(ext, LinkedToCTypes):
+            # Link against the CTypes library (which is built before), it is found in the same directory at runtime
+            ctypes_ext = self.ext_map[ext.ctypes_name]
+            ext.library_dirs = ext.library_dirs + [
+                os.path.dirname(self.get_ext_fullpath(ext.ctypes_name)),
+                # the import library of a DLL is created next to its object files
+                os.path.join(self.build_temp, os.path.dirname(ctypes_ext.sources[0])),
+            ]
+            ext.libraries = ext.libraries + [ext.ctypes_name.split(".")[-1]]
+            if platform.system() == "Darwin":
+                ext.extra_link_args = ext.extra_link_args + ["-Wl,-rpath,@loader_path"]
+            elif platform.system() != "Windows":
+                ext.extra_link_args = ext.extra_link_args + ["-Wl,-rpath,$ORIGIN"]
+        super().build_extension(ext)
+
     def get_ext_filename(self, fullname):
         # For CTypes extensions, force to use the default system prefix and extension for shared libraries.
         # This avoids file extensions like `.cpython-312-x86_64-linux-gnu.so`.
@@ -46,10 +81,20 @@ class build_ext(build_ext_orig):
         return super().get_ext_filename(fullname)
 
 
-class CTypes(Extension):
+class OpenMP(Extension):
     pass
 
 
+class CTypes(OpenMP):
+    pass
+
+
+class LinkedToCTypes(Extension):
+    def __init__(self, name, sources, ctypes_name, **kwargs):
+        super().__init__(name, sources, **kwargs)
+        self.ctypes_name = ctypes_name
+
+
 gr_dir = os.path.dirname(os.path.dirname(gr.__gr._name))
 
 setup(
@@ -67,12 +112,27 @@ setup(
             sources=["pymoldyn/computation/split_and_merge/domain_centers/calculate_domain_centers.c"],
             include_dirs=[np.get_include()],
         ),
+        Extension(
+            name="pymoldyn.computation.connected_components.labeling.label_components",
+            sources=["pymoldyn/computation/connected_components/labeling/label_components.c"],
+        ),
         CTypes(
             name="pymoldyn.core.calculation.extension.algorithm",
             sources=["pymoldyn/core/calculation/extension/algorithm.c"],
+            depends=[
+                "pymoldyn/core/calculation/extension/algorithm.h",
+                "pymoldyn/core/calculation/extension/algorithm_labels.h",
+            ],
             include_dirs=[os.path.join(gr_dir, "include")],
             library_dirs=[os.path.join(gr_dir, "lib")],
             libraries=["libGR3" if platform.system() == "Windows" else "GR3"],
         ),
+        # must follow the `algorithm` extension, which is linked
+        LinkedToCTypes(
+            name="pymoldyn.core.calculation.extension._algorithm",
+            sources=["pymoldyn/core/calculation/extension/_algorithm.c"],
+            depends=["pymoldyn/core/calculation/extension/algorithm.h"],
+            ctypes_name="pymoldyn.core.calculation.extension.algorithm",
+        ),
     ],
 )
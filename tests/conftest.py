@@ -0,0 +1,65 @@
+import itertools
+
+import numpy as np
+import pytest
+
+
+class PeriodicGrid:
+    """
+    A cubic periodic volume of "size" cells along each axis, surrounded by one layer of cells outside of the volume
+    (like the grids of the volume discretization). "domain_data" contains the atom labels of all cells closer than
+    "atom_radius" to an atom and "cavity_data" marks all cells farther than "cavity_radius" from the atoms with -1 (like
+    the cavity grids, which only contain cavity labels).
+    """
+
+    def __init__(self, size, num_atoms, atom_radius, cavity_radius, seed):
+        rng = np.random.default_rng(seed)
+        shape = (size + 2,) * 3
+        self.combined_translation_vectors = [
+            [size * c for c in direction] for direction in itertools.product((-1, 0, 1), repeat=3) if any(direction)
+        ]
+        # the translation vector of a cell outside of the volume leads to its equivalent cell inside of the volume
+        positions = np.indices(shape).reshape((3, -1)).T
+        directions = np.where(positions == 0, 1, np.where(positions == size + 1, -1, 0))
+        direction_indices = np.ravel_multi_index((directions + 1).T, (3, 3, 3))
+        # the direction (0, 0, 0) is not a translation vector
+        vector_indices = direction_indices - (direction_indices > 13)
+        self.mask = np.where(direction_indices == 13, 0, -(vector_indices + 1)).reshape(shape).astype(np.int8)
+
+        self.atoms = rng.integers(1, size + 1, size=(num_atoms, 3))
+        distances = np.full(shape, np.inf)
+        labels = np.zeros(shape, dtype=np.int32)
+        for atom_index, atom in enumerate(self.atoms):
+            # distance to the nearest image of the atom
+            offsets = np.abs(positions - atom)
+            offsets = np.minimum(offsets, size - offsets)
+            atom_distances = np.sqrt(np.sum(np.square(offsets), axis=1)).reshape(shape)
+            labels[atom_distances < distances] = atom_index + 1
+            distances = np.minimum(distances, atom_distances)
+        self.domain_data = np.where(distances <= atom_radius, labels, 0).astype(np.int32)
+        self.cavity_data = np.where(distances > cavity_radius, -1, 0).astype(np.int32)
+
+    def get_translation_vector(self, point):
+        return self.combined_translation_vectors[-self.mask[point] - 1]
+
+    def pipeline_args(self, object_type):
+        """
+        Returns the arguments of the labeling pipelines for "object_type" (with a copy of the data, which the
+        pipelines change).
+        """
+        from pymoldyn.computation.split_and_merge.algorithm import ObjectType
+
+        data = self.domain_data if object_type == ObjectType.DOMAIN else self.cavity_data
+        return (
+            data.copy(),
+            self.mask,
+            self.atoms,
+            self.combined_translation_vectors,
+            self.get_translation_vector,
+            object_type,
+        )
+
+
+@pytest.fixture(scope="session")
+def periodic_grid():
+    return PeriodicGrid(size=32, num_atoms=120, atom_radius=4.5, cavity_radius=5.0, seed=0)
@@ -0,0 +1,31 @@
+import pytest
+
+from pymoldyn.computation.connected_components.pipeline import start_connected_components_pipeline
+from pymoldyn.computation.engine import LabelingEngine, compare_results, start_labeling_pipeline
+from pymoldyn.computation.split_and_merge.algorithm import ObjectType
+from pymoldyn.computation.split_and_merge.pipeline import start_split_and_merge_pipeline
+
+ENGINES = [LabelingEngine.SPLIT_AND_MERGE, LabelingEngine.CONNECTED_COMPONENTS, LabelingEngine.CROSS_VALIDATION]
+OBJECT_TYPES = [ObjectType.DOMAIN, ObjectType.CAVITY]
+
+
+@pytest.mark.parametrize("object_type", OBJECT_TYPES)
+@pytest.mark.parametrize("engine", ENGINES)
+def test_engines_find_the_same_areas(periodic_grid, engine, object_type):
+    result = start_labeling_pipeline(*periodic_grid.pipeline_args(object_type), engine=engine)
+    split_and_merge_result = start_split_and_merge_pipeline(*periodic_grid.pipeline_args(object_type))
+    connected_components_result = start_connected_components_pipeline(*periodic_grid.pipeline_args(object_type))
+    assert len(result[0]) > 1
+    assert compare_results(split_and_merge_result, result, object_type) is True
+    assert compare_results(result, connected_components_result, object_type) is True
+
+
+def test_grid_has_cyclic_areas(periodic_grid):
+    # the comparison of cyclic areas is only covered if the test grid contains some
+    _, _, cyclic_area_indices = start_split_and_merge_pipeline(*periodic_grid.pipeline_args(ObjectType.CAVITY))
+    assert len(cyclic_area_indices) > 0
+
+
+def test_unknown_engine(periodic_grid):
+    with pytest.raises(ValueError):
+        start_labeling_pipeline(*periodic_grid.pipeline_args(ObjectType.CAVITY), engine="unknown")
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from pymoldyn.computation.engine import compare_results
+from pymoldyn.computation.split_and_merge import algorithm
+from pymoldyn.computation.split_and_merge.algorithm import ObjectType
+from pymoldyn.computation.split_and_merge.pipeline import start_split_and_merge_pipeline
+
+requires_c_extensions = pytest.mark.skipif(
+    algorithm.calc_dom is None or algorithm.find_index_of_first_element_not_equivalent is None,
+    reason="the C extensions of the split and merge algorithm are not built",
+)
+
+
+def assert_same_boxes(area_boxes, other_area_boxes):
+    assert len(area_boxes) == len(other_area_boxes)
+    for boxes, other_boxes in zip(area_boxes, other_area_boxes):
+        np.testing.assert_array_equal(boxes, other_boxes)
+
+
+@requires_c_extensions
+def test_find_first_inhomogeneity(periodic_grid):
+    rng = np.random.default_rng(1)
+    data = periodic_grid.domain_data
+    mask = periodic_grid.mask
+    for _ in range(200):
+        start = rng.integers(0, data.shape[0] - 1, size=3)
+        end = start + rng.integers(1, data.shape[0] - start + 1)
+        slices = tuple(slice(s, e) for s, e in zip(start.tolist(), end.tolist()))
+        position = algorithm.find_index_of_first_element_not_equivalent.find_index_of_first_element_not_equivalent(
+            data[slices], mask[slices]
+        )
+        classes = algorithm.get_cell_classes(data[slices], mask[slices])
+        assert tuple(algorithm.find_first_inhomogeneity(classes)) == tuple(position)
+
+
+@requires_c_extensions
+def test_find_area_maxima():
+    rng = np.random.default_rng(2)
+    # few distinct distances, so most areas have several cells with the largest distance
+    distances = rng.integers(0, 4, size=(12, 10, 8)).astype(np.int32)
+    boxes = []
+    area_offsets = [0]
+    for _ in range(30):
+        for _ in range(rng.integers(0, 4)):
+            position = rng.integers(0, distances.shape)
+            size = rng.integers(1, np.array(distances.shape) - position + 1)
+            boxes.append(position.tolist() + size.tolist())
+        area_offsets.append(len(boxes))
+    boxes = np.array(boxes, dtype=np.int32).reshape((-1, 6))
+    area_offsets = np.array(area_offsets, dtype=np.int32)
+    num_areas = len(area_offsets) - 1
+
+    centers = np.zeros((num_areas, 3), dtype=np.int32)
+    center_distances = np.zeros(num_areas, dtype=np.int32)
+    algorithm.calc_dom.calculate_domain_centers(distances, boxes, area_offsets, centers, center_distances)
+    numpy_centers = np.zeros((num_areas, 3), dtype=np.int32)
+    numpy_center_distances = np.zeros(num_areas, dtype=np.int32)
+    algorithm.find_area_maxima(distances, boxes, area_offsets, numpy_centers, numpy_center_distances)
+    np.testing.assert_array_equal(numpy_centers, centers)
+    np.testing.assert_array_equal(numpy_center_distances, center_distances)
+
+    # ties are broken by the cell position, so the order of the boxes of an area does not matter
+    reversed_boxes = np.concatenate(
+        [boxes[start:end][::-1] for start, end in zip(area_offsets[:-1], area_offsets[1:])] + [boxes[:0]]
+    )
+    reversed_boxes = np.ascontiguousarray(reversed_boxes)
+    algorithm.calc_dom.calculate_domain_centers(distances, reversed_boxes, area_offsets, centers, center_distances)
+    np.testing.assert_array_equal(centers, numpy_centers)
+    algorithm.find_area_maxima(distances, reversed_boxes, area_offsets, centers, center_distances)
+    np.testing.assert_array_equal(centers, numpy_centers)
+
+
+@requires_c_extensions
+@pytest.mark.parametrize("object_type", [ObjectType.DOMAIN, ObjectType.CAVITY])
+def test_numpy_fallback(periodic_grid, monkeypatch, object_type):
+    result = start_split_and_merge_pipeline(*periodic_grid.pipeline_args(object_type))
+    monkeypatch.setattr(algorithm, "calc_dom", None)
+    monkeypatch.setattr(algorithm, "find_index_of_first_element_not_equivalent", None)
+    numpy_result = start_split_and_merge_pipeline(*periodic_grid.pipeline_args(object_type))
+    assert compare_results(result, numpy_result, object_type) is True
+    # the nodes of both splits are the same, so are the boxes of the areas
+    boxes_index = 2 if object_type == ObjectType.DOMAIN else 1
+    assert_same_boxes(numpy_result[boxes_index], result[boxes_index])
+    if object_type == ObjectType.DOMAIN:
+        assert numpy_result[0] == result[0]
+
+
+@pytest.mark.parametrize("object_type", [ObjectType.DOMAIN, ObjectType.CAVITY])
+def test_parallel_split(periodic_grid, object_type):
+    assert periodic_grid.domain_data.shape[0] // algorithm.MIN_SLAB_WIDTH >= 2
+    result = start_split_and_merge_pipeline(*periodic_grid.pipeline_args(object_type))
+    parallel_result = start_split_and_merge_pipeline(*periodic_grid.pipeline_args(object_type), num_workers=2)
+    assert compare_results(result, parallel_result, object_type) is True
+
+
+def test_shared_split_pool(periodic_grid):
+    with algorithm.create_split_pool(2) as pool:
+        for object_type in (ObjectType.DOMAIN, ObjectType.CAVITY):
+            result = start_split_and_merge_pipeline(*periodic_grid.pipeline_args(object_type))
+            pool_result = start_split_and_merge_pipeline(
+                *periodic_grid.pipeline_args(object_type), num_workers=2, pool=pool
+            )
+            assert compare_results(result, pool_result, object_type) is True